@@ -1,44 +1,96 @@
-from typing import List
+from typing import List, Literal
 from datetime import datetime
 
+import orjson
+from django.http import HttpResponse
 from ninja import Router
 from ninja.errors import HttpError
 from ninja.security import django_auth
-from ninja_jwt.authentication import JWTAuth
+from ninja_jwt.authentication import AsyncJWTAuth
 
 import asyncio
 
 from users.models import Farm
-from ai_advisory.models import Advisory
+from utils.conditional_get import not_modified_response
+from ai_advisory.models import Advisory, AdvisorySection
 
 ai_advisory_router = Router(tags = ["ai_advisory"])
 
-@ai_advisory_router.get(
-    path="/get_ai_advisory",
-    auth=JWTAuth()
-)
-def get_ai_advisory(request, field_id: str, sensed_date: str):
+AdvisorySectionName = Literal[tuple(Advisory.SECTIONS)]
+
+async def _get_farm(field_id: str) -> Farm:
     try:
-        farm = Farm.objects.get(field_id=field_id)
+        return await Farm.objects.aget(field_id=field_id)
     except Farm.DoesNotExist:
         raise HttpError(400, "Farm not found")
 
+def _parse_sensed_date(sensed_date: str):
     try:
-        date_obj = datetime.strptime(sensed_date, "%Y%m%d").date()
+        return datetime.strptime(sensed_date, "%Y%m%d").date()
     except ValueError:
         raise HttpError(400, "Invalid date format. Expected YYYYMMDD.")
 
+async def _get_section_payloads(farm: Farm, sensed_date, sections: List[str]) -> dict:
+    """
+    Return {section: json bytes} from the pre-rendered AdvisorySection rows.
+    Advisories saved before the cache existed are rendered and backfilled once.
+    """
+    payloads = {
+        section: bytes(payload)
+        async for section, payload in AdvisorySection.objects.filter(
+            advisory__farm=farm,
+            advisory__sensed_day=sensed_date,
+            section__in=sections,
+        ).values_list("section", "payload")
+    }
+    if len(payloads) == len(sections):
+        return payloads
+
     try:
-        ai_advisory = Advisory.objects.get(farm=farm, sensed_day=date_obj)
+        # raw_response is never read here and is the largest column on the row
+        advisory = await Advisory.objects.defer("raw_response").aget(farm=farm, sensed_day=sensed_date)
     except Advisory.DoesNotExist:
         raise HttpError(404, "No advisory found for this field and date")
 
-    return {
-        "FIELD_METADATA": ai_advisory.get_field_metadata(),
-        "FERTILIZER_ADVISORY": ai_advisory.get_fertilizer_advisory(),
-        "IRRIGATION_ADVISORY": ai_advisory.get_irrigation_advisory(),
-        "GROWTH_YIELD_ADVISORY": ai_advisory.get_growth_yield_advisory(),
-        "WEED_ADVISORY": ai_advisory.get_weed_advisory(),
-        "PEST_DISEASE_ADVISORY": ai_advisory.get_pest_disease_advisory(),
-        "SOIL_MANAGEMENT_ADVISORY": ai_advisory.get_soil_management_advisory(),
-    }
\ No newline at end of file
+    rendered = advisory.render_sections()
+    await AdvisorySection.objects.abulk_create(rendered, ignore_conflicts=True)
+    return {s.section: s.payload for s in rendered if s.section in sections}
+
+@ai_advisory_router.get(
+    path="/get_ai_advisory",
+    auth=AsyncJWTAuth()
+)
+async def get_ai_advisory(request, field_id: str, sensed_date: str):
+    farm = await _get_farm(field_id)
+    date_obj = _parse_sensed_date(sensed_date)
+
+    response = HttpResponse(content_type="application/json")
+    not_modified = not_modified_response(request, response, farm, "advisory")
+    if not_modified:
+        return not_modified
+
+    sections = list(Advisory.SECTIONS)
+    payloads = await _get_section_payloads(farm, date_obj, sections)
+
+    response.content = b"{" + b",".join(
+        orjson.dumps(Advisory.SECTIONS[section][0]) + b":" + payloads[section]
+        for section in sections
+    ) + b"}"
+    return response
+
+@ai_advisory_router.get(
+    path="/get_ai_advisory_section",
+    auth=AsyncJWTAuth()
+)
+async def get_ai_advisory_section(request, field_id: str, sensed_date: str, section: AdvisorySectionName):
+    """Return a single pre-rendered advisory section"""
+    farm = await _get_farm(field_id)
+    date_obj = _parse_sensed_date(sensed_date)
+
+    response = HttpResponse(content_type="application/json")
+    not_modified = not_modified_response(request, response, farm, "advisory")
+    if not_modified:
+        return not_modified
+
+    response.content = (await _get_section_payloads(farm, date_obj, [section]))[section]
+    return response
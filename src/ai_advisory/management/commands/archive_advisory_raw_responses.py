@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from ai_advisory.models import Advisory, AdvisoryRawArchive
+
+class Command(BaseCommand):
+    help = "Moves Advisory.raw_response into the compressed AdvisoryRawArchive table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch_size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        moved = 0
+
+        while True:
+            batch = list(
+                Advisory.objects
+                .exclude(raw_response={})
+                .filter(raw_archive__isnull=True)
+                .only('id', 'raw_response')
+                .order_by('id')[:batch_size]
+            )
+            if not batch:
+                break
+
+            with transaction.atomic():
+                AdvisoryRawArchive.objects.bulk_create([
+                    AdvisoryRawArchive(
+                        advisory=advisory,
+                        compressed_response=AdvisoryRawArchive.compress(advisory.raw_response)
+                    )
+                    for advisory in batch
+                ])
+                Advisory.objects.filter(id__in=[a.id for a in batch]).update(raw_response={})
+            moved += len(batch)
+
+        self.stdout.write(f"Archived {moved} raw advisory responses")
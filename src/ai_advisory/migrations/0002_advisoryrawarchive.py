@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 22:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_advisory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdvisoryRawArchive',
+            fields=[
+                ('advisory', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='raw_archive', serialize=False, to='ai_advisory.advisory')),
+                ('compressed_response', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'advisory_raw_archives',
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 22:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_advisory', '0002_advisoryrawarchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdvisorySection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section', models.CharField(choices=[('field_metadata', 'FIELD_METADATA'), ('fertilizer', 'FERTILIZER_ADVISORY'), ('irrigation', 'IRRIGATION_ADVISORY'), ('growth_yield', 'GROWTH_YIELD_ADVISORY'), ('weed', 'WEED_ADVISORY'), ('pest_disease', 'PEST_DISEASE_ADVISORY'), ('soil_management', 'SOIL_MANAGEMENT_ADVISORY')], max_length=30)),
+                ('payload', models.BinaryField()),
+                ('advisory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sections', to='ai_advisory.advisory')),
+            ],
+            options={
+                'db_table': 'advisory_sections',
+                'unique_together': {('advisory', 'section')},
+            },
+        ),
+    ]
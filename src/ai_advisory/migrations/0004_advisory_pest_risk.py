@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-18 22:17
+
+from django.db import migrations, models
+
+PEST_RISK_LEVELS = {'low': 1, 'moderate': 2, 'medium': 2, 'high': 3}
+
+
+def backfill_pest_risk(apps, schema_editor):
+    Advisory = apps.get_model('ai_advisory', 'Advisory')
+    batch = []
+    for advisory in Advisory.objects.only('id', 'advisory_data').iterator(chunk_size=200):
+        pests = (advisory.advisory_data or {}).get('Pest and Disease', {}).get('potential_pests', [])
+        levels = [
+            (PEST_RISK_LEVELS.get(str(pest.get('probability', '')).lower(), 0), pest.get('pest_name', ''))
+            for pest in (pests if isinstance(pests, list) else [])
+        ]
+        advisory.pest_risk = max((level for level, _ in levels), default=0)
+        advisory.high_risk_pests = [name for level, name in levels if level == 3]
+        batch.append(advisory)
+        if len(batch) >= 200:
+            Advisory.objects.bulk_update(batch, ['pest_risk', 'high_risk_pests'])
+            batch = []
+    Advisory.objects.bulk_update(batch, ['pest_risk', 'high_risk_pests'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_advisory', '0003_advisorysection'),
+        ('users', '0004_farm_resource_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advisory',
+            name='high_risk_pests',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='advisory',
+            name='pest_risk',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='advisory',
+            index=models.Index(fields=['farm', '-sensed_day', 'pest_risk'], name='advisories_farm_id_fa12c6_idx'),
+        ),
+        migrations.RunPython(backfill_pest_risk, migrations.RunPython.noop),
+    ]
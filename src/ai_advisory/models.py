@@ -1,4 +1,8 @@
 # models.py
+import json
+import zlib
+
+import orjson
 from django.db import models
 from users.models import User, Farm
 from datetime import datetime
@@ -6,6 +10,17 @@ from datetime import datetime
 class Advisory(models.Model):
     """Main advisory model storing the complete advisory response"""
     
+    # section slug -> (key in the combined response, projection method)
+    SECTIONS = {
+        'field_metadata': ('FIELD_METADATA', 'get_field_metadata'),
+        'fertilizer': ('FERTILIZER_ADVISORY', 'get_fertilizer_advisory'),
+        'irrigation': ('IRRIGATION_ADVISORY', 'get_irrigation_advisory'),
+        'growth_yield': ('GROWTH_YIELD_ADVISORY', 'get_growth_yield_advisory'),
+        'weed': ('WEED_ADVISORY', 'get_weed_advisory'),
+        'pest_disease': ('PEST_DISEASE_ADVISORY', 'get_pest_disease_advisory'),
+        'soil_management': ('SOIL_MANAGEMENT_ADVISORY', 'get_soil_management_advisory'),
+    }
+    
     # Foreign Keys
     farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='advisories')
     
@@ -35,6 +50,12 @@ class Advisory(models.Model):
     satellite_data = models.JSONField(default=dict)  # green, orange, red, purple, white
     advisory_data = models.JSONField(default=dict)  # The advisory object
     
+    # Pest risk extracted from advisory_data at write time for crop loss analytics
+    PEST_RISK_NONE, PEST_RISK_LOW, PEST_RISK_MODERATE, PEST_RISK_HIGH = 0, 1, 2, 3
+    PEST_RISK_LEVELS = {'low': PEST_RISK_LOW, 'moderate': PEST_RISK_MODERATE, 'medium': PEST_RISK_MODERATE, 'high': PEST_RISK_HIGH}
+    pest_risk = models.PositiveSmallIntegerField(default=PEST_RISK_NONE)
+    high_risk_pests = models.JSONField(default=list, blank=True)
+    
     class Meta:
         db_table = 'advisories'
         ordering = ['-created_at']
@@ -43,11 +64,45 @@ class Advisory(models.Model):
             models.Index(fields=['farm', '-created_at']),
             models.Index(fields=['field_id', '-created_at']),
             models.Index(fields=['crop', '-created_at']),
+            models.Index(fields=['farm', '-sensed_day', 'pest_risk']),
         ]
     
     def __str__(self):
         return f"{self.crop} - {self.field_name} - {self.created_at.date()}"
     
+    @classmethod
+    def extract_pest_risk(cls, advisory_data: dict):
+        """Return (highest pest probability level, names of high probability pests)"""
+        pests = (advisory_data or {}).get('Pest and Disease', {}).get('potential_pests', [])
+        pest_risk = cls.PEST_RISK_NONE
+        high_risk_pests = []
+        for pest in pests if isinstance(pests, list) else []:
+            level = cls.PEST_RISK_LEVELS.get(str(pest.get('probability', '')).lower(), cls.PEST_RISK_NONE)
+            pest_risk = max(pest_risk, level)
+            if level == cls.PEST_RISK_HIGH:
+                high_risk_pests.append(pest.get('pest_name', ''))
+        return pest_risk, high_risk_pests
+    
+    def render_sections(self):
+        """Build pre-rendered AdvisorySection rows, one per section"""
+        return [
+            AdvisorySection(
+                advisory=self,
+                section=section,
+                payload=orjson.dumps(getattr(self, method)())
+            )
+            for section, (_, method) in self.SECTIONS.items()
+        ]
+    
+    def get_raw_response(self):
+        """Get the complete API response, from the archive table if it was moved there"""
+        if self.raw_response:
+            return self.raw_response
+        try:
+            return self.raw_archive.get_response()
+        except AdvisoryRawArchive.DoesNotExist:
+            return {}
+    
     def get_field_metadata(self):
         """Get field metadata in mock format"""
         return {
@@ -137,4 +192,44 @@ class Advisory(models.Model):
                 },
                 "Soil Management": self.advisory_data.get('Soil Management', {})
             }
-        }
\ No newline at end of file
+        }
+
+
+class AdvisoryRawArchive(models.Model):
+    """zlib compressed copy of an advisory's raw API response, kept off the read path"""
+    
+    advisory = models.OneToOneField(Advisory, on_delete=models.CASCADE, primary_key=True, related_name='raw_archive')
+    compressed_response = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'advisory_raw_archives'
+    
+    def __str__(self):
+        return f"Raw response - {self.advisory_id}"
+    
+    @staticmethod
+    def compress(response: dict) -> bytes:
+        """Compress a JSON response for storage"""
+        return zlib.compress(json.dumps(response, separators=(',', ':')).encode('utf-8'))
+    
+    def get_response(self) -> dict:
+        """Decompress the stored response"""
+        return json.loads(zlib.decompress(bytes(self.compressed_response)))
+
+
+class AdvisorySection(models.Model):
+    """Pre-rendered JSON of one advisory section, written when the advisory is saved"""
+    
+    SECTION_CHOICES = [(section, key) for section, (key, _) in Advisory.SECTIONS.items()]
+    
+    advisory = models.ForeignKey(Advisory, on_delete=models.CASCADE, related_name='sections')
+    section = models.CharField(max_length=30, choices=SECTION_CHOICES)
+    payload = models.BinaryField()
+    
+    class Meta:
+        db_table = 'advisory_sections'
+        unique_together = ['advisory', 'section']
+    
+    def __str__(self):
+        return f"{self.section} - {self.advisory_id}"
@@ -1,3 +1,155 @@
-from django.test import TestCase
+import json
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from ninja_jwt.tokens import AccessToken
+
+from testing.fixtures import DAY, advisory_response, make_farm
+from ai_advisory.models import Advisory, AdvisoryRawArchive, AdvisorySection
+from ai_advisory.utils import save_ai_adviosry_from_response
+
+
+class PestRiskTests(SimpleTestCase):
+
+    def extract(self, pests) -> tuple:
+        return Advisory.extract_pest_risk({"Pest and Disease": {"potential_pests": pests}})
+
+    def test_highest_level_and_high_risk_names(self):
+        pests = [
+            {"pest_name": "Stem borer", "probability": "Moderate"},
+            {"pest_name": "Leaf folder", "probability": "HIGH"},
+            {"pest_name": "Gall midge", "probability": "high"},
+            {"pest_name": "Thrips", "probability": "low"},
+        ]
+        self.assertEqual(self.extract(pests), (Advisory.PEST_RISK_HIGH, ["Leaf folder", "Gall midge"]))
+        self.assertEqual(self.extract([{"pest_name": "Thrips", "probability": "medium"}]), (Advisory.PEST_RISK_MODERATE, []))
+
+    def test_missing_or_malformed_pests_are_no_risk(self):
+        none = (Advisory.PEST_RISK_NONE, [])
+        self.assertEqual(Advisory.extract_pest_risk({}), none)
+        self.assertEqual(Advisory.extract_pest_risk(None), none)
+        self.assertEqual(self.extract("none reported"), none)
+        self.assertEqual(self.extract([{"pest_name": "Thrips", "probability": "unknown"}, {"pest_name": "Mites"}]), none)
+
+
+class RawArchiveTests(TestCase):
+
+    def setUp(self):
+        self.farm = make_farm()
+        self.response = advisory_response()
+
+    def save(self) -> Advisory:
+        return save_ai_adviosry_from_response(self.response, self.farm.field_id, farm=self.farm)
+
+    def test_pest_risk_is_stored_on_save(self):
+        self.response = advisory_response(pest_levels=["low", "High"])
+
+        advisory = Advisory.objects.get(pk=self.save().pk)
+
+        self.assertEqual((advisory.pest_risk, advisory.high_risk_pests), (Advisory.PEST_RISK_HIGH, ["Pest 1"]))
+
+    @override_settings(ADVISORY_ARCHIVE_RAW_RESPONSE=True)
+    def test_archived_response_round_trips(self):
+        advisory = Advisory.objects.get(pk=self.save().pk)
+
+        self.assertEqual(advisory.raw_response, {})
+        archive = AdvisoryRawArchive.objects.get(advisory=advisory)
+        self.assertLess(len(bytes(archive.compressed_response)), len(json.dumps(self.response)))
+        self.assertEqual(archive.get_response(), self.response)
+        self.assertEqual(advisory.get_raw_response(), self.response)
+
+    @override_settings(ADVISORY_ARCHIVE_RAW_RESPONSE=False)
+    def test_response_stays_on_the_row_when_archiving_is_off(self):
+        advisory = Advisory.objects.get(pk=self.save().pk)
+
+        self.assertEqual(advisory.raw_response, self.response)
+        self.assertFalse(AdvisoryRawArchive.objects.exists())
+        self.assertEqual(advisory.get_raw_response(), self.response)
+
+    @override_settings(ADVISORY_ARCHIVE_RAW_RESPONSE=False)
+    def test_archive_command_moves_existing_responses(self):
+        advisory = self.save()
+
+        call_command("archive_advisory_raw_responses", stdout=StringIO())
+
+        advisory = Advisory.objects.get(pk=advisory.pk)
+        self.assertEqual(advisory.raw_response, {})
+        self.assertEqual(advisory.get_raw_response(), self.response)
+
+    def test_reads_defer_raw_response(self):
+        self.save()
+        # Without cached sections the endpoint loads the advisory row to render them
+        AdvisorySection.objects.all().delete()
+        token = AccessToken.for_user(self.farm.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                "/api/ai_advisory/get_ai_advisory",
+                {"field_id": self.farm.field_id, "sensed_date": DAY.strftime("%Y%m%d")},
+                HTTP_HOST="localhost",
+                HTTP_AUTHORIZATION=f"Bearer {token}",
+            )
+
+        self.assertEqual(response.status_code, 200, response.content)
+        advisory_reads = [query["sql"] for query in queries if 'FROM "advisories"' in query["sql"]]
+        self.assertEqual(len(advisory_reads), 1)
+        self.assertNotIn("raw_response", advisory_reads[0])
+
+
+class AdvisorySectionTests(TestCase):
+
+    def setUp(self):
+        self.farm = make_farm()
+        self.response = advisory_response(fieldArea="3.5 acres")
+        token = AccessToken.for_user(self.farm.user)
+        self.headers = {"HTTP_HOST": "localhost", "HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+    def save(self) -> Advisory:
+        return save_ai_adviosry_from_response(self.response, self.farm.field_id, farm=self.farm)
+
+    def get(self, path: str, **params):
+        params = {"field_id": self.farm.field_id, "sensed_date": DAY.strftime("%Y%m%d"), **params}
+        return self.client.get(f"/api/ai_advisory/{path}", params, **self.headers)
+
+    def payloads(self) -> dict:
+        return {section.section: bytes(section.payload) for section in AdvisorySection.objects.all()}
+
+    def test_saved_sections_match_the_backfill(self):
+        self.save()
+        saved = self.payloads()
+        self.assertEqual(set(saved), set(Advisory.SECTIONS))
+        self.assertEqual(json.loads(saved["field_metadata"])["fieldArea"], "3.500 acres")
+
+        AdvisorySection.objects.all().delete()
+        response = self.get("get_ai_advisory")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.payloads(), saved)
+        self.assertEqual(list(response.json()), [key for key, _ in Advisory.SECTIONS.values()])
+
+    def test_render_error_does_not_fail_the_save(self):
+        with mock.patch.object(Advisory, "render_sections", side_effect=ValueError("bad percentage")):
+            advisory = self.save()
+
+        self.assertTrue(Advisory.objects.filter(pk=advisory.pk).exists())
+        self.assertEqual(self.payloads(), {})
+
+        # The section endpoint renders and stores it on first read
+        response = self.get("get_ai_advisory_section", section="irrigation")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json(), Advisory.objects.get(pk=advisory.pk).get_irrigation_advisory())
+        self.assertEqual(len(self.payloads()), len(Advisory.SECTIONS))
+
+    def test_section_endpoint(self):
+        advisory = self.save()
+
+        response = self.get("get_ai_advisory_section", section="pest_disease")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json(), advisory.get_pest_disease_advisory())
+        self.assertEqual(self.get("get_ai_advisory_section", section="unknown").status_code, 422)
+        self.assertEqual(self.get("get_ai_advisory_section", section="weed", sensed_date="20250702").status_code, 404)
@@ -1,20 +1,45 @@
+import logging
 from datetime import datetime
+from typing import Optional
 
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 
 from users.models import Farm
-from ai_advisory.models import Advisory
+from users.utils import touch_farm_resources
+from ai_advisory.models import Advisory, AdvisoryRawArchive, AdvisorySection
 
-def save_ai_adviosry_from_response(api_response : dict, field_id : str):
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter(
+    fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+handler.setFormatter(formatter)
+if not logger.hasHandlers():
+    logger.addHandler(handler)
+
+def save_ai_adviosry_from_response(api_response : dict, field_id : str, farm: Optional[Farm] = None):
     """
     Create Advisory from API response
     
     Args:
         api_response (dict): The API response JSON
-        farm: Field Id
+        field_id: Field Id
+        farm (Farm): Farm of the response when the caller already has it
     
     Returns:
         Advisory: Created Advisory instance
+
+    When ADVISORY_ARCHIVE_RAW_RESPONSE is enabled the raw response is
+    stored compressed in AdvisoryRawArchive instead of on the row itself.
+    Each advisory section is also pre-rendered into AdvisorySection, from the
+    row as stored so the payloads match the ones the read path backfills. A
+    section that fails to render does not fail the save, the read path
+    renders it on first request instead.
     """
     # Parse dates
     sowing_date = datetime.strptime(api_response['SowingDate'], '%Y%m%d').date()
@@ -24,23 +49,46 @@ def save_ai_adviosry_from_response(api_response : dict, field_id : str):
     field_area_str = api_response['fieldArea']
     field_area = float(field_area_str.split()[0]) if ' ' in field_area_str else float(field_area_str)
     
-    farm = Farm.objects.get(
-        field_id = field_id
-    )
-    
-    return Advisory.objects.create(
-        farm=farm,
-        field_id=api_response.get('fieldID'),
-        field_name=api_response.get('fieldName', ''),
-        field_area=field_area if field_area is not None else 0,
-        field_area_unit='acres',
-        crop=api_response.get('Crop'),
-        sowing_date=sowing_date if sowing_date else timezone.now().date(),
-        timestamp=api_response.get('timestamp', int(timezone.now().timestamp())),
-        sar_day=api_response.get('SARDay', ''),
-        sensed_day=sensed_day if sensed_day else timezone.now().date(),
-        last_satellite_visit=api_response.get('lastSatelliteVisit', ''),
-        satellite_data=api_response.get('Satellite_Data', {}),
-        advisory_data=api_response.get('advisory', {}),
-        raw_response=api_response if api_response else {}
-    )
\ No newline at end of file
+    if farm is None:
+        farm = Farm.objects.get(
+            field_id = field_id
+        )
+    
+    archive_raw = settings.ADVISORY_ARCHIVE_RAW_RESPONSE and bool(api_response)
+    advisory_data = api_response.get('advisory', {})
+    pest_risk, high_risk_pests = Advisory.extract_pest_risk(advisory_data)
+    
+    with transaction.atomic():
+        advisory = Advisory.objects.create(
+            farm=farm,
+            field_id=api_response.get('fieldID'),
+            field_name=api_response.get('fieldName', ''),
+            field_area=field_area if field_area is not None else 0,
+            field_area_unit='acres',
+            crop=api_response.get('Crop'),
+            sowing_date=sowing_date if sowing_date else timezone.now().date(),
+            timestamp=api_response.get('timestamp', int(timezone.now().timestamp())),
+            sar_day=api_response.get('SARDay', ''),
+            sensed_day=sensed_day if sensed_day else timezone.now().date(),
+            last_satellite_visit=api_response.get('lastSatelliteVisit', ''),
+            satellite_data=api_response.get('Satellite_Data', {}),
+            advisory_data=advisory_data,
+            pest_risk=pest_risk,
+            high_risk_pests=high_risk_pests,
+            raw_response={} if archive_raw else (api_response if api_response else {})
+        )
+        if archive_raw:
+            AdvisoryRawArchive.objects.create(
+                advisory=advisory,
+                compressed_response=AdvisoryRawArchive.compress(api_response)
+            )
+        touch_farm_resources(farm.id, "advisory")
+    
+    try:
+        # Stored values differ from the parsed ones, e.g. field_area 3.5 is read back as 3.500
+        saved = Advisory.objects.defer('raw_response').get(pk=advisory.pk)
+        AdvisorySection.objects.bulk_create(saved.render_sections())
+    except Exception as e:
+        logger.warning(f"Could not render advisory sections of advisory {advisory.pk}, left to the read path: {e}")
+    
+    return advisory
\ No newline at end of file
@@ -49,11 +49,17 @@ INSTALLED_APPS = [
     "heatmaps",
     "ai_advisory",
     "weather",
-    "crop_loss_analytics"
+    "crop_loss_analytics",
+    "regions",
+    "pipelines",
+    "testing",
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Outermost after security, so session and auth queries are counted too
+    'utils.query_metrics.QueryMetricsMiddleware',
+    'utils.metrics.RequestMetricsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "corsheaders.middleware.CorsMiddleware",
@@ -116,6 +122,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'ak_backend_poc.wsgi.application'
+ASGI_APPLICATION = 'ak_backend_poc.asgi.application'
+
+# "asgi" when served by uvicorn workers on asgi.application, see docs/README.md#deployment
+SERVER_INTERFACE = os.getenv("SERVER_INTERFACE", "wsgi")
 
 
 # Database
@@ -133,7 +143,9 @@ import dj_database_url
 DATABASES = {
     'default': dj_database_url.config(
         default=os.getenv('DATABASE_URL'),
-        conn_max_age=600,
+        # Under ASGI every request runs its sync ORM work on its own thread, so
+        # persistent connections would pile up instead of being reused
+        conn_max_age=0 if SERVER_INTERFACE == "asgi" else 600,
         conn_health_checks=True,
     )
 }
@@ -185,6 +197,19 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
 
+# Store Advisory.raw_response zlib compressed in a separate archive table
+ADVISORY_ARCHIVE_RAW_RESPONSE = os.getenv("ADVISORY_ARCHIVE_RAW_RESPONSE", "0").lower() in ("1", "true", "yes")
+
+# Side of the square grid cells farms are bucketed into for region aggregates, in degrees
+REGION_GRID_SIZE_DEGREES = float(os.getenv("REGION_GRID_SIZE_DEGREES", "0.1"))
+
+# Send each request's query count and database time as X-DB-* / Server-Timing
+# headers. The per-endpoint totals are collected either way.
+QUERY_METRICS_HEADERS = os.getenv("QUERY_METRICS_HEADERS", "1" if DEBUG else "0").lower() in ("1", "true", "yes")
+
+# Bearer token Prometheus sends to scrape /metrics, which is only open without one under DEBUG
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
 NINJA_JWT = {
     'ACCESS_TOKEN_LIFETIME': datetime.timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': datetime.timedelta(days=7),
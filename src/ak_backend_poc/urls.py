@@ -1,8 +1,10 @@
 from django.contrib import admin
 from django.urls import path
 from .api import api
+from utils.metrics import metrics_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", api.urls),
+    path("metrics", metrics_view),
 ]
\ No newline at end of file
@@ -1,7 +1,10 @@
 import os
-from typing import Literal
-from datetime import date
+from typing import Literal, Optional
+from datetime import date, timedelta
 from django.db import DatabaseError
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Greatest, Least
+from django.http import HttpResponse
 from ninja import Router
 from ninja.errors import HttpError
 from ninja_jwt.authentication import JWTAuth
@@ -9,8 +12,15 @@ from ninja_jwt.authentication import JWTAuth
 import asyncio
 
 from users.models import Farm
-from crop_loss_analytics.models import CropLossAnalytics
-from crop_loss_analytics.crop_loss_analytics_schema import CropLossAnalyticsResponseSchema
+from utils.conditional_get import not_modified_response
+from crop_loss_analytics.models import CropLossAnalytics, CropLossEvent
+from regions.models import FarmRegion
+from crop_loss_analytics.crop_loss_analytics_schema import (
+    CropLossAnalyticsResponseSchema,
+    CropLossSummarySchema,
+    CropLossTimelineSchema,
+    CropLossRegionSummarySchema,
+)
 
 crop_loss_analytics_router = Router(tags = ["Crop Loss Analytics"])
 
@@ -19,13 +29,17 @@ crop_loss_analytics_router = Router(tags = ["Crop Loss Analytics"])
     response = CropLossAnalyticsResponseSchema,
     auth = JWTAuth()
 )
-def get_crop_loss_analytics(request, kind : Literal["flood", "pest", "drought"]):
+def get_crop_loss_analytics(request, response: HttpResponse, kind : Literal["flood", "pest", "drought"]):
     
     try:
         farm = Farm.objects.get(user=request.user)
     except Farm.DoesNotExist:
         raise HttpError(400, "Farm not found")
     
+    not_modified = not_modified_response(request, response, farm, "crop_loss")
+    if not_modified:
+        return not_modified
+    
     qs = CropLossAnalytics.objects.filter(
         farm = farm,
         kind = kind,
@@ -44,4 +58,170 @@ def get_crop_loss_analytics(request, kind : Literal["flood", "pest", "drought"])
         "start_date" : None,
         "approx_end_date" : None
     }
-    
\ No newline at end of file
+    
+
+
+@crop_loss_analytics_router.get(
+    "/crop_loss_summary",
+    response = CropLossSummarySchema,
+    auth = JWTAuth()
+)
+def get_crop_loss_summary(request, response: HttpResponse):
+    """Flood, drought and pest status in one query over the active scenarios"""
+    try:
+        farm = Farm.objects.only(
+            "id", "updated_at", Farm.RESOURCE_VERSION_FIELDS["crop_loss"]
+        ).get(user=request.user)
+    except Farm.DoesNotExist:
+        raise HttpError(400, "Farm not found")
+    
+    not_modified = not_modified_response(request, response, farm, "crop_loss")
+    if not_modified:
+        return not_modified
+    
+    # Served by the partial unique index on (farm, kind) of active rows
+    active = {
+        kind: (date_start, closest_date_sensed)
+        for kind, date_start, closest_date_sensed in CropLossAnalytics.objects.filter(
+            farm_id = farm.id,
+            is_active = True
+        ).values_list("kind", "date_start", "closest_date_sensed")
+    }
+    
+    summary = {}
+    for kind, _ in CropLossAnalytics.INDEX_CHOICES:
+        start_date, approx_end_date = active.get(kind, (None, None))
+        summary[kind] = {
+            "start_date" : start_date,
+            "approx_end_date" : approx_end_date,
+            "kind" : kind
+        }
+    return summary
+
+
+TIMELINE_MAX_PAGE_SIZE = 100
+
+
+@crop_loss_analytics_router.get(
+    "/crop_loss_timeline",
+    response = CropLossTimelineSchema,
+    auth = JWTAuth()
+)
+def get_crop_loss_timeline(
+    request,
+    response: HttpResponse,
+    kind : Optional[Literal["flood", "pest", "drought"]] = None,
+    page : int = 1,
+    page_size : int = 20
+):
+    """Past crop loss episodes of the farm, newest first, with the ongoing ones"""
+    if page < 1 or not 1 <= page_size <= TIMELINE_MAX_PAGE_SIZE:
+        raise HttpError(400, f"page must be >= 1 and page_size between 1 and {TIMELINE_MAX_PAGE_SIZE}")
+    
+    try:
+        farm = Farm.objects.get(user=request.user)
+    except Farm.DoesNotExist:
+        raise HttpError(400, "Farm not found")
+    
+    not_modified = not_modified_response(request, response, farm, "crop_loss")
+    if not_modified:
+        return not_modified
+    
+    events = CropLossEvent.objects.filter(farm=farm)
+    ongoing = CropLossAnalytics.objects.filter(farm=farm, is_active=True).order_by('-date_start')
+    if kind:
+        events = events.filter(kind=kind)
+        ongoing = ongoing.filter(kind=kind)
+    
+    offset = (page - 1) * page_size
+    return {
+        "count" : events.count(),
+        "page" : page,
+        "page_size" : page_size,
+        "ongoing" : [
+            {
+                "kind" : analytics.kind,
+                "date_start" : analytics.date_start,
+                "date_end" : analytics.date_end,
+                "days" : (analytics.date_end - analytics.date_start).days + 1,
+                "peak_severity" : (analytics.metadata or {}).get("peak_severity"),
+                "ongoing" : True
+            }
+            for analytics in ongoing
+        ],
+        "results" : [
+            {
+                "kind" : event.kind,
+                "date_start" : event.date_start,
+                "date_end" : event.date_end,
+                "days" : event.days,
+                "peak_severity" : event.peak_severity,
+                "ongoing" : False
+            }
+            for event in events.order_by('-date_start', '-id')[offset:offset + page_size]
+        ]
+    }
+
+
+@crop_loss_analytics_router.get(
+    "/crop_loss_region_summary",
+    response = CropLossRegionSummarySchema,
+    auth = JWTAuth()
+)
+def get_crop_loss_region_summary(
+    request,
+    date_from : date,
+    date_to : date,
+    min_lat : Optional[float] = None,
+    max_lat : Optional[float] = None,
+    min_lon : Optional[float] = None,
+    max_lon : Optional[float] = None
+):
+    """
+    Closed crop loss episodes overlapping [date_from, date_to], per kind.
+    loss_days only counts the days inside the range. The bounding box filters
+    on the farm centroid stored with each episode. Staff see every farm, other
+    users only the farms in the region cells of their own farms.
+    """
+    if date_from > date_to:
+        raise HttpError(400, "date_from must not be after date_to")
+    
+    events = CropLossEvent.objects.filter(date_start__lte=date_to, date_end__gte=date_from)
+    if not request.user.is_staff:
+        cells = FarmRegion.objects.filter(farm__user=request.user).values('cell')
+        if not cells.exists():
+            raise HttpError(403, "Region summary needs a farm with an assigned region")
+        events = events.filter(farm__region__cell__in=cells)
+    bounds = {
+        "latitude__gte" : min_lat,
+        "latitude__lte" : max_lat,
+        "longitude__gte" : min_lon,
+        "longitude__lte" : max_lon,
+    }
+    events = events.filter(**{lookup: bound for lookup, bound in bounds.items() if bound is not None})
+    
+    rows = (
+        events
+        .values('kind')
+        .annotate(
+            events=Count('id'),
+            farms=Count('farm', distinct=True),
+            loss_days=Sum(Least(F('date_end'), Value(date_to)) - Greatest(F('date_start'), Value(date_from))),
+        )
+        .order_by('kind')
+    )
+    
+    return {
+        "date_from" : date_from,
+        "date_to" : date_to,
+        "kinds" : [
+            {
+                "kind" : row["kind"],
+                "events" : row["events"],
+                "farms" : row["farms"],
+                # Inclusive range, one extra day per episode
+                "loss_days" : (row["loss_days"] or timedelta()).days + row["events"],
+            }
+            for row in rows
+        ]
+    }
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from datetime import date
 from ninja import Schema
 
@@ -6,4 +6,45 @@ class CropLossAnalyticsResponseSchema(Schema):
     """Crop Loss Analytics API call schema"""
     start_date : Optional[date]
     approx_end_date : Optional[date]
-    kind : str
\ No newline at end of file
+    kind : str
+
+
+class CropLossSummarySchema(Schema):
+    """Active scenario status of every kind"""
+    flood : CropLossAnalyticsResponseSchema
+    drought : CropLossAnalyticsResponseSchema
+    pest : CropLossAnalyticsResponseSchema
+
+
+class CropLossEventSchema(Schema):
+    """Crop loss episode in the timeline"""
+    kind : str
+    date_start : date
+    date_end : date
+    days : int
+    peak_severity : Optional[float]
+    ongoing : bool
+
+
+class CropLossTimelineSchema(Schema):
+    """Paginated crop loss timeline, closed episodes newest first"""
+    count : int
+    page : int
+    page_size : int
+    ongoing : List[CropLossEventSchema]
+    results : List[CropLossEventSchema]
+
+
+class CropLossRegionKindSchema(Schema):
+    """Aggregate of closed episodes of one kind in a region"""
+    kind : str
+    events : int
+    farms : int
+    loss_days : int
+
+
+class CropLossRegionSummarySchema(Schema):
+    """Region level crop loss aggregates over a date range"""
+    date_from : date
+    date_to : date
+    kinds : List[CropLossRegionKindSchema]
@@ -0,0 +1,269 @@
+import logging
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max
+
+from users.models import Farm
+from users.utils import touch_farms_resources
+from regions.utils import sync_region_losses
+from heatmaps.models import Heatmap, IndexTimeSeries
+from ai_advisory.models import Advisory
+from weather.models import WeatherPrediction
+from crop_loss_analytics.models import CropLossAnalytics, CropLossEvent
+from crop_loss_analytics.rules import (
+    CROP_LOSS_RULES,
+    SOURCE_ADVISORY,
+    SOURCE_INDEX_VALUES,
+    SOURCE_WEATHER,
+    START_FROM_HEATMAPS,
+    LossRule,
+    advance_scenario,
+    close_event,
+    consecutive_visits,
+    expire_scenario,
+    open_scenario,
+)
+from crop_loss_analytics.utils import ANALYTICS_UPDATE_FIELDS
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter(
+    fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+handler.setFormatter(formatter)
+if not logger.hasHandlers():
+    logger.addHandler(handler)
+
+
+def _source_rows(source: str, field: str, since: date, today: date):
+    """(farm_id, visit date, value) rows of a source, ordered by farm then newest visit first"""
+    if source == SOURCE_INDEX_VALUES:
+        return (
+            IndexTimeSeries.objects
+            .filter(index_type=field, date__gte=since, date__lte=today)
+            .order_by('farm_id', '-date')
+            .values_list('farm_id', 'date', 'value')
+        )
+    if source == SOURCE_ADVISORY:
+        return (
+            Advisory.objects
+            .filter(sensed_day__gte=since, sensed_day__lte=today)
+            .order_by('farm_id', '-sensed_day')
+            .values_list('farm_id', 'sensed_day', field)
+        )
+    if source == SOURCE_WEATHER:
+        # One visit per reload: the current day row of each forecast batch
+        return (
+            WeatherPrediction.objects
+            .filter(is_current=True, date__gte=since, date__lte=today)
+            .order_by('farm_id', '-date_of_reload')
+            .values_list('farm_id', 'date', field)
+        )
+    return []
+
+
+def _visit_matrix(rows, farm_ids: np.ndarray, depth: int):
+    """
+    Pack sorted (farm_id, date, value) rows into per-farm matrices of the newest visits.
+
+    Returns:
+        tuple: values (float, NaN when missing) and dates (datetime64[D], NaT when
+            there is no visit), both shaped (len(farm_ids), depth), newest visit first.
+    """
+    values = np.full((len(farm_ids), depth), np.nan)
+    dates = np.full((len(farm_ids), depth), np.datetime64('NaT'), dtype='datetime64[D]')
+
+    rows = list(rows)
+    if not rows:
+        return values, dates
+
+    row_farms, row_dates, row_values = zip(*rows)
+    positions = np.searchsorted(farm_ids, np.asarray(row_farms))
+    positions = np.minimum(positions, len(farm_ids) - 1)
+    known = farm_ids[positions] == np.asarray(row_farms)
+
+    # Rank of each row inside its farm group, rows are already newest first
+    index = np.arange(len(rows))
+    group_start = np.r_[True, positions[1:] != positions[:-1]]
+    rank = index - np.maximum.accumulate(np.where(group_start, index, 0))
+
+    keep = known & (rank < depth)
+    values[positions[keep], rank[keep]] = np.asarray(row_values, dtype=float)[keep]
+    dates[positions[keep], rank[keep]] = np.asarray(row_dates, dtype='datetime64[D]')[keep]
+    return values, dates
+
+
+def _leading_run(mask: np.ndarray) -> np.ndarray:
+    """Length of the leading run of True per row"""
+    return np.where(mask.all(axis=1), mask.shape[1], mask.argmin(axis=1))
+
+
+def _heatmap_dates(farm_ids: List[int], since: date) -> Dict[int, List[date]]:
+    """Distinct heatmap dates per farm, newest first"""
+    heatmap_dates = {}
+    rows = (
+        Heatmap.objects
+        .filter(farm_id__in=farm_ids, date__gte=since)
+        .order_by('farm_id', '-date')
+        .values_list('farm_id', 'date')
+        .distinct()
+    )
+    for farm_id, day in rows:
+        heatmap_dates.setdefault(farm_id, []).append(day)
+    return heatmap_dates
+
+
+def _visit_history(values: np.ndarray, dates: np.ndarray, field: str) -> List[Tuple[date, dict]]:
+    """One farm row of the visit matrices as [(date, {field: value}), ...], newest first"""
+    return [
+        (day.item(), {field: None if np.isnan(value) else float(value)})
+        for day, value in zip(dates, values)
+        if not np.isnat(day)
+    ]
+
+
+def evaluate_crop_loss_fleet(
+    today: Optional[date] = None,
+    lookback_days: int = 90,
+    batch_size: int = 1000,
+    rules: Iterable[LossRule] = CROP_LOSS_RULES,
+) -> Dict[str, int]:
+    """
+    Evaluate crop loss rules for every farm at once and upsert the results.
+
+    The newest visits of every signal source are loaded for all farms with one
+    query per rule and packed into (farms x visits) NumPy arrays, so the farms
+    whose entry run is long enough to open a scenario are found for the whole
+    fleet in a few array operations. Scenarios are then opened and advanced with
+    the same transitions as a live reload. A visit counts once: only visits dated
+    after the date_current of the farm's last scenario of that kind are applied,
+    so running the pass repeatedly is safe. Active scenarios without a new visit,
+    including farms that stopped reloading, are closed once past their grace period.
+
+    Args:
+        today (date): Evaluation date, defaults to today.
+        lookback_days (int): Oldest visit considered, in days before today.
+        batch_size (int): Rows per bulk query when writing.
+        rules (Iterable[LossRule]): Rules to evaluate.
+
+    Returns:
+        dict: Number of farms evaluated and scenarios created, updated and deactivated.
+    """
+    today = today or date.today()
+    since = today - timedelta(days=lookback_days)
+    rules = list(rules)
+    stats = {"farms": 0, "created": 0, "updated": 0, "deactivated": 0}
+
+    farm_ids = np.asarray(sorted(Farm.objects.values_list('id', flat=True)), dtype=np.int64)
+    if not len(farm_ids) or not rules:
+        return stats
+    stats["farms"] = len(farm_ids)
+
+    kinds = [rule.kind for rule in rules]
+    active = {
+        (analytics.farm_id, analytics.kind): analytics
+        for analytics in CropLossAnalytics.objects.filter(kind__in=kinds, is_active=True)
+    }
+    last_evaluated = {
+        (farm_id, kind): day
+        for farm_id, kind, day in (
+            CropLossAnalytics.objects
+            .filter(kind__in=kinds)
+            .values('farm_id', 'kind')
+            .annotate(day=Max('date_current'))
+            .values_list('farm_id', 'kind', 'day')
+        )
+    }
+
+    evaluations = []
+    for rule in rules:
+        depth = max(rule.entry_visits, rule.exit_visits or 1) + 2
+        values, dates = _visit_matrix(_source_rows(rule.source, rule.field, since, today), farm_ids, depth)
+
+        with np.errstate(invalid='ignore'):
+            met = rule.compare(values, rule.threshold) & ~np.isnan(values)
+        has_active = np.isin(farm_ids, [farm_id for farm_id, kind in active if kind == rule.kind])
+        candidates = np.flatnonzero(~has_active & (_leading_run(met) >= rule.entry_visits))
+        opening = [
+            i for i in candidates
+            if dates[i, 0].item() > last_evaluated.get((int(farm_ids[i]), rule.kind), date.min)
+        ]
+        evaluations.append((rule, values, dates, opening))
+
+    opening_farms = sorted({
+        int(farm_ids[i])
+        for rule, _, _, opening in evaluations
+        if rule.start_from == START_FROM_HEATMAPS
+        for i in opening
+    })
+    heatmap_dates = _heatmap_dates(opening_farms, since) if opening_farms else {}
+
+    to_create, to_update, closed, touched = [], [], [], set()
+    for rule, values, dates, opening in evaluations:
+        for i in opening:
+            farm_id = int(farm_ids[i])
+            history = _visit_history(values[i], dates[i], rule.field)
+            sensed_day, current = history[0][0], history[0][1][rule.field]
+            visits = consecutive_visits(rule, history) if rule.entry_visits > 1 else 1
+            earlier_heatmaps = [day for day in heatmap_dates.get(farm_id, []) if day < sensed_day][:2]
+
+            to_create.append(open_scenario(rule, farm_id, visits, current, sensed_day, today, history, earlier_heatmaps))
+            touched.add(farm_id)
+            stats["created"] += 1
+
+        for (farm_id, kind), analytics in active.items():
+            if kind != rule.kind:
+                continue
+            i = int(np.searchsorted(farm_ids, farm_id))
+            new_visits = [
+                (day, visit[rule.field])
+                for day, visit in reversed(_visit_history(values[i], dates[i], rule.field))
+                if day > analytics.date_current
+            ]
+
+            if new_visits:
+                for sensed_day, value in new_visits:
+                    advance_scenario(rule, analytics, value, sensed_day, today)
+                    if not analytics.is_active:
+                        break
+            elif expire_scenario(rule, analytics, today):
+                analytics.date_current = today
+            else:
+                continue
+
+            to_update.append(analytics)
+            touched.add(farm_id)
+            stats["updated" if analytics.is_active else "deactivated"] += 1
+            if not analytics.is_active:
+                closed.append((rule, analytics))
+
+    events = []
+    if closed:
+        centroids = {
+            farm.id: farm.centroid
+            for farm in Farm.objects.filter(pk__in={analytics.farm_id for _, analytics in closed}).only('id', 'farm_coordinates')
+        }
+        events = [close_event(rule, analytics, centroids[analytics.farm_id]) for rule, analytics in closed]
+
+    with transaction.atomic():
+        if to_create:
+            CropLossAnalytics.objects.bulk_create(to_create, batch_size=batch_size)
+        if to_update:
+            CropLossAnalytics.objects.bulk_update(to_update, ANALYTICS_UPDATE_FIELDS, batch_size=batch_size)
+        if events:
+            CropLossEvent.objects.bulk_create(events, batch_size=batch_size)
+        if touched:
+            touch_farms_resources(touched, "crop_loss")
+        if to_create or closed:
+            sync_region_losses(
+                {analytics.farm_id for analytics in to_create} | {analytics.farm_id for _, analytics in closed}
+            )
+
+    logger.info(f"Crop loss fleet pass over {stats['farms']} farms: {stats}")
+    return stats
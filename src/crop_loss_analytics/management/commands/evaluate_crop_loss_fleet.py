@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from crop_loss_analytics.fleet import evaluate_crop_loss_fleet
+
+class Command(BaseCommand):
+    help = "Evaluates the crop loss rules for every farm in one vectorized pass"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90)
+        parser.add_argument('--batch_size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        stats = evaluate_crop_loss_fleet(
+            lookback_days=options['days'],
+            batch_size=options['batch_size'],
+        )
+
+        self.stdout.write(
+            f"Evaluated {stats['farms']} farms: {stats['created']} created, "
+            f"{stats['updated']} updated, {stats['deactivated']} deactivated"
+        )
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from users.models import Farm
+from crop_loss_analytics.replay import replay_crop_loss_analytics
+
+class Command(BaseCommand):
+    help = "Rebuilds crop loss analytics from the stored index, weather and advisory history"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--field_id', type=str, default=None)
+        parser.add_argument('--kind', action='append', choices=['flood', 'drought', 'pest'], default=None)
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument('--dry_run', action='store_true')
+
+    def handle(self, *args, **options):
+        farm_ids = None
+        if options['field_id']:
+            farm_ids = list(Farm.objects.filter(field_id=options['field_id']).values_list('id', flat=True))
+
+        results = replay_crop_loss_analytics(
+            farm_ids=farm_ids,
+            kinds=options['kind'],
+            dry_run=options['dry_run'],
+            workers=options['workers'],
+        )
+
+        changed_farms = 0
+        for result in results:
+            if not result['diff']:
+                continue
+            changed_farms += 1
+            if options['dry_run']:
+                for entry in result['diff']:
+                    self.stdout.write(
+                        f"farm {result['farm_id']} {entry['op']} {entry['kind']} "
+                        f"{entry['date_start']}: {entry['fields']}"
+                    )
+
+        action = "would change" if options['dry_run'] else "changed"
+        self.stdout.write(f"Replayed {len(results)} farms, {changed_farms} {action}")
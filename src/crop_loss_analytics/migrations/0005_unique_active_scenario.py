@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 22:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crop_loss_analytics', '0004_croplossanalytics_metadata'),
+        ('users', '0004_farm_resource_versions'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='croplossanalytics',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='croplossanalytics',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('farm', 'kind'), name='unique_active_crop_loss_kind'),
+        ),
+    ]
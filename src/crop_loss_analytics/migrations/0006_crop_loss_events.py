@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-18 22:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TOTAL_VISITS_KEYS = ('total_visits', 'total_satellite_visits')
+
+
+def backfill_closed_scenarios(apps, schema_editor):
+    CropLossAnalytics = apps.get_model('crop_loss_analytics', 'CropLossAnalytics')
+    CropLossEvent = apps.get_model('crop_loss_analytics', 'CropLossEvent')
+    events = []
+    for analytics in CropLossAnalytics.objects.filter(is_active=False).select_related('farm').iterator(chunk_size=200):
+        metadata = analytics.metadata or {}
+        points = [point for point in analytics.farm.farm_coordinates or [] if isinstance(point, (list, tuple)) and len(point) >= 2]
+        events.append(CropLossEvent(
+            farm_id=analytics.farm_id,
+            kind=analytics.kind,
+            date_start=analytics.date_start,
+            date_end=analytics.date_end,
+            peak_severity=metadata.get('peak_severity'),
+            visits=next((metadata[key] for key in TOTAL_VISITS_KEYS if key in metadata), 0),
+            latitude=sum(float(point[0]) for point in points) / len(points) if points else None,
+            longitude=sum(float(point[1]) for point in points) / len(points) if points else None,
+        ))
+    CropLossEvent.objects.bulk_create(events, batch_size=200)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crop_loss_analytics', '0005_unique_active_scenario'),
+        ('users', '0004_farm_resource_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CropLossEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('flood', 'Flood Scenario'), ('drought', 'Drought Case'), ('pest', 'Pest Case')], max_length=20)),
+                ('date_start', models.DateField()),
+                ('date_end', models.DateField()),
+                ('peak_severity', models.FloatField(blank=True, null=True)),
+                ('visits', models.PositiveIntegerField(default=0)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('farm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='crop_loss_events', to='users.farm')),
+            ],
+            options={
+                'db_table': 'crop_loss_events',
+                'ordering': ['-date_start'],
+                'indexes': [models.Index(fields=['farm', 'kind', '-date_start'], name='crop_loss_e_farm_id_e30393_idx'), models.Index(fields=['kind', 'date_start'], name='crop_loss_e_kind_344116_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_closed_scenarios, migrations.RunPython.noop),
+    ]
@@ -20,4 +20,43 @@ class CropLossAnalytics(models.Model):
     
     metadata = models.JSONField(default=dict, blank=True)
     class Meta:
-        unique_together = ["farm", "kind", "is_active"]
\ No newline at end of file
+        # One active scenario per kind, any number of closed ones
+        constraints = [
+            models.UniqueConstraint(
+                fields=["farm", "kind"],
+                condition=models.Q(is_active=True),
+                name="unique_active_crop_loss_kind",
+            )
+        ]
+
+
+class CropLossEvent(models.Model):
+    """Closed crop loss episode, appended when a scenario ends and never updated"""
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='crop_loss_events')
+    kind = models.CharField(max_length=20, choices=CropLossAnalytics.INDEX_CHOICES)
+    date_start = models.DateField()
+    date_end = models.DateField()
+    # Most extreme signal value seen while the scenario was active (rain mm, NDMI, pest risk level)
+    peak_severity = models.FloatField(null=True, blank=True)
+    visits = models.PositiveIntegerField(default=0)
+    
+    # Farm centroid when the episode closed, for region level aggregates
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'crop_loss_events'
+        ordering = ['-date_start']
+        indexes = [
+            models.Index(fields=['farm', 'kind', '-date_start']),
+            models.Index(fields=['kind', 'date_start']),
+        ]
+    
+    def __str__(self):
+        return f"{self.farm_id} - {self.kind} - {self.date_start} to {self.date_end}"
+    
+    @property
+    def days(self) -> int:
+        return (self.date_end - self.date_start).days + 1
@@ -0,0 +1,316 @@
+import os
+import logging
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate, repeat
+from multiprocessing import get_context
+from typing import Dict, Iterable, List, Optional
+
+import django
+from django.db import connections, transaction
+
+from users.models import Farm
+from users.utils import touch_farm_resources
+from regions.utils import sync_region_losses
+from heatmaps.models import Heatmap, IndexTimeSeries
+from ai_advisory.models import Advisory
+from weather.models import WeatherPrediction
+from crop_loss_analytics.models import CropLossAnalytics, CropLossEvent
+from crop_loss_analytics.rules import (
+    CROP_LOSS_RULES,
+    SOURCE_ADVISORY,
+    SOURCE_INDEX_VALUES,
+    SOURCE_WEATHER,
+    LossRule,
+    advance_scenario,
+    close_event,
+    consecutive_visits,
+    open_scenario,
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter(
+    fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+handler.setFormatter(formatter)
+if not logger.hasHandlers():
+    logger.addHandler(handler)
+
+# Fields compared between matched stored and replayed scenarios
+DIFF_FIELDS = ("date_start", "is_active", "date_end", "closest_date_sensed", "metadata")
+
+
+def _farm_visits(farm_id: int, rules: List[LossRule]) -> Dict[str, list]:
+    """
+    Stored history of a farm as visits per signal source, oldest first.
+
+    Each visit is (today, sensed_day, {field: value}). Satellite sources are
+    replayed on the day they were stored, their created_at. Weather visits use
+    the reload date and the newest satellite day stored by then.
+    """
+    fields = {}
+    for rule in rules:
+        fields.setdefault(rule.source, set()).add(rule.field)
+    visits = {}
+
+    # (stored on, sensed_day) of every satellite visit, including index days no rule reads
+    index_reloads = {}
+    rows = (
+        IndexTimeSeries.objects
+        .filter(farm_id=farm_id)
+        .order_by('date', 'created_at')
+        .values_list('date', 'created_at', 'index_type', 'value')
+    )
+    index_visits = {}
+    for day, created_at, index_type, value in rows:
+        index_reloads.setdefault(day, created_at.date())
+        if index_type in fields.get(SOURCE_INDEX_VALUES, ()):
+            index_visits.setdefault(day, {})[index_type] = value
+    if SOURCE_INDEX_VALUES in fields:
+        visits[SOURCE_INDEX_VALUES] = sorted(
+            (index_reloads[day], day, values) for day, values in index_visits.items()
+        )
+
+    advisory_fields = sorted(fields.get(SOURCE_ADVISORY, ()))
+    advisory_rows = (
+        Advisory.objects
+        .filter(farm_id=farm_id)
+        .order_by('created_at')
+        .values_list('created_at', 'sensed_day', *advisory_fields)
+    )
+    visits[SOURCE_ADVISORY] = [(row[0].date(), row[1], dict(zip(advisory_fields, row[2:]))) for row in advisory_rows]
+
+    if SOURCE_WEATHER in fields:
+        satellite_reloads = sorted(
+            {(stored, day) for day, stored in index_reloads.items()}
+            | {(stored, day) for stored, day, _ in visits[SOURCE_ADVISORY]}
+        )
+        stored_days = [stored for stored, _ in satellite_reloads]
+        newest_days = list(accumulate((day for _, day in satellite_reloads), max))
+        weather_fields = sorted(fields[SOURCE_WEATHER])
+        rows = (
+            WeatherPrediction.objects
+            .filter(farm_id=farm_id, is_current=True)
+            .order_by('date_of_reload', 'id')
+            .values_list('date_of_reload', 'date', *weather_fields)
+        )
+        visits[SOURCE_WEATHER] = []
+        for row in rows:
+            today = row[0].date()
+            # Newest sensed day among the satellite visits stored up to this reload
+            position = bisect_right(stored_days, today)
+            sensed_day = newest_days[position - 1] if position else row[1]
+            visits[SOURCE_WEATHER].append((today, sensed_day, dict(zip(weather_fields, row[2:]))))
+
+    return visits
+
+
+def replay_farm(farm_id: int, rules: Iterable[LossRule] = CROP_LOSS_RULES) -> List[CropLossAnalytics]:
+    """
+    Rebuild the crop loss timeline of a farm from its stored history.
+
+    Every visit is fed through the same rule logic as a live reload, in date
+    order, so the result only depends on the stored history and the rules.
+
+    Returns:
+        list: Unsaved CropLossAnalytics, closed scenarios followed by any still active.
+    """
+    rules = list(rules)
+    visits_by_source = _farm_visits(farm_id, rules)
+    heatmap_days = list(
+        Heatmap.objects
+        .filter(farm_id=farm_id)
+        .order_by('date')
+        .values_list('date', flat=True)
+        .distinct()
+    )
+
+    timeline = []
+    for rule in rules:
+        visits = visits_by_source.get(rule.source, [])
+        depth = rule.entry_visits + 2
+        analytics = None
+
+        for position, (today, sensed_day, values) in enumerate(visits):
+            value = values.get(rule.field)
+
+            if analytics is not None:
+                advance_scenario(rule, analytics, value, sensed_day, today)
+                if not analytics.is_active:
+                    timeline.append(analytics)
+                    analytics = None
+                continue
+
+            if not rule.is_met(value):
+                continue
+
+            history = [(day, values) for _, day, values in reversed(visits[max(0, position - depth + 1):position + 1])]
+            count = consecutive_visits(rule, history) if rule.entry_visits > 1 else 1
+            if count < rule.entry_visits:
+                continue
+
+            # Two newest heatmap dates strictly before the sensed day
+            cut = bisect_left(heatmap_days, sensed_day)
+            analytics = open_scenario(rule, farm_id, count, value, sensed_day, today, history, heatmap_days[max(0, cut - 2):cut][::-1])
+
+        if analytics is not None:
+            timeline.append(analytics)
+
+    return timeline
+
+
+def _scenario_values(analytics: CropLossAnalytics) -> dict:
+    return {field: getattr(analytics, field) for field in DIFF_FIELDS}
+
+
+def _match_scenarios(stored: List[CropLossAnalytics], replayed: List[CropLossAnalytics]) -> list:
+    """
+    Pair stored and replayed scenarios of the same kind.
+
+    Scenarios with the same date_start are paired first, then the rest by
+    overlapping [date_start, date_end] periods in start order, so a scenario
+    whose start moved is one change rather than a remove and an add.
+
+    Returns:
+        list: (stored, replayed) pairs, either side None when unmatched.
+    """
+    pairs, unmatched = [], []
+    remaining = sorted(replayed, key=lambda analytics: analytics.date_start)
+    for before in sorted(stored, key=lambda analytics: analytics.date_start):
+        after = next(
+            (analytics for analytics in remaining
+             if analytics.kind == before.kind and analytics.date_start == before.date_start),
+            None
+        )
+        if after is None:
+            unmatched.append(before)
+            continue
+        remaining.remove(after)
+        pairs.append((before, after))
+
+    for before in unmatched:
+        after = next(
+            (analytics for analytics in remaining
+             if analytics.kind == before.kind
+             and analytics.date_start <= before.date_end
+             and before.date_start <= analytics.date_end),
+            None
+        )
+        if after is not None:
+            remaining.remove(after)
+        pairs.append((before, after))
+
+    return pairs + [(None, after) for after in remaining]
+
+
+def diff_timeline(stored: List[CropLossAnalytics], replayed: List[CropLossAnalytics]) -> List[dict]:
+    """
+    Compare stored and replayed scenarios of the same kind that cover the same period.
+
+    date_current is left out, it only records when the last evaluation ran.
+
+    Returns:
+        list: {"op": "add" | "remove" | "change", "kind", "date_start", "fields"} entries,
+            fields holding [stored, replayed] pairs for changes. date_start is the
+            stored one for changes.
+    """
+    diff = []
+    for before, after in _match_scenarios(stored, replayed):
+        if before is None:
+            diff.append({"op": "add", "kind": after.kind, "date_start": after.date_start, "fields": _scenario_values(after)})
+        elif after is None:
+            diff.append({"op": "remove", "kind": before.kind, "date_start": before.date_start, "fields": _scenario_values(before)})
+        else:
+            before_values, after_values = _scenario_values(before), _scenario_values(after)
+            changed = {
+                field: [before_values[field], after_values[field]]
+                for field in DIFF_FIELDS
+                if before_values[field] != after_values[field]
+            }
+            if changed:
+                diff.append({"op": "change", "kind": before.kind, "date_start": before.date_start, "fields": changed})
+    return sorted(diff, key=lambda entry: (entry["kind"], entry["date_start"]))
+
+
+def replay_and_save(
+    farm_id: int,
+    kinds: Optional[List[str]] = None,
+    dry_run: bool = False,
+    rules: Iterable[LossRule] = CROP_LOSS_RULES,
+) -> dict:
+    """
+    Replay one farm and replace its stored scenarios and events unless dry_run is set.
+
+    Returns:
+        dict: farm_id, number of replayed scenarios and the diff against the stored ones.
+    """
+    rules = [rule for rule in rules if not kinds or rule.kind in kinds]
+    replayed = replay_farm(farm_id, rules)
+    stored = list(CropLossAnalytics.objects.filter(farm_id=farm_id, kind__in=[rule.kind for rule in rules]))
+    diff = diff_timeline(stored, replayed)
+
+    if diff and not dry_run:
+        rules_by_kind = {rule.kind: rule for rule in rules}
+        closed = [analytics for analytics in replayed if not analytics.is_active]
+        centroid = Farm.objects.only('id', 'farm_coordinates').get(pk=farm_id).centroid if closed else None
+        events = [close_event(rules_by_kind[analytics.kind], analytics, centroid) for analytics in closed]
+        with transaction.atomic():
+            CropLossAnalytics.objects.filter(pk__in=[analytics.pk for analytics in stored]).delete()
+            CropLossAnalytics.objects.bulk_create(replayed)
+            # The event log is append-only except here, where the whole timeline is rebuilt
+            CropLossEvent.objects.filter(farm_id=farm_id, kind__in=list(rules_by_kind)).delete()
+            CropLossEvent.objects.bulk_create(events)
+            touch_farm_resources(farm_id, "crop_loss")
+            sync_region_losses([farm_id])
+
+    return {"farm_id": farm_id, "scenarios": len(replayed), "diff": diff}
+
+
+def replay_crop_loss_analytics(
+    farm_ids: Optional[List[int]] = None,
+    kinds: Optional[List[str]] = None,
+    dry_run: bool = False,
+    workers: Optional[int] = None,
+    rules: Iterable[LossRule] = CROP_LOSS_RULES,
+) -> List[dict]:
+    """
+    Rebuild CropLossAnalytics of many farms from their stored history.
+
+    Farms are independent, so they are replayed in parallel on a process pool.
+    Each worker opens its own database connection.
+
+    Args:
+        farm_ids (List[int]): Farms to replay, defaults to every farm.
+        kinds (List[str]): Loss kinds to replay, defaults to every rule.
+        dry_run (bool): Only compute the diff, do not write.
+        workers (int): Worker processes, defaults to the CPU count. 1 runs inline.
+        rules (Iterable[LossRule]): Rules to replay with, e.g. a changed threshold.
+
+    Returns:
+        list: replay_and_save() results, in farm order.
+    """
+    if farm_ids is None:
+        farm_ids = list(Farm.objects.order_by('id').values_list('id', flat=True))
+    workers = workers or os.cpu_count() or 1
+    rules = list(rules)
+
+    if workers <= 1 or len(farm_ids) <= 1:
+        return [replay_and_save(farm_id, kinds, dry_run, rules) for farm_id in farm_ids]
+
+    # Connections must not be shared with the workers. Spawned workers inherit
+    # DJANGO_SETTINGS_MODULE and set Django up before unpickling any task, since
+    # importing this module needs the app registry
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"), initializer=django.setup) as pool:
+        return list(pool.map(
+            replay_and_save,
+            farm_ids,
+            repeat(kinds),
+            repeat(dry_run),
+            repeat(rules),
+            chunksize=max(1, len(farm_ids) // (workers * 4)),
+        ))
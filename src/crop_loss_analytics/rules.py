@@ -0,0 +1,225 @@
+import operator
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Callable, List, Optional, Tuple
+
+from ai_advisory.models import Advisory
+from crop_loss_analytics.models import CropLossAnalytics, CropLossEvent
+
+# Signal sources a rule can read. Each source is one payload the pipeline already
+# holds for the reload plus one history table, queried at most once per evaluation
+# no matter how many rules share it.
+SOURCE_WEATHER = "weather"
+SOURCE_INDEX_VALUES = "index_values"
+SOURCE_ADVISORY = "advisory"
+
+# Where date_start of a newly created scenario comes from
+START_FROM_HEATMAPS = "heatmaps"
+START_FROM_HISTORY = "history"
+
+
+@dataclass(frozen=True)
+class LossRule:
+    """
+    Declarative description of one crop loss scenario.
+
+    Attributes:
+        kind (str): CropLossAnalytics.kind written by this rule.
+        source (str): Signal source (SOURCE_WEATHER, SOURCE_INDEX_VALUES, SOURCE_ADVISORY).
+        field (str): Value read from the source payload / history rows.
+        compare (Callable): Comparison applied as compare(value, threshold).
+        threshold (float): Threshold the signal is compared against.
+        extension_days (int): Days date_end is pushed past today while the condition holds.
+        entry_visits (int): Consecutive visits meeting the condition needed to open a scenario.
+        exit_visits (int): Consecutive visits without the condition that close a scenario.
+        exit_grace_days (int): Days past date_end without the condition that close a scenario.
+        start_from (str): START_FROM_HEATMAPS or START_FROM_HISTORY.
+        total_visits_key (str): Metadata key counting every evaluated visit.
+    """
+    kind: str
+    source: str
+    field: str
+    compare: Callable
+    threshold: float
+    extension_days: int
+    entry_visits: int = 1
+    exit_visits: Optional[int] = None
+    exit_grace_days: Optional[int] = None
+    start_from: str = START_FROM_HEATMAPS
+    total_visits_key: str = "total_visits"
+
+    @property
+    def visits_key(self) -> str:
+        return f"consecutive_{self.kind}_visits"
+
+    @property
+    def no_visits_key(self) -> str:
+        return f"consecutive_no_{self.kind}_visits"
+
+    def peak(self, current, value):
+        """More extreme of two signal values in the direction of the rule"""
+        if value is None:
+            return current
+        value = float(value)
+        if current is None or self.compare(value, current):
+            return value
+        return current
+
+    def is_met(self, value) -> bool:
+        """Check a single signal value against the rule threshold"""
+        if value is None:
+            return False
+        try:
+            return self.compare(float(value), self.threshold)
+        except (TypeError, ValueError):
+            return False
+
+
+CROP_LOSS_RULES = (
+    # Heavy rain in today's forecast, no consecutive requirement
+    LossRule(
+        kind="flood",
+        source=SOURCE_WEATHER,
+        field="rain",
+        compare=operator.gt,
+        threshold=75,
+        extension_days=3,
+        exit_grace_days=4,
+    ),
+    # Low moisture over 4 consecutive satellite visits
+    LossRule(
+        kind="drought",
+        source=SOURCE_INDEX_VALUES,
+        field="ndmi",
+        compare=operator.lt,
+        threshold=30,
+        extension_days=30,
+        entry_visits=4,
+        exit_visits=4,
+        total_visits_key="total_satellite_visits",
+    ),
+    # High probability pest in 4 consecutive advisories
+    LossRule(
+        kind="pest",
+        source=SOURCE_ADVISORY,
+        field="pest_risk",
+        compare=operator.ge,
+        threshold=Advisory.PEST_RISK_HIGH,
+        extension_days=3,
+        entry_visits=4,
+        exit_visits=4,
+        start_from=START_FROM_HISTORY,
+    ),
+)
+
+
+def consecutive_visits(rule: LossRule, history: List[Tuple[date, dict]]) -> int:
+    """Count the newest visits in a row that meet the rule"""
+    count = 0
+    for _, values in history[:rule.entry_visits]:
+        if not rule.is_met(values.get(rule.field)):
+            break
+        count += 1
+    return count
+
+
+def scenario_start_date(rule: LossRule, sensed_day: date, history: List[Tuple[date, dict]], heatmap_dates: List[date]) -> date:
+    """Second last visit before the sensed day, else the earliest visit of the entry window"""
+    if rule.start_from == START_FROM_HEATMAPS:
+        earlier_days = heatmap_dates
+    else:
+        earlier_days = [day for day, _ in history if day < sensed_day]
+
+    if len(earlier_days) > 1:
+        return earlier_days[1]
+    if rule.entry_visits > 1 and len(history) >= rule.entry_visits:
+        return history[rule.entry_visits - 1][0]
+    return sensed_day
+
+
+def open_scenario(
+    rule: LossRule,
+    farm_id: int,
+    visits: int,
+    value,
+    sensed_day: date,
+    today: date,
+    history: List[Tuple[date, dict]],
+    heatmap_dates: List[date],
+) -> CropLossAnalytics:
+    """Build a new active scenario after visits consecutive detections, value being the current signal"""
+    peak_severity = rule.peak(None, value)
+    for _, values in history[:visits]:
+        peak_severity = rule.peak(peak_severity, values.get(rule.field))
+
+    return CropLossAnalytics(
+        farm_id=farm_id,
+        kind=rule.kind,
+        is_active=True,
+        date_start=scenario_start_date(rule, sensed_day, history, heatmap_dates),
+        date_current=today,
+        date_end=today + timedelta(days=rule.extension_days),
+        closest_date_sensed=sensed_day,
+        metadata={
+            rule.visits_key: visits,
+            rule.no_visits_key: 0,
+            rule.total_visits_key: visits,
+            "peak_severity": peak_severity,
+        }
+    )
+
+
+def advance_scenario(rule: LossRule, analytics: CropLossAnalytics, value, sensed_day: date, today: date) -> str:
+    """Apply one visit with signal value to an active scenario, returns the resulting action"""
+    metadata = analytics.metadata or {}
+    visits = metadata.get(rule.visits_key, 0)
+    no_visits = metadata.get(rule.no_visits_key, 0)
+    peak_severity = metadata.get("peak_severity")
+
+    if rule.is_met(value):
+        # Condition still there, extend the end date
+        analytics.date_end = today + timedelta(days=rule.extension_days)
+        visits, no_visits = visits + 1, 0
+        peak_severity = rule.peak(peak_severity, value)
+    else:
+        visits, no_visits = 0, no_visits + 1
+        if rule.exit_visits is not None and no_visits >= rule.exit_visits:
+            analytics.is_active = False
+        expire_scenario(rule, analytics, today)
+
+    # Keep the sensed day closest to the projected end date
+    if abs((analytics.date_end - sensed_day).days) < abs((analytics.date_end - analytics.closest_date_sensed).days):
+        analytics.closest_date_sensed = sensed_day
+
+    analytics.date_current = today
+    analytics.metadata = {
+        **metadata,
+        rule.visits_key: visits,
+        rule.no_visits_key: no_visits,
+        rule.total_visits_key: metadata.get(rule.total_visits_key, 0) + 1,
+        "peak_severity": peak_severity,
+    }
+    return "updated" if analytics.is_active else "deactivated"
+
+
+def expire_scenario(rule: LossRule, analytics: CropLossAnalytics, today: date) -> bool:
+    """Deactivate a scenario more than exit_grace_days past its end date, returns whether it is closed"""
+    if rule.exit_grace_days is not None and (today - analytics.date_end).days > rule.exit_grace_days:
+        analytics.is_active = False
+    return not analytics.is_active
+
+
+def close_event(rule: LossRule, analytics: CropLossAnalytics, centroid) -> CropLossEvent:
+    """Event log row for a scenario that just became inactive"""
+    metadata = analytics.metadata or {}
+    latitude, longitude = centroid
+    return CropLossEvent(
+        farm_id=analytics.farm_id,
+        kind=rule.kind,
+        date_start=analytics.date_start,
+        date_end=analytics.date_end,
+        peak_severity=metadata.get("peak_severity"),
+        visits=metadata.get(rule.total_visits_key, 0),
+        latitude=latitude,
+        longitude=longitude,
+    )
@@ -1,3 +1,354 @@
+from dataclasses import replace
+from datetime import date, timedelta
+
 from django.test import TestCase
+from ninja_jwt.tokens import AccessToken
+
+from testing.fixtures import DAY, advisory_response, index_visit, make_farm, weather_visit
+from ai_advisory.utils import save_ai_adviosry_from_response
+from crop_loss_analytics.fleet import evaluate_crop_loss_fleet
+from crop_loss_analytics.models import CropLossAnalytics, CropLossEvent
+from crop_loss_analytics.replay import diff_timeline, replay_and_save, replay_farm
+from crop_loss_analytics.rules import CROP_LOSS_RULES
+from crop_loss_analytics.utils import apply_crop_loss_rules
+from regions.utils import assign_farm_region
+from utils.query_metrics import assert_max_queries
+
+
+class CropLossRuleTests(TestCase):
+
+    def setUp(self):
+        self.farm = make_farm()
+
+    def rain(self, day: date, rain: float) -> dict:
+        return apply_crop_loss_rules(self.farm, day, {"weather": {"daily": [{"rain": rain}]}}, today=day)
+
+    def ndmi(self, day: date, ndmi: float) -> dict:
+        index_visit(self.farm, day, ndmi)
+        return apply_crop_loss_rules(self.farm, day, {"index_values": {"ndmi": ndmi}}, today=day)
+
+    def test_only_rules_of_given_sources_are_evaluated(self):
+        self.assertEqual(self.rain(DAY, 10), {"flood": "none"})
+        self.assertEqual(apply_crop_loss_rules(self.farm, DAY, {}, today=DAY), {})
+
+    def test_flood_opens_extends_and_closes_into_event(self):
+        self.assertEqual(self.rain(DAY, 100), {"flood": "created"})
+        self.assertEqual(self.rain(DAY + timedelta(days=1), 120), {"flood": "updated"})
+
+        flood = CropLossAnalytics.objects.get(farm=self.farm, kind="flood")
+        self.assertEqual(flood.date_end, DAY + timedelta(days=4))
+        self.assertEqual(flood.metadata["peak_severity"], 120)
+
+        # Dry days keep it open until 4 grace days past date_end
+        self.assertEqual(self.rain(DAY + timedelta(days=8), 0), {"flood": "updated"})
+        self.assertEqual(self.rain(DAY + timedelta(days=9), 0), {"flood": "deactivated"})
+
+        self.assertFalse(CropLossAnalytics.objects.filter(farm=self.farm, is_active=True).exists())
+        event = CropLossEvent.objects.get(farm=self.farm)
+        self.assertEqual((event.kind, event.date_start, event.date_end), ("flood", DAY, DAY + timedelta(days=4)))
+        self.assertEqual((event.peak_severity, event.visits), (120, 4))
+        self.assertAlmostEqual(event.latitude, self.farm.centroid[0])
+
+    def test_drought_waits_for_consecutive_visits(self):
+        days = [DAY + timedelta(days=5 * n) for n in range(6)]
+        self.assertEqual(self.ndmi(days[0], 45), {"drought": "none"})
+        for day in days[1:4]:
+            self.assertEqual(self.ndmi(day, 20), {"drought": "pending"})
+        self.assertEqual(self.ndmi(days[4], 25), {"drought": "created"})
+
+        drought = CropLossAnalytics.objects.get(farm=self.farm, kind="drought")
+        self.assertEqual(drought.date_start, days[1])
+        self.assertEqual(drought.metadata["consecutive_drought_visits"], 4)
+        self.assertEqual(drought.metadata["peak_severity"], 20)
+
+    def test_drought_closes_after_exit_visits(self):
+        days = [DAY + timedelta(days=5 * n) for n in range(8)]
+        for day in days[:4]:
+            self.ndmi(day, 20)
+        for day in days[4:7]:
+            self.assertEqual(self.ndmi(day, 40), {"drought": "updated"})
+        self.assertEqual(self.ndmi(days[7], 40), {"drought": "deactivated"})
+        self.assertEqual(CropLossEvent.objects.get(farm=self.farm).visits, 8)
+
+
+class PestRuleTests(TestCase):
+    """The pest rule reads the pest risk extracted from each saved advisory"""
+
+    def setUp(self):
+        self.farm = make_farm()
+
+    def advisory(self, day: date, *pest_levels: str) -> dict:
+        response = advisory_response(day, pest_levels=list(pest_levels))
+        save_ai_adviosry_from_response(response, self.farm.field_id, farm=self.farm)
+        return apply_crop_loss_rules(self.farm, day, {"advisory": response}, today=day)
+
+    def test_four_high_risk_advisories_open_a_pest_scenario(self):
+        days = [DAY + timedelta(days=7 * n) for n in range(5)]
+        self.assertEqual(self.advisory(days[0], "moderate"), {"pest": "none"})
+        for day in days[1:4]:
+            self.assertEqual(self.advisory(day, "low", "High"), {"pest": "pending"})
+        self.assertEqual(self.advisory(days[4], "HIGH"), {"pest": "created"})
+
+        pest = CropLossAnalytics.objects.get(farm=self.farm, kind="pest")
+        self.assertEqual((pest.date_start, pest.closest_date_sensed), (days[2], days[4]))
+        self.assertEqual(pest.metadata["consecutive_pest_visits"], 4)
+
+    def test_moderate_advisory_breaks_the_streak(self):
+        days = [DAY + timedelta(days=7 * n) for n in range(5)]
+        for day in days[:2]:
+            self.advisory(day, "high")
+        self.assertEqual(self.advisory(days[2], "moderate"), {"pest": "none"})
+        for day in days[3:]:
+            self.assertEqual(self.advisory(day, "high"), {"pest": "pending"})
+
+
+class ReplayTests(TestCase):
+    """Replaying the stored history gives the timeline the live reloads built"""
+
+    # (days after DAY, ndmi) satellite visits and (days after DAY, rain) weather reloads
+    SATELLITE = [(0, 45), (5, 20), (10, 22), (15, 18), (20, 25), (25, 40), (30, 41), (35, 42), (40, 43), (45, 28)]
+    WEATHER = [(1, 10), (3, 100), (4, 80), (6, 0), (12, 0), (13, 0), (21, 90), (27, 0)]
+    # Satellite passes are only reloaded two days after they are sensed
+    SATELLITE_LAG = 2
+
+    def setUp(self):
+        self.farm = make_farm()
+        reloads = [(offset + self.SATELLITE_LAG, "index_values", offset, ndmi) for offset, ndmi in self.SATELLITE]
+        reloads += [(offset, "weather", offset, rain) for offset, rain in self.WEATHER]
+        sensed_day = DAY
+        for reload_offset, source, offset, value in sorted(reloads):
+            today = DAY + timedelta(days=reload_offset)
+            if source == "index_values":
+                sensed_day = DAY + timedelta(days=offset)
+                index_visit(self.farm, sensed_day, value, reloaded=today)
+                signals = {"index_values": {"ndmi": value}}
+            else:
+                weather_visit(self.farm, today, value)
+                signals = {"weather": {"daily": [{"rain": value}]}}
+            apply_crop_loss_rules(self.farm, sensed_day, signals, today=today)
+
+    def stored(self):
+        return list(CropLossAnalytics.objects.filter(farm=self.farm))
+
+    def drought_rules(self, **changes):
+        return [replace(rule, **changes) if rule.kind == "drought" else rule for rule in CROP_LOSS_RULES]
+
+    def test_replay_matches_live_timeline(self):
+        stored = self.stored()
+        self.assertEqual(
+            sorted((analytics.kind, analytics.is_active) for analytics in stored),
+            [("drought", False), ("flood", False), ("flood", True)],
+        )
+        drought = next(analytics for analytics in stored if analytics.kind == "drought")
+        # Extended from the reload date, not the sensed day
+        self.assertEqual(drought.date_end, DAY + timedelta(days=20 + self.SATELLITE_LAG + 30))
+        self.assertEqual(diff_timeline(stored, replay_farm(self.farm.id)), [])
+
+    def test_changed_threshold_shows_in_dry_run_diff(self):
+        # A stricter drought threshold would never have opened the scenario
+        diff = diff_timeline(self.stored(), replay_farm(self.farm.id, self.drought_rules(threshold=15)))
+        self.assertEqual([(item["op"], item["kind"]) for item in diff], [("remove", "drought")])
+
+    def test_moved_start_is_one_change(self):
+        # Opening on the first low visit starts the drought on day 15 instead of day 5
+        rules = self.drought_rules(threshold=19, entry_visits=1)
+
+        diff = diff_timeline(self.stored(), replay_farm(self.farm.id, rules))
+
+        self.assertEqual([(item["op"], item["kind"]) for item in diff], [("change", "drought")])
+        self.assertEqual(diff[0]["fields"]["date_start"], [DAY + timedelta(days=5), DAY + timedelta(days=15)])
+
+    def test_replay_and_save_uses_the_given_rules(self):
+        rules = self.drought_rules(threshold=15)
+
+        result = replay_and_save(self.farm.id, dry_run=True, rules=rules)
+        self.assertEqual([(item["op"], item["kind"]) for item in result["diff"]], [("remove", "drought")])
+        self.assertEqual(len(self.stored()), 3)
+
+        replay_and_save(self.farm.id, rules=rules)
+        self.assertEqual(sorted(analytics.kind for analytics in self.stored()), ["flood", "flood"])
+        self.assertFalse(CropLossEvent.objects.filter(farm=self.farm, kind="drought").exists())
+        self.assertEqual(replay_and_save(self.farm.id, dry_run=True, rules=rules)["diff"], [])
+
+
+class FleetEvaluationTests(TestCase):
+
+    def setUp(self):
+        self.farm = make_farm()
+
+    def flood(self):
+        return CropLossAnalytics.objects.get(farm=self.farm, kind="flood")
+
+    def test_heavy_rain_opens_flood_scenario(self):
+        weather_visit(self.farm, DAY, rain=100)
+
+        stats = evaluate_crop_loss_fleet(today=DAY)
+
+        self.assertEqual(stats["created"], 1)
+        self.assertTrue(self.flood().is_active)
+        self.assertEqual(self.flood().date_end, DAY + timedelta(days=3))
+
+    def test_pass_without_new_visit_does_not_extend(self):
+        weather_visit(self.farm, DAY, rain=100)
+        evaluate_crop_loss_fleet(today=DAY)
+
+        evaluate_crop_loss_fleet(today=DAY + timedelta(days=2))
+
+        self.assertEqual(self.flood().date_end, DAY + timedelta(days=3))
+
+    def test_new_visit_extends(self):
+        weather_visit(self.farm, DAY, rain=100)
+        evaluate_crop_loss_fleet(today=DAY)
+
+        weather_visit(self.farm, DAY + timedelta(days=2), rain=90)
+        evaluate_crop_loss_fleet(today=DAY + timedelta(days=2))
+
+        self.assertEqual(self.flood().date_end, DAY + timedelta(days=5))
+        self.assertEqual(self.flood().metadata["peak_severity"], 100)
+
+    def test_farm_that_stopped_reloading_closes_after_grace_period(self):
+        weather_visit(self.farm, DAY, rain=100)
+        evaluate_crop_loss_fleet(today=DAY)
+
+        # date_end is DAY + 3 and the flood rule allows 4 grace days
+        for offset in range(1, 8):
+            evaluate_crop_loss_fleet(today=DAY + timedelta(days=offset))
+        self.assertTrue(self.flood().is_active)
+
+        stats = evaluate_crop_loss_fleet(today=DAY + timedelta(days=8))
+
+        self.assertEqual(stats["deactivated"], 1)
+        self.assertFalse(self.flood().is_active)
+        event = CropLossEvent.objects.get(farm=self.farm, kind="flood")
+        self.assertEqual((event.date_start, event.date_end), (DAY, DAY + timedelta(days=3)))
+
+
+    def test_farm_without_visits_in_the_window_still_closes(self):
+        weather_visit(self.farm, DAY, rain=100)
+        evaluate_crop_loss_fleet(today=DAY)
+
+        stats = evaluate_crop_loss_fleet(today=DAY + timedelta(days=100))
+
+        self.assertEqual(stats["deactivated"], 1)
+        self.assertFalse(self.flood().is_active)
+        # The visit that opened it is not applied again
+        self.assertEqual(evaluate_crop_loss_fleet(today=DAY + timedelta(days=101))["created"], 0)
+
+    def test_matches_the_per_reload_path(self):
+        # Every reload fetches the forecast, dry unless listed, and sees the
+        # satellite pass of its own day
+        rain_by_offset = dict(ReplayTests.WEATHER)
+        reloads = {}
+        for offset, ndmi in ReplayTests.SATELLITE:
+            index_visit(self.farm, DAY + timedelta(days=offset), ndmi)
+            reloads[DAY + timedelta(days=offset)] = {"index_values": {"ndmi": ndmi}}
+        for offset in sorted(set(rain_by_offset) | {offset for offset, _ in ReplayTests.SATELLITE}):
+            day, rain = DAY + timedelta(days=offset), rain_by_offset.get(offset, 0)
+            weather_visit(self.farm, day, rain)
+            reloads.setdefault(day, {})["weather"] = {"daily": [{"rain": rain}]}
+
+        def timeline():
+            scenarios = sorted(
+                (analytics.kind, analytics.date_start, analytics.is_active, analytics.date_current,
+                 analytics.date_end, analytics.closest_date_sensed, analytics.metadata)
+                for analytics in CropLossAnalytics.objects.filter(farm=self.farm)
+            )
+            events = sorted(
+                (event.kind, event.date_start, event.date_end, event.peak_severity, event.visits)
+                for event in CropLossEvent.objects.filter(farm=self.farm)
+            )
+            return scenarios, events
+
+        for day in sorted(reloads):
+            apply_crop_loss_rules(self.farm, day, reloads[day], today=day)
+        per_reload = timeline()
+        CropLossAnalytics.objects.all().delete()
+        CropLossEvent.objects.all().delete()
+
+        for day in sorted(reloads):
+            evaluate_crop_loss_fleet(today=day)
+
+        self.assertEqual(timeline(), per_reload)
+        self.assertEqual([kind for kind, *_ in per_reload[1]], ["drought", "flood", "flood"])
+
+
+class ReadQueryBudgetTests(TestCase):
+    """The read endpoints issue a fixed number of queries however many scenarios a farm has"""
+
+    def setUp(self):
+        self.farm = make_farm()
+        for offset in range(0, 60, 10):
+            CropLossEvent.objects.create(
+                farm=self.farm, kind="flood",
+                date_start=DAY + timedelta(days=offset), date_end=DAY + timedelta(days=offset + 3),
+            )
+        for kind in ("flood", "drought", "pest"):
+            CropLossAnalytics.objects.create(
+                farm=self.farm, kind=kind, date_start=DAY, date_current=DAY,
+                date_end=DAY + timedelta(days=3), closest_date_sensed=DAY,
+            )
+        token = AccessToken.for_user(self.farm.user)
+        self.headers = {"HTTP_HOST": "localhost", "HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+    def get(self, path: str):
+        response = self.client.get(f"/api/crop_loss_analytics/{path}", **self.headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_summary(self):
+        # User, farm, active scenarios
+        with assert_max_queries(3, repeated=0):
+            summary = self.get("crop_loss_summary")
+        self.assertEqual(summary["flood"]["start_date"], DAY.isoformat())
+
+    def test_timeline(self):
+        # User, farm, event count, ongoing scenarios, event page
+        with assert_max_queries(5, repeated=0):
+            timeline = self.get("crop_loss_timeline?page_size=5")
+        self.assertEqual((timeline["count"], len(timeline["results"]), len(timeline["ongoing"])), (6, 5, 3))
+
+
+class RegionSummaryAccessTests(TestCase):
+    """Only staff see every farm, other users the region cells of their own farms"""
+
+    def setUp(self):
+        # a and b share a cell, c is in the next cell east
+        self.farms = {name: make_farm(name, 15.55, longitude) for name, longitude in (("a", 73.71), ("b", 73.75), ("c", 73.85))}
+        for farm in self.farms.values():
+            assign_farm_region(farm)
+            CropLossEvent.objects.create(
+                farm=farm, kind="flood", date_start=DAY, date_end=DAY + timedelta(days=3),
+                latitude=15.55, longitude=farm.farm_coordinates[0][1],
+            )
+
+    def get(self, user):
+        token = AccessToken.for_user(user)
+        return self.client.get(
+            "/api/crop_loss_analytics/crop_loss_region_summary",
+            {"date_from": DAY.isoformat(), "date_to": (DAY + timedelta(days=30)).isoformat()},
+            HTTP_HOST="localhost",
+            HTTP_AUTHORIZATION=f"Bearer {token}",
+        )
+
+    def flood_farms(self, user) -> int:
+        response = self.get(user)
+        self.assertEqual(response.status_code, 200, response.content)
+        return {row["kind"]: row["farms"] for row in response.json()["kinds"]}["flood"]
+
+    def test_user_sees_the_cell_of_their_farm(self):
+        self.assertEqual(self.flood_farms(self.farms["a"].user), 2)
+        self.assertEqual(self.flood_farms(self.farms["c"].user), 1)
+
+    def test_staff_sees_every_farm(self):
+        staff = self.farms["c"].user
+        staff.is_staff = True
+        staff.save()
+
+        self.assertEqual(self.flood_farms(staff), 3)
+
+    def test_user_without_farm_region_is_forbidden(self):
+        farm = make_farm("d")
+
+        response = self.get(farm.user)
 
-# Create your tests here.
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,202 @@
+import logging
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+
+from users.models import Farm
+from users.utils import touch_farm_resources
+from regions.utils import sync_region_losses
+from heatmaps.models import Heatmap, IndexTimeSeries
+from ai_advisory.models import Advisory
+from weather.models import WeatherPrediction
+from crop_loss_analytics.models import CropLossAnalytics, CropLossEvent
+from crop_loss_analytics.rules import (
+    CROP_LOSS_RULES,
+    SOURCE_ADVISORY,
+    SOURCE_INDEX_VALUES,
+    SOURCE_WEATHER,
+    START_FROM_HEATMAPS,
+    START_FROM_HISTORY,
+    LossRule,
+    advance_scenario,
+    close_event,
+    consecutive_visits,
+    open_scenario,
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter(
+    fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+handler.setFormatter(formatter)
+if not logger.hasHandlers():
+    logger.addHandler(handler)
+
+ANALYTICS_UPDATE_FIELDS = ["is_active", "date_end", "date_current", "closest_date_sensed", "metadata"]
+
+
+def _current_signals(source: str, payload: dict) -> dict:
+    """Extract {field: value} of the current visit from a pipeline payload"""
+    if not payload:
+        return {}
+    if source == SOURCE_WEATHER:
+        daily = (payload.get("weather") or payload).get("daily") or []
+        return daily[0] if daily and isinstance(daily[0], dict) else {}
+    if source == SOURCE_INDEX_VALUES:
+        return {key: None if value == -1 else value for key, value in payload.items() if key != "_meta"}
+    if source == SOURCE_ADVISORY:
+        pest_risk, _ = Advisory.extract_pest_risk(payload.get("advisory", {}))
+        return {"pest_risk": pest_risk}
+    return {}
+
+
+def _load_history(farm: Farm, source: str, fields: List[str], depth: int, sensed_day: date, today: date) -> List[Tuple[date, dict]]:
+    """Most recent visits of a source as [(date, {field: value}), ...], newest first"""
+    if source == SOURCE_INDEX_VALUES:
+        # Every sensed day stores all index types, so depth days span depth * len(fields) rows
+        rows = (
+            IndexTimeSeries.objects
+            .filter(farm=farm, index_type__in=fields, date__lte=sensed_day)
+            .order_by('-date')
+            .values_list('date', 'index_type', 'value')[:depth * len(fields)]
+        )
+        visits = {}
+        for day, index_type, value in rows:
+            visits.setdefault(day, {})[index_type] = value
+        return list(visits.items())
+
+    if source == SOURCE_ADVISORY:
+        rows = (
+            Advisory.objects
+            .filter(farm=farm, sensed_day__lte=sensed_day)
+            .order_by('-sensed_day')
+            .values_list('sensed_day', *fields)[:depth]
+        )
+    elif source == SOURCE_WEATHER:
+        # One visit per reload: the current day row of each forecast batch
+        rows = (
+            WeatherPrediction.objects
+            .filter(farm=farm, is_current=True, date__lte=today)
+            .order_by('-date_of_reload')
+            .values_list('date', *fields)[:depth]
+        )
+    else:
+        return []
+    return [(row[0], dict(zip(fields, row[1:]))) for row in rows]
+
+
+def apply_crop_loss_rules(
+    farm: Farm,
+    sensed_day,
+    signals: dict,
+    today: Optional[date] = None,
+    rules: Iterable[LossRule] = CROP_LOSS_RULES,
+) -> Dict[str, str]:
+    """
+    Evaluate crop loss rules for one reload of a farm and save the results.
+
+    Reads are batched: one query for the active scenarios of every kind, at most
+    one history query per signal source and one for heatmap dates, the latter
+    only when a scenario is about to open. Writes go out as one bulk_create,
+    one bulk_update, one CropLossEvent append for scenarios that closed and one
+    farm version bump.
+
+    Args:
+        farm (Farm): Farm being reloaded.
+        sensed_day (date | datetime): Satellite sensed day of the reload.
+        signals (dict): Payloads fetched by the pipeline, keyed by signal source.
+            An empty payload counts as a visit without the condition; rules of a
+            missing source are not evaluated.
+        today (date): Evaluation date, defaults to today.
+        rules (Iterable[LossRule]): Rules to evaluate.
+
+    Returns:
+        dict: Action per evaluated kind ("created", "updated", "deactivated", "pending" or "none").
+    """
+    if isinstance(sensed_day, datetime):
+        sensed_day = sensed_day.date()
+    today = today or date.today()
+
+    rules = [rule for rule in rules if rule.source in signals]
+    if not rules:
+        return {}
+
+    current = {rule.source: _current_signals(rule.source, signals[rule.source]) for rule in rules}
+    value = {rule.kind: current[rule.source].get(rule.field) for rule in rules}
+    met = {rule.kind: rule.is_met(value[rule.kind]) for rule in rules}
+
+    active = {
+        analytics.kind: analytics
+        for analytics in CropLossAnalytics.objects.filter(
+            farm=farm,
+            kind__in=[rule.kind for rule in rules],
+            is_active=True
+        )
+    }
+
+    # History is only needed by rules that may open a new scenario
+    opening = [rule for rule in rules if rule.kind not in active and met[rule.kind]]
+    history = {}
+    for source in {rule.source for rule in opening if rule.entry_visits > 1 or rule.start_from == START_FROM_HISTORY}:
+        source_rules = [rule for rule in opening if rule.source == source]
+        history[source] = _load_history(
+            farm,
+            source,
+            sorted({rule.field for rule in source_rules}),
+            max(rule.entry_visits for rule in source_rules) + 2,
+            sensed_day,
+            today
+        )
+
+    heatmap_dates = []
+    if any(rule.start_from == START_FROM_HEATMAPS for rule in opening):
+        heatmap_dates = list(
+            Heatmap.objects
+            .filter(farm=farm, date__lt=sensed_day)
+            .order_by('-date')
+            .values_list('date', flat=True)
+            .distinct()[:2]
+        )
+
+    actions, to_create, to_update, events = {}, [], [], []
+    for rule in rules:
+        existing = active.get(rule.kind)
+        if existing:
+            actions[rule.kind] = advance_scenario(rule, existing, value[rule.kind], sensed_day, today)
+            to_update.append(existing)
+            if not existing.is_active:
+                events.append(close_event(rule, existing, farm.centroid))
+            continue
+
+        if not met[rule.kind]:
+            actions[rule.kind] = "none"
+            continue
+
+        source_history = history.get(rule.source, [])
+        visits = consecutive_visits(rule, source_history) if rule.entry_visits > 1 else 1
+        if visits < rule.entry_visits:
+            logger.info(f"{rule.kind} condition detected for farm {farm.id} but only {visits}/{rule.entry_visits} consecutive visits - not creating analytics yet")
+            actions[rule.kind] = "pending"
+            continue
+
+        to_create.append(open_scenario(rule, farm.id, visits, value[rule.kind], sensed_day, today, source_history, heatmap_dates))
+        actions[rule.kind] = "created"
+
+    if to_create or to_update:
+        with transaction.atomic():
+            if to_create:
+                CropLossAnalytics.objects.bulk_create(to_create)
+            if to_update:
+                CropLossAnalytics.objects.bulk_update(to_update, ANALYTICS_UPDATE_FIELDS)
+            if events:
+                CropLossEvent.objects.bulk_create(events)
+            touch_farm_resources(farm.id, "crop_loss")
+            if to_create or events:
+                sync_region_losses([farm.id])
+
+    return actions
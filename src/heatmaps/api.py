@@ -1,19 +1,24 @@
 import os
 from typing import List
+from pathlib import Path
+from urllib.request import url2pathname
 from datetime import date, timedelta, datetime
 
 from ninja import Router
 from ninja.errors import HttpError
-from ninja.security import django_auth
-from ninja_jwt.authentication import JWTAuth
+from ninja_jwt.authentication import AsyncJWTAuth
 from django.contrib.auth.hashers import make_password
+from django.http import HttpResponse
 
 import asyncio
+from asgiref.sync import sync_to_async
 from dotenv import load_dotenv
 
 from azure.storage.blob import BlobServiceClient, generate_blob_sas, BlobSasPermissions
 
 from users.models import Farm
+from utils.async_auth import async_django_auth
+from utils.conditional_get import not_modified_response
 from heatmaps.models import Heatmap, IndexTimeSeries
 from heatmaps.heatmap_schemas import (
     HeatmapSchema, 
@@ -41,22 +46,27 @@ def generate_sas_url(blob_url: str, expiry_minutes: int = 60) -> str:
         Blob URL with SAS token appended
     """
     try:
+        from urllib.parse import urlparse
+        parsed = urlparse(blob_url)
+
+        # Written by the LOCAL_BLOB_DIR stand-in, readable without a token. Only
+        # accepted while the stand-in is configured, and only for files below it
+        if parsed.scheme == "file":
+            local_blob_dir = os.getenv("LOCAL_BLOB_DIR")
+            if not local_blob_dir:
+                raise ValueError("file:// blob URLs need LOCAL_BLOB_DIR")
+            local_path = Path(url2pathname(parsed.path)).resolve()
+            if not local_path.is_relative_to(Path(local_blob_dir).resolve()):
+                raise ValueError(f"Blob outside LOCAL_BLOB_DIR: {parsed.path}")
+            if not local_path.exists():
+                raise FileNotFoundError(f"Blob not found: {parsed.path}")
+            return blob_url
+
         connection_string = os.getenv("AZURE_CONNECTION_STRING")
         
         if not connection_string:
             raise Exception("AZURE_CONNECTION_STRING not configured")
         
-        # Parse blob URL to extract components
-        from urllib.parse import urlparse
-        parsed = urlparse(blob_url)
-        path_parts = parsed.path.lstrip('/').split('/', 1)
-        
-        if len(path_parts) < 2:
-            raise ValueError(f"Invalid blob URL format: {blob_url}")
-        
-        container_name = path_parts[0]
-        blob_name = path_parts[1]
-        
         # Extract account name and key from connection string
         account_name = None
         account_key = None
@@ -70,6 +80,19 @@ def generate_sas_url(blob_url: str, expiry_minutes: int = 60) -> str:
         if not account_name or not account_key:
             raise ValueError("Invalid connection string format")
         
+        # Parse blob URL to extract components. Azurite serves path-style URLs,
+        # http://127.0.0.1:10000/<account>/<container>/<blob>
+        path = parsed.path.lstrip('/')
+        if path.startswith(f"{account_name}/"):
+            path = path[len(account_name) + 1:]
+        path_parts = path.split('/', 1)
+        
+        if len(path_parts) < 2:
+            raise ValueError(f"Invalid blob URL format: {blob_url}")
+        
+        container_name = path_parts[0]
+        blob_name = path_parts[1]
+        
         # Create blob service client to verify blob exists
         blob_service_client = BlobServiceClient.from_connection_string(connection_string)
         blob_client = blob_service_client.get_blob_client(
@@ -104,33 +127,39 @@ def generate_sas_url(blob_url: str, expiry_minutes: int = 60) -> str:
 
 @heatmaps_router.get(
     path="/get_heatmaps",
-    auth=[JWTAuth(), django_auth],
+    auth=[AsyncJWTAuth(), async_django_auth],
     response=HeatmapSchema
 )
-def get_heatmap_url(request, farm_id: str, index_type: str, sensed_date: str):
+async def get_heatmap_url(request, response: HttpResponse, farm_id: str, index_type: str, sensed_date: str):
     """Get heatmap URL from storage with secure SAS token"""
     try:
-        farm = Farm.objects.get(field_id=farm_id)
+        farm = await Farm.objects.aget(field_id=farm_id)
     except Farm.DoesNotExist:
         raise HttpError(400, "farm not found")
     
+    # SAS URLs are valid for 60 minutes, so cached copies must rotate well before that
+    not_modified = not_modified_response(request, response, farm, "heatmaps", max_age_seconds=30 * 60)
+    if not_modified:
+        return not_modified
+    
     try:
         date_obj = datetime.strptime(sensed_date, "%Y%m%d").date()
     except ValueError:
         raise HttpError(400, "Invalid date format. Expected YYYYMMDD.")
     
-    heatmap = Heatmap.objects.filter(
+    heatmap = await Heatmap.objects.filter(
         farm=farm,
         index_type=index_type,
         date=date_obj
-    ).first()
+    ).afirst()
     
     if not heatmap:
         raise HttpError(400, "heatmap not found")
     
     # Generate secure SAS URL (valid for 1 hour)
     try:
-        secure_url = generate_sas_url(heatmap.image_url, expiry_minutes=60)
+        # Checks the blob exists over the network, off the event loop
+        secure_url = await sync_to_async(generate_sas_url, thread_sensitive=False)(heatmap.image_url, expiry_minutes=60)
     except FileNotFoundError:
         raise HttpError(404, "Heatmap image not found in storage")
     except Exception as e:
@@ -148,14 +177,17 @@ def get_heatmap_url(request, farm_id: str, index_type: str, sensed_date: str):
     path="/get_past_satellite_values",
     response=IndexTimeSeriesResponseSchema
 )
-def get_past_satellite_data(request, farm_id : str, index_type : str):
+async def get_past_satellite_data(request, response: HttpResponse, farm_id : str, index_type : str):
     """Return satellite index values (with dates) for the last 30 days"""
     today = date.today()
     thirty_days_ago = today - timedelta(days=30)
     try:
-        farm = Farm.objects.get(field_id=farm_id)
+        farm = await Farm.objects.aget(field_id=farm_id)
     except Farm.DoesNotExist:
         raise HttpError(400, "farm not found")
+    not_modified = not_modified_response(request, response, farm, "index_values", extra=str(today))
+    if not_modified:
+        return not_modified
     queryset = (
         IndexTimeSeries.objects
         .filter(
@@ -168,7 +200,7 @@ def get_past_satellite_data(request, farm_id : str, index_type : str):
         .values("date", "value")
     )
 
-    data = [IndexValueDateSchema(**entry) for entry in queryset]
+    data = [IndexValueDateSchema(**entry) async for entry in queryset]
 
     return {
         "farm_id": farm_id,
@@ -180,20 +212,26 @@ def get_past_satellite_data(request, farm_id : str, index_type : str):
     path="/get_one_past_satellite_value",
     response=IndexValueDateResponseSchema
 )
-def get_past_satellite_data_for_one_day(request, farm_id : str, index_type : str, date : str):
-    """Return satellite index values (with dates) for the last 30 days"""
+async def get_past_satellite_data_for_one_day(request, response: HttpResponse, farm_id : str, index_type : str, date : str):
+    """Return the satellite index value of one sensed day"""
     try:
-        farm = Farm.objects.get(field_id=farm_id)
+        farm = await Farm.objects.aget(field_id=farm_id)
     except Farm.DoesNotExist:
         raise HttpError(400, "farm not found")
-    queryset = (
+    not_modified = not_modified_response(request, response, farm, "index_values")
+    if not_modified:
+        return not_modified
+    index_value = await (
         IndexTimeSeries.objects.filter(
             farm=farm,
             index_type=index_type,
             date = date
         )
-    ).first()
+    ).afirst()
+
+    if index_value is None:
+        raise HttpError(404, "index value not found")
 
     return {
-        "value": queryset.value if queryset.value else None
+        "value": index_value.value
     }
\ No newline at end of file
@@ -1,3 +1,165 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.test import SimpleTestCase, TestCase
+
+from testing.fixtures import DAY, make_farm
+from heatmaps.api import generate_sas_url
+from heatmaps.models import Heatmap, IndexTimeSeries
+from heatmaps.utils import (
+    asave_heatmaps_from_response,
+    asave_index_values_from_response,
+    save_heatmaps_from_response,
+    save_index_values_from_response,
+)
+from utils.query_metrics import assert_max_queries
+
+
+class StrQueryTests(TestCase):
+    """__str__ reads farm.field_name, so listing rows needs select_related("farm")"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for n in range(3):
+            farm = make_farm(f"field {n}")
+            for offset in range(2):
+                day = DAY + timedelta(days=5 * offset)
+                Heatmap.objects.create(farm=farm, index_type="ndvi", date=day)
+                IndexTimeSeries.objects.create(farm=farm, index_type="ndvi", date=day, value=0.5)
+
+    def test_heatmap_str_with_select_related(self):
+        with assert_max_queries(1, repeated=0):
+            labels = [str(heatmap) for heatmap in Heatmap.objects.select_related("farm")]
+        self.assertEqual(len(labels), 6)
+
+    def test_index_time_series_str_with_select_related(self):
+        with assert_max_queries(1, repeated=0):
+            labels = [str(row) for row in IndexTimeSeries.objects.select_related("farm")]
+        self.assertIn("field 0 - ndvi - 2025-07-01", labels)
+
+    async def test_async_block_counts_thread_sensitive_queries(self):
+        with assert_max_queries(2) as stats:
+            await Heatmap.objects.acount()
+            await IndexTimeSeries.objects.filter(farm__field_name="field 0").acount()
+        self.assertEqual(stats.count, 2)
+
+    def test_str_without_select_related_is_caught(self):
+        with self.assertRaisesRegex(AssertionError, "repeated statements"):
+            with assert_max_queries(10, repeated=0):
+                [str(heatmap) for heatmap in Heatmap.objects.all()]
+
+
+class OneDayValueTests(TestCase):
+
+    def setUp(self):
+        self.farm = make_farm()
+        IndexTimeSeries.objects.create(farm=self.farm, index_type="ndmi", date=DAY, value=0.0)
+
+    def get(self, day):
+        return self.client.get(
+            "/api/heatmaps/get_one_past_satellite_value",
+            {"farm_id": self.farm.field_id, "index_type": "ndmi", "date": day.isoformat()},
+            HTTP_HOST="localhost",
+        )
+
+    def test_zero_is_a_value(self):
+        response = self.get(DAY)
+
+        self.assertEqual(response.status_code, 200, response.content)
+        # Decimal column, serialized as a string
+        self.assertEqual(response.json(), {"value": "0.00"})
+
+    def test_missing_day_is_not_found(self):
+        response = self.get(DAY + timedelta(days=1))
+
+        self.assertEqual(response.status_code, 404, response.content)
+        self.assertEqual(response.json()["detail"], "index value not found")
+
+
+class UpsertTests(TestCase):
+    """Saving a sensed day again updates its rows in place"""
+
+    def setUp(self):
+        self.farm = make_farm()
+        self.meta = {"field_id": self.farm.field_id, "sensed_day": DAY.strftime("%Y%m%d")}
+
+    def heatmaps(self, version: int) -> dict:
+        return {"_meta": self.meta, "ndvi": f"https://blob/ndvi_v{version}.png", "savi": f"https://blob/savi_v{version}.png"}
+
+    def index_values(self, ndvi: float, savi: float) -> dict:
+        return {"_meta": self.meta, "ndvi": ndvi, "savi": savi}
+
+    def rows(self, model) -> dict:
+        field = "image_url" if model is Heatmap else "value"
+        return {
+            index_type: (pk, value)
+            for pk, index_type, value in model.objects.filter(farm=self.farm).values_list("pk", "index_type", field)
+        }
+
+    def assert_updated_in_place(self, before: dict, after: dict, expected: dict):
+        self.assertEqual({index_type: pk for index_type, (pk, _) in after.items()}, {index_type: pk for index_type, (pk, _) in before.items()})
+        self.assertEqual({index_type: value for index_type, (_, value) in after.items()}, expected)
+
+    def test_heatmaps(self):
+        save_heatmaps_from_response(self.heatmaps(1))
+        before = self.rows(Heatmap)
+
+        save_heatmaps_from_response(self.heatmaps(2), farm=self.farm)
+
+        self.assert_updated_in_place(before, self.rows(Heatmap), {"ndvi": "https://blob/ndvi_v2.png", "savi": "https://blob/savi_v2.png"})
+
+    def test_index_values(self):
+        save_index_values_from_response(self.index_values(0.41, 0.3))
+        before = self.rows(IndexTimeSeries)
+
+        save_index_values_from_response(self.index_values(0.52, -1), farm=self.farm)
+
+        self.assert_updated_in_place(before, self.rows(IndexTimeSeries), {"ndvi": Decimal("0.52"), "savi": None})
+
+    async def test_async_heatmaps(self):
+        await asave_heatmaps_from_response(self.heatmaps(1))
+        before = await sync_to_async(self.rows)(Heatmap)
+
+        await asave_heatmaps_from_response(self.heatmaps(2), farm=self.farm)
+
+        self.assert_updated_in_place(before, await sync_to_async(self.rows)(Heatmap), {"ndvi": "https://blob/ndvi_v2.png", "savi": "https://blob/savi_v2.png"})
+
+    async def test_async_index_values(self):
+        await asave_index_values_from_response(self.index_values(0.41, 0.3))
+        before = await sync_to_async(self.rows)(IndexTimeSeries)
+
+        await asave_index_values_from_response(self.index_values(0.52, -1), farm=self.farm)
+
+        self.assert_updated_in_place(before, await sync_to_async(self.rows)(IndexTimeSeries), {"ndvi": Decimal("0.52"), "savi": None})
+
+
+class LocalBlobUrlTests(SimpleTestCase):
+    """file:// URLs are only served by the LOCAL_BLOB_DIR stand-in"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        self.blob = self.root / "farm-images" / "ndvi.png"
+        self.blob.parent.mkdir()
+        self.blob.write_bytes(b"png")
+
+    def test_returned_unchanged_below_local_blob_dir(self):
+        with mock.patch.dict(os.environ, {"LOCAL_BLOB_DIR": str(self.root)}):
+            self.assertEqual(generate_sas_url(self.blob.as_uri()), self.blob.as_uri())
+
+    def test_rejected_without_local_blob_dir(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop("LOCAL_BLOB_DIR", None)
+            with self.assertRaisesRegex(Exception, "need LOCAL_BLOB_DIR"):
+                generate_sas_url(self.blob.as_uri())
+
+    def test_rejected_outside_local_blob_dir(self):
+        with mock.patch.dict(os.environ, {"LOCAL_BLOB_DIR": str(self.blob.parent)}):
+            with self.assertRaisesRegex(Exception, "outside LOCAL_BLOB_DIR"):
+                generate_sas_url((self.blob.parent / ".." / "ndvi.png").as_uri())
@@ -1,21 +1,17 @@
 import os
 import django
 import json
-from datetime import datetime
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+from asgiref.sync import sync_to_async
 from django.db import transaction
 from heatmaps.models import Heatmap, IndexTimeSeries
 from users.models import Farm
+from users.utils import atouch_farm_resources, touch_farm_resources
+from regions.utils import update_region_index_values
 
-def save_heatmaps_from_response(field_data: dict):
-    """
-    Save satellite index image URLs into the Heatmap model.
-
-    Args:
-        field_data (dict): JSON response containing satellite URLs and metadata.
-    Raises:
-        ValueError: If required metadata is missing or invalid.
-        Farm.DoesNotExist: If the specified farm is not found.
-    """
+def _parse_meta(field_data: dict) -> Tuple[str, date]:
+    """Field id and sensed date from the `_meta` of a Farmonaut response"""
     meta = field_data.get('_meta', {})
     field_id = meta.get('field_id')
     sensed_day = meta.get('sensed_day')
@@ -29,64 +25,148 @@ def save_heatmaps_from_response(field_data: dict):
         sensed_date = datetime.strptime(sensed_day, "%Y%m%d").date()
     except Exception:
         raise ValueError(f"Invalid 'sensed_day' format: {sensed_day}. Expected YYYYMMDD.")
+    return field_id, sensed_date
+
+
+# One upsert per sensed day, matching the unique_together of both models
+UPSERT_UNIQUE_FIELDS = ["farm", "index_type", "date"]
+
+
+def _heatmap_urls(field_data: dict) -> dict:
+    """{index_type: url} of the known index types with a url"""
+    known = dict(Heatmap.INDEX_CHOICES)
+    return {
+        index_type: url
+        for index_type, url in field_data.items()
+        if index_type != "_meta" and url and index_type in known
+    }
+
+
+def _heatmap_rows(farm: Farm, sensed_date: date, field_data: dict) -> List[Heatmap]:
+    return [
+        Heatmap(farm=farm, index_type=index_type, date=sensed_date, image_url=url)
+        for index_type, url in _heatmap_urls(field_data).items()
+    ]
+
 
-    farm = Farm.objects.get(field_id=field_id)
+def _index_values(field_data: dict) -> dict:
+    """{index_type: value} of the known index types, -1 stored as None"""
+    known = dict(IndexTimeSeries.INDEX_CHOICES)
+    return {
+        index_type: None if value == -1 else value
+        for index_type, value in field_data.items()
+        if index_type != "_meta" and value and index_type in known
+    }
+
+
+def save_heatmaps_from_response(field_data: dict, farm: Optional[Farm] = None):
+    """
+    Save satellite index image URLs into the Heatmap model.
+
+    All index types of the sensed day are upserted with one INSERT ... ON
+    CONFLICT, replacing the URL of rows saved by an earlier run.
+
+    Args:
+        field_data (dict): JSON response containing satellite URLs and metadata.
+        farm (Farm): Farm of the response when the caller already has it.
+    Raises:
+        ValueError: If required metadata is missing or invalid.
+        Farm.DoesNotExist: If the specified farm is not found.
+    """
+    field_id, sensed_date = _parse_meta(field_data)
+    farm = farm or Farm.objects.get(field_id=field_id)
 
     with transaction.atomic():
-        for index_type, url in field_data.items():
-            if index_type == "_meta" or not url:
-                continue
-
-            if index_type not in dict(Heatmap.INDEX_CHOICES):
-                continue
-                # raise ValueError(f"Unrecognized index type: {index_type}")
-
-            Heatmap.objects.update_or_create(
-                farm=farm,
-                index_type=index_type,
-                date=sensed_date,
-                defaults={"image_url": url},
-            )
-            
-def save_index_values_from_response(field_data : dict):
-    
-    meta = field_data.get('_meta', {})
-    field_id = meta.get('field_id')
-    sensed_day = meta.get('sensed_day')
-    
-    if not field_id:
-        raise ValueError("Missing 'field_id' in field_data['_meta']")
-    if not sensed_day:
-        raise ValueError("Missing 'sensed_day' in field_data['_meta']")
+        Heatmap.objects.bulk_create(
+            _heatmap_rows(farm, sensed_date, field_data),
+            update_conflicts=True,
+            unique_fields=UPSERT_UNIQUE_FIELDS,
+            update_fields=["image_url"],
+        )
+        touch_farm_resources(farm.id, "heatmaps")
 
-    try:
-        sensed_date = datetime.strptime(sensed_day, "%Y%m%d").date()
-    except Exception:
-        raise ValueError(f"Invalid 'sensed_day' format: {sensed_day}. Expected YYYYMMDD.")
 
-    farm = Farm.objects.get(field_id=field_id)
+async def asave_heatmaps_from_response(field_data: dict, farm: Optional[Farm] = None):
+    """
+    Async variant of save_heatmaps_from_response on Django's async ORM.
+
+    The async ORM cannot open a transaction. The upsert is idempotent and the
+    version bump comes after it, so a failure in between leaves cached reads
+    untouched and the retried stage writes the rows again.
+
+    Args:
+        field_data (dict): JSON response containing satellite URLs and metadata.
+        farm (Farm): Farm of the response when the caller already has it.
+    """
+    field_id, sensed_date = _parse_meta(field_data)
+    farm = farm or await Farm.objects.aget(field_id=field_id)
+
+    await Heatmap.objects.abulk_create(
+        _heatmap_rows(farm, sensed_date, field_data),
+        update_conflicts=True,
+        unique_fields=UPSERT_UNIQUE_FIELDS,
+        update_fields=["image_url"],
+    )
+    await atouch_farm_resources(farm.id, "heatmaps")
+
 
+def _index_rows(farm: Farm, sensed_date: date, saved: dict) -> List[IndexTimeSeries]:
+    return [
+        IndexTimeSeries(farm=farm, index_type=index_type, date=sensed_date, value=value)
+        for index_type, value in saved.items()
+    ]
+
+
+def save_index_values_from_response(field_data : dict, farm: Optional[Farm] = None):
+    """
+    Save the index values of a sensed day with one upsert and fold them into
+    the farm's region cell.
+
+    Args:
+        field_data (dict): Index values response with `_meta`.
+        farm (Farm): Farm of the response when the caller already has it.
+    """
+    field_id, sensed_date = _parse_meta(field_data)
+    farm = farm or Farm.objects.get(field_id=field_id)
+
+    saved = _index_values(field_data)
     with transaction.atomic():
-        for index_type, value in field_data.items():
-            if index_type == "_meta" or not value:
-                continue
-
-            if index_type not in dict(IndexTimeSeries.INDEX_CHOICES):
-                continue
-            
-            if value == -1:
-                value = None
-
-            IndexTimeSeries.objects.update_or_create(
-                farm=farm,
-                index_type=index_type,
-                date=sensed_date,
-                defaults={"value": value},
-            )
-    
+        IndexTimeSeries.objects.bulk_create(
+            _index_rows(farm, sensed_date, saved),
+            update_conflicts=True,
+            unique_fields=UPSERT_UNIQUE_FIELDS,
+            update_fields=["value"],
+        )
+        touch_farm_resources(farm.id, "index_values")
+        update_region_index_values(farm.id, sensed_date, saved)
+
+
+async def asave_index_values_from_response(field_data: dict, farm: Optional[Farm] = None):
+    """
+    Async variant of save_index_values_from_response on Django's async ORM.
+    The region cell update locks rows inside a transaction, so it runs as one
+    sync call on the thread of the current unit of work.
+
+    Args:
+        field_data (dict): Index values response with `_meta`.
+        farm (Farm): Farm of the response when the caller already has it.
+    """
+    field_id, sensed_date = _parse_meta(field_data)
+    farm = farm or await Farm.objects.aget(field_id=field_id)
+
+    saved = _index_values(field_data)
+    await IndexTimeSeries.objects.abulk_create(
+        _index_rows(farm, sensed_date, saved),
+        update_conflicts=True,
+        unique_fields=UPSERT_UNIQUE_FIELDS,
+        update_fields=["value"],
+    )
+    await atouch_farm_resources(farm.id, "index_values")
+    await sync_to_async(update_region_index_values)(farm.id, sensed_date, saved)
+
 if __name__ == "__main__":
     with open('field_1761808284616_20251029.json', 'r') as f:
         data = json.load(f)
     save_heatmaps_from_response(
         field_data = data
-    )
\ No newline at end of file
+    )
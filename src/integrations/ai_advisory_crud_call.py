@@ -5,11 +5,13 @@ import httpx
 from time import perf_counter
 from dotenv import load_dotenv
 
+from integrations.resilience import CircuitOpenError, farmanout_url, post_json
+
 load_dotenv()
 
 async def get_ai_advisory(field_id: str, crop: str):
     server_response_time = float(os.getenv('SERVER_RESPONSE_TIME', 60.0))
-    endpoint_url = "https://us-central1-farmbase-b2f7e.cloudfunctions.net/askJeevnAPI"
+    endpoint_url = farmanout_url("askJeevnAPI")
 
     body_obj = {
         "Crop": crop,
@@ -22,9 +24,13 @@ async def get_ai_advisory(field_id: str, crop: str):
     }
 
     try:
-        async with httpx.AsyncClient(timeout=3*server_response_time) as client:
-            response = await client.post(endpoint_url, headers=headers_obj, json=body_obj)
-            response.raise_for_status()  # Raise exception for 4xx/5xx
+        # Bounded as a whole, a degraded upstream must not hold the connection for
+        # several slow attempts. A timed out advisory is not retried, only fast failures
+        response = await post_json(
+            "askJeevnAPI", endpoint_url, headers_obj, body_obj,
+            timeout=2*server_response_time, hedge=True,
+            deadline=2*server_response_time, retry_timeouts=False,
+        )
         try:
             return response.json()
         except json.JSONDecodeError:
@@ -34,6 +40,9 @@ async def get_ai_advisory(field_id: str, crop: str):
                 "response_text": response.text
             }
 
+    except CircuitOpenError as e:
+        return {"error": str(e)}
+
     except httpx.ConnectTimeout:
         return {"error": "Connection timed out while contacting server"}
 
@@ -8,6 +8,8 @@ import httpx
 import asyncio
 from dotenv import load_dotenv
 
+from integrations.resilience import CircuitOpenError, farmanout_url, post_json
+
 load_dotenv()
 
 def latlong_to_longlat(points: List):
@@ -35,7 +37,7 @@ async def add_new_farm(
         "green gram" : 64
     }
     server_response_time = float(os.getenv('SERVER_RESPONSE_TIME'))
-    endpoint_url = "https://us-central1-farmbase-b2f7e.cloudfunctions.net/submitField"
+    endpoint_url = farmanout_url("submitField")
 
     def date_to_epoch(date_value : datetime):
         """
@@ -61,9 +63,7 @@ async def add_new_farm(
     }
 
     try:
-        async with httpx.AsyncClient(timeout=server_response_time) as client:
-            response = await client.post(endpoint_url, headers=headers_obj, json=body_obj)
-            response.raise_for_status()  # Raise exception for 4xx/5xx
+        response = await post_json("submitField", endpoint_url, headers_obj, body_obj, timeout=server_response_time, idempotent=False)
 
         try:
             res = response.json()
@@ -79,6 +79,12 @@ async def add_new_farm(
                 "response_text": response.text
             }
 
+    except CircuitOpenError as e:
+        return {
+            "api" : "add_new_farm",
+            "error": str(e)
+        }
+
     except httpx.ConnectTimeout:
         return {
             "api" : "add_new_farm",
@@ -107,7 +113,7 @@ async def add_new_farm(
         
 async def edit_field_boundary(field_id : str, points : List):
     server_response_time = os.getenv('SERVER_RESPONSE_TIME')
-    endpoint_url = "https://us-central1-farmbase-b2f7e.cloudfunctions.net/modifyFieldPoints"
+    endpoint_url = farmanout_url("modifyFieldPoints")
 
     body_obj = {
         "Points" : latlong_to_longlat(points = points),
@@ -120,9 +126,7 @@ async def edit_field_boundary(field_id : str, points : List):
     }
 
     try:
-        async with httpx.AsyncClient(timeout=server_response_time) as client:
-            response = await client.post(endpoint_url, headers=headers_obj, json=body_obj)
-            response.raise_for_status()  # Raise exception for 4xx/5xx
+        response = await post_json("modifyFieldPoints", endpoint_url, headers_obj, body_obj, timeout=server_response_time)
 
         try:
             last_date_obj = max(
@@ -140,6 +144,12 @@ async def edit_field_boundary(field_id : str, points : List):
                 "response_text": response.text
             }
 
+    except CircuitOpenError as e:
+        return {
+            "api" : "edit_field_boundary",
+            "error": str(e)
+        }
+
     except httpx.ConnectTimeout:
         return {
             "api" : "edit_field_boundary",
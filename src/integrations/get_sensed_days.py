@@ -6,11 +6,13 @@ import httpx
 import asyncio
 from dotenv import load_dotenv
 
+from integrations.resilience import CircuitOpenError, farmanout_url, post_json
+
 load_dotenv()
 
 async def get_sensed_days(field_id : str):
     server_response_time = float(os.getenv('SERVER_RESPONSE_TIME'))
-    endpoint_url = "https://us-central1-farmbase-b2f7e.cloudfunctions.net/getSensedDays"
+    endpoint_url = farmanout_url("getSensedDays")
     body_obj = {
         "FieldID": field_id,
     }
@@ -20,9 +22,7 @@ async def get_sensed_days(field_id : str):
         "Content-Type": "application/json"
     }
     try:
-        async with httpx.AsyncClient(timeout=server_response_time) as client:
-            response = await client.post(endpoint_url, headers=headers_obj, json=body_obj)
-            response.raise_for_status()  # Raise exception for 4xx/5xx
+        response = await post_json("getSensedDays", endpoint_url, headers_obj, body_obj, timeout=server_response_time)
 
         try:
             last_date_obj = max(
@@ -40,6 +40,12 @@ async def get_sensed_days(field_id : str):
                 "response_text": response.text
             }
 
+    except CircuitOpenError as e:
+        return {
+            "api" : "get_sensed_days",
+            "error": str(e)
+        }
+
     except httpx.ConnectTimeout:
         return {
             "api" : "get_sensed_days",
@@ -6,6 +6,8 @@ import httpx
 import asyncio
 from dotenv import load_dotenv
 
+from integrations.resilience import CircuitOpenError, farmanout_url, post_json
+
 load_dotenv()
 
 async def get_field_image(
@@ -14,7 +16,7 @@ async def get_field_image(
     image_type: str
 ):
     server_response_time = float(os.getenv('SERVER_RESPONSE_TIME'))
-    endpoint_url = "https://us-central1-farmbase-b2f7e.cloudfunctions.net/getFieldImage"
+    endpoint_url = farmanout_url("getFieldImage")
 
     body_obj = {
         "FieldID": str(field_id),
@@ -28,9 +30,7 @@ async def get_field_image(
     }
 
     try:
-        async with httpx.AsyncClient(timeout=server_response_time) as client:
-            response = await client.post(endpoint_url, headers=headers_obj, json=body_obj)
-            response.raise_for_status()  # Raise exception for 4xx/5xx
+        response = await post_json("getFieldImage", endpoint_url, headers_obj, body_obj, timeout=server_response_time)
 
         try:
             return {
@@ -45,6 +45,14 @@ async def get_field_image(
                 "response_text": response.text
             }
 
+    except CircuitOpenError as e:
+        return {
+            "api" : "get_field_image",
+            "image_type" : image_type,
+            "url" : None,
+            "error": str(e)
+        }
+
     except httpx.ConnectTimeout:
         return {
             "api" : "get_field_image",
@@ -4,6 +4,8 @@ import httpx
 import asyncio
 from dotenv import load_dotenv
 
+from integrations.resilience import CircuitOpenError, farmanout_url, post_json
+
 load_dotenv()
 
 async def get_index_values(
@@ -23,7 +25,7 @@ async def get_index_values(
         'soc',
         'etci'
     ]
-    endpoint_url = 'https://us-central1-farmbase-b2f7e.cloudfunctions.net/getAllIndexValues'
+    endpoint_url = farmanout_url("getAllIndexValues")
     body_obj = {
         "FieldID" : str(field_id)
     }
@@ -35,9 +37,7 @@ async def get_index_values(
     }
 
     try:
-        async with httpx.AsyncClient(timeout=server_response_time) as client:
-            response = await client.post(endpoint_url, headers=headers_obj, json=body_obj)
-            response.raise_for_status()  # Raise exception for 4xx/5xx
+        response = await post_json("getAllIndexValues", endpoint_url, headers_obj, body_obj, timeout=server_response_time)
         
         try:
             res = response.json()
@@ -70,6 +70,16 @@ async def get_index_values(
                 }
             }
 
+    except CircuitOpenError as e:
+        return {
+            "api" : "get_index_values",
+            "error": str(e),
+            "_meta" : {
+                    "field_id" : field_id,
+                    "sensed_day" : sensed_day
+                }
+        }
+
     except httpx.ConnectTimeout:
         return {
             "api" : "get_index_values",
@@ -0,0 +1,260 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from utils.metrics import REGISTRY
+
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter(
+    fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+handler.setFormatter(formatter)
+if not logger.hasHandlers():
+    logger.addHandler(handler)
+
+# Sustained requests per second to the upstream host, 0 disables the bucket
+RATE_PER_SECOND = float(os.getenv("UPSTREAM_RATE_PER_SECOND", "10"))
+# Requests that may be sent at once after an idle period
+RATE_BURST = int(os.getenv("UPSTREAM_RATE_BURST", "20"))
+# Requests in flight to the upstream host, across all endpoints
+MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "16"))
+# Requests in flight per endpoint, UPSTREAM_CONCURRENCY_<ENDPOINT> overrides it
+# for one endpoint, e.g. UPSTREAM_CONCURRENCY_GETFIELDIMAGE=12
+ENDPOINT_CONCURRENCY = int(os.getenv("UPSTREAM_ENDPOINT_CONCURRENCY", "8"))
+# Waits longer than this are logged
+SLOW_WAIT_SECONDS = 1.0
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second up to `burst`.
+
+    A caller takes its token right away and, when the bucket is empty, sleeps
+    until the token would have been refilled. The balance may go negative, which
+    queues callers in arrival order without a waiter list and works from any
+    thread or event loop.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token, returns the seconds to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self):
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + 1)
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay <= 0:
+            return
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.refund()
+            raise
+
+
+class Slots:
+    """
+    Semaphore shared by all threads and event loops of the process.
+
+    asyncio.Semaphore binds to one loop, while the sync endpoints run each
+    request on its own loop through async_to_sync. Waiters here are woken on
+    their own loop with call_soon_threadsafe.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.in_use = 0
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self):
+        with self._lock:
+            if self.in_use < self.limit and not self._waiters:
+                self.in_use += 1
+                return
+            loop = asyncio.get_running_loop()
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                queued = waiter in self._waiters
+                if queued:
+                    self._waiters.remove(waiter)
+            # Handed a slot just before the cancellation, pass it on
+            if not queued and waiter[1].done() and not waiter[1].cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            if not self._waiters:
+                self.in_use -= 1
+                return
+            # The slot moves to the next waiter, in_use stays the same
+            loop, future = self._waiters.popleft()
+        loop.call_soon_threadsafe(self._wake, future)
+
+    def _wake(self, future: asyncio.Future):
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+
+@dataclass
+class EndpointStats:
+    """Queue and throughput counters of one endpoint"""
+    queued: int = 0
+    in_flight: int = 0
+    max_queued: int = 0
+    requests: int = 0
+    wait_seconds: float = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "max_queued": self.max_queued,
+            "requests": self.requests,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
+
+
+_bucket: Optional[TokenBucket] = TokenBucket(RATE_PER_SECOND, RATE_BURST) if RATE_PER_SECOND > 0 else None
+_global_slots = Slots(MAX_CONCURRENCY)
+_endpoint_slots: Dict[str, Slots] = {}
+_stats: Dict[str, EndpointStats] = {}
+_stats_lock = threading.Lock()
+
+
+def endpoint_concurrency(endpoint: str) -> int:
+    return int(os.getenv(f"UPSTREAM_CONCURRENCY_{endpoint.upper()}", ENDPOINT_CONCURRENCY))
+
+
+def _endpoint(endpoint: str) -> Tuple[Slots, EndpointStats]:
+    with _stats_lock:
+        if endpoint not in _endpoint_slots:
+            _endpoint_slots[endpoint] = Slots(endpoint_concurrency(endpoint))
+            _stats[endpoint] = EndpointStats()
+        return _endpoint_slots[endpoint], _stats[endpoint]
+
+
+def _count(stats: EndpointStats, queued: int = 0, in_flight: int = 0, waited: float = 0.0):
+    with _stats_lock:
+        stats.queued += queued
+        stats.in_flight += in_flight
+        stats.max_queued = max(stats.max_queued, stats.queued)
+        if in_flight > 0:
+            stats.requests += 1
+            stats.wait_seconds += waited
+
+
+@asynccontextmanager
+async def upstream_slot(endpoint: str):
+    """
+    Hold one request's share of the upstream limits.
+
+    Takes a token from the rate bucket, then a slot of the endpoint and a
+    global slot, in that order for every caller so they cannot deadlock. Each
+    attempt of a retried or hedged call enters on its own.
+    """
+    slots, stats = _endpoint(endpoint)
+    start = time.monotonic()
+    _count(stats, queued=1)
+    acquired = []
+    try:
+        if _bucket is not None:
+            await _bucket.acquire()
+        for semaphore in (slots, _global_slots):
+            await semaphore.acquire()
+            acquired.append(semaphore)
+    except BaseException:
+        for semaphore in reversed(acquired):
+            semaphore.release()
+        _count(stats, queued=-1)
+        raise
+
+    waited = time.monotonic() - start
+    _count(stats, queued=-1, in_flight=1, waited=waited)
+    if waited > SLOW_WAIT_SECONDS:
+        logger.info(f"{endpoint} waited {waited:.1f}s for the upstream limits")
+    try:
+        yield
+    finally:
+        _global_slots.release()
+        slots.release()
+        _count(stats, in_flight=-1)
+
+
+def limiter_stats() -> dict:
+    """Queue depth and in-flight requests per endpoint and for the whole upstream"""
+    with _stats_lock:
+        endpoints = {endpoint: stats.as_dict() for endpoint, stats in _stats.items()}
+    return {
+        "global": {
+            "in_flight": _global_slots.in_use,
+            "queued": _global_slots.waiting,
+            "limit": _global_slots.limit,
+            "rate_per_second": _bucket.rate if _bucket is not None else None,
+        },
+        "endpoints": endpoints,
+    }
+
+
+def _limiter_metrics():
+    with _stats_lock:
+        endpoints = [(endpoint, stats.queued, stats.in_flight, stats.requests, stats.wait_seconds) for endpoint, stats in _stats.items()]
+    yield (
+        "ak_upstream_queued", "gauge", "Farmonaut requests waiting for the rate and concurrency limits", ("endpoint",),
+        [((endpoint,), queued) for endpoint, queued, _, _, _ in endpoints] + [(("all",), _global_slots.waiting)],
+    )
+    yield (
+        "ak_upstream_in_flight", "gauge", "Farmonaut requests holding a concurrency slot", ("endpoint",),
+        [((endpoint,), in_flight) for endpoint, _, in_flight, _, _ in endpoints] + [(("all",), _global_slots.in_use)],
+    )
+    yield (
+        "ak_upstream_limit_wait_seconds_total", "counter", "Time requests spent waiting for the upstream limits", ("endpoint",),
+        [((endpoint,), waited) for endpoint, _, _, _, waited in endpoints],
+    )
+    yield (
+        "ak_upstream_limit_admitted_total", "counter", "Requests let through the upstream limits", ("endpoint",),
+        [((endpoint,), admitted) for endpoint, _, _, admitted, _ in endpoints],
+    )
+
+
+REGISTRY.register_collector("upstream_limits", _limiter_metrics)
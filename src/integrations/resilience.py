@@ -0,0 +1,339 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from integrations.limits import upstream_slot
+from utils.metrics import REGISTRY, UPSTREAM_CALLS, UPSTREAM_REQUEST_SECONDS, UPSTREAM_REQUESTS
+from utils.tracing import span, traceparent
+
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter(
+    fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+handler.setFormatter(formatter)
+if not logger.hasHandlers():
+    logger.addHandler(handler)
+
+# Farmonaut host, point it at testing/farmonaut_stub.py to run without the real API
+DEFAULT_BASE_URL = "https://us-central1-farmbase-b2f7e.cloudfunctions.net"
+
+# Attempts per idempotent call, the first one included
+RETRY_ATTEMPTS = int(os.getenv("UPSTREAM_RETRY_ATTEMPTS", "3"))
+# Backoff before retry n is uniform in [0, min(max, base * 2**n)] ("full jitter")
+RETRY_BASE_DELAY = float(os.getenv("UPSTREAM_RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("UPSTREAM_RETRY_MAX_DELAY", "8"))
+# Consecutive failed attempts that open an endpoint's breaker, and how long it stays open
+BREAKER_FAILURES = int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("UPSTREAM_BREAKER_RESET_SECONDS", "30"))
+# Hedged calls send a second request once the first is slower than this latency percentile
+HEDGE_PERCENTILE = float(os.getenv("UPSTREAM_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+RETRY_ERRORS = (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose breaker is open"""
+
+    def __init__(self, endpoint: str, retry_in: float):
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+        super().__init__(f"{endpoint} is unavailable, circuit open for another {retry_in:.0f}s")
+
+
+@dataclass
+class CircuitBreaker:
+    """
+    Stops calling an endpoint after BREAKER_FAILURES consecutive failed attempts.
+    After BREAKER_RESET_SECONDS one probe is let through (half open): success
+    closes the breaker, failure opens it again.
+
+    State changes hold a lock, so WSGI worker threads sharing a breaker cannot
+    both take the half open probe.
+    """
+    endpoint: str
+    failure_threshold: int = BREAKER_FAILURES
+    reset_seconds: float = BREAKER_RESET_SECONDS
+    state: str = CLOSED
+    failures: int = 0
+    opened_at: float = 0.0
+    probing: bool = False
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def retry_in(self) -> float:
+        return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == OPEN and self.retry_in() == 0:
+                self.state = HALF_OPEN
+                self.probing = False
+            if self.state == HALF_OPEN:
+                if self.probing:
+                    return False
+                self.probing = True
+                return True
+            return self.state == CLOSED
+
+    def release_probe(self):
+        """End a half open probe that neither succeeded nor failed, e.g. a cancelled one"""
+        with self._lock:
+            self.probing = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"Circuit for {self.endpoint} closed")
+            self.state = CLOSED
+            self.failures = 0
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"Circuit for {self.endpoint} opened after {self.failures} failures")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+
+@dataclass
+class LatencyWindow:
+    """Latencies of the last LATENCY_WINDOW successful attempts of an endpoint, in seconds"""
+    samples: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """None until HEDGE_MIN_SAMPLES latencies were seen"""
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+# Per-process state. Under ASGI all requests share one event loop; under WSGI
+# the worker threads share it too. Breakers lock their own state changes, a
+# latency sample is a single deque append
+_breakers: Dict[str, CircuitBreaker] = {}
+_latencies: Dict[str, LatencyWindow] = {}
+
+
+def get_breaker(endpoint: str) -> CircuitBreaker:
+    return _breakers.setdefault(endpoint, CircuitBreaker(endpoint))
+
+
+def breaker_states() -> Dict[str, str]:
+    """{endpoint: state} of every endpoint called so far"""
+    return {endpoint: breaker.state for endpoint, breaker in _breakers.items()}
+
+
+def _breaker_metrics():
+    breakers = list(_breakers.items())
+    yield (
+        "ak_upstream_circuit_state", "gauge", "1 for the current breaker state of each endpoint", ("endpoint", "state"),
+        [((endpoint, state), float(breaker.state == state)) for endpoint, breaker in breakers for state in (CLOSED, OPEN, HALF_OPEN)],
+    )
+    yield (
+        "ak_upstream_consecutive_failures", "gauge", "Failed attempts since the last success", ("endpoint",),
+        [((endpoint,), breaker.failures) for endpoint, breaker in breakers],
+    )
+
+
+REGISTRY.register_collector("upstream_breakers", _breaker_metrics)
+
+
+def outcome_label(error: BaseException) -> str:
+    """Metric label of a failed call or attempt"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"http_{error.response.status_code}"
+    if isinstance(error, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(error, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(error, httpx.TransportError):
+        return "network"
+    if isinstance(error, asyncio.CancelledError):
+        # The slower request of a hedged pair, or a stage timeout
+        return "cancelled"
+    return "error"
+
+
+def farmanout_url(endpoint: str) -> str:
+    """URL of an endpoint under FARMANOUT_BASE_URL, read per call so a benchmark can switch hosts"""
+    return f"{os.getenv('FARMANOUT_BASE_URL', DEFAULT_BASE_URL).rstrip('/')}/{endpoint}"
+
+
+def backoff_delay(attempt: int) -> float:
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+async def _hedged(endpoint: str, send: Callable[[], Awaitable[httpx.Response]], delay: float) -> httpx.Response:
+    """Send, and send again if no response arrived within `delay`; the first success wins"""
+    first = asyncio.ensure_future(send())
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        return first.result()
+
+    logger.info(f"{endpoint} slower than p{HEDGE_PERCENTILE:g} ({delay:.1f}s), sending a hedged request")
+    pending = {first, asyncio.ensure_future(send())}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def post_json(
+    endpoint: str,
+    url: str,
+    headers: dict,
+    body: dict,
+    timeout: float,
+    idempotent: bool = True,
+    hedge: bool = False,
+    deadline: Optional[float] = None,
+    retry_timeouts: bool = True,
+) -> httpx.Response:
+    """
+    POST to a Farmonaut endpoint through its circuit breaker.
+
+    Idempotent calls are retried on timeouts, network errors, 429 and 5xx with
+    jittered exponential backoff. Other 4xx are returned to the caller at once
+    and count as a healthy upstream. Every attempt, hedges included, waits for
+    the upstream rate and concurrency limits first.
+
+    Args:
+        endpoint (str): Breaker and latency key, e.g. "getSensedDays".
+        url (str): Endpoint URL.
+        headers (dict): Request headers.
+        body (dict): JSON body.
+        timeout (float): Timeout per attempt in seconds.
+        idempotent (bool): Safe to send more than once, enables retries and hedging.
+        hedge (bool): Send a second request when the first is slower than the
+            HEDGE_PERCENTILE latency of the endpoint.
+        deadline (float): Seconds for the whole call, attempts, backoff and hedges
+            included. Attempts are cut to what is left of it and no retry starts
+            past it. None for attempts * timeout plus backoff.
+        retry_timeouts (bool): Retry attempts that timed out. Off for slow, costly
+            calls where a timeout means the next attempt would time out too.
+
+    Returns:
+        httpx.Response: A response with a 2xx status.
+
+    Raises:
+        CircuitOpenError: The breaker of the endpoint is open.
+        httpx.HTTPStatusError: The last attempt got an error status.
+        httpx.TransportError: The last attempt failed to connect or timed out.
+    """
+    breaker = get_breaker(endpoint)
+    latencies = _latencies.setdefault(endpoint, LatencyWindow())
+    attempts = RETRY_ATTEMPTS if idempotent else 1
+    deadline_at = time.monotonic() + deadline if deadline is not None else None
+
+    async def send() -> httpx.Response:
+        # The client is built outside the slot, loading its SSL context takes a while
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            with span(f"upstream.{endpoint}.attempt") as attempt:
+                # Lets Farmonaut or a proxy log which reload a request belongs to
+                parent = traceparent()
+                request_headers = {**headers, "traceparent": parent} if parent else headers
+                queued_at = time.perf_counter()
+                async with upstream_slot(endpoint):
+                    start = time.perf_counter()
+                    attempt.set(limit_wait_ms=round((start - queued_at) * 1000, 1))
+                    attempt_timeout = timeout
+                    if deadline_at is not None:
+                        # The wait for the limits counts against the deadline too
+                        attempt_timeout = max(0.001, min(timeout, deadline_at - time.monotonic()))
+                    outcome = "error"
+                    try:
+                        response = await client.post(url, headers=request_headers, json=body, timeout=attempt_timeout)
+                        outcome = "ok" if response.status_code < 400 else f"http_{response.status_code}"
+                        return response
+                    except BaseException as e:
+                        outcome = outcome_label(e)
+                        raise
+                    finally:
+                        attempt.set(outcome=outcome)
+                        UPSTREAM_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, outcome=outcome)
+                        UPSTREAM_REQUESTS.inc(endpoint=endpoint, outcome=outcome)
+
+    def out_of_time(pause: float) -> bool:
+        """No retry would start before the deadline"""
+        return deadline_at is not None and time.monotonic() + pause >= deadline_at
+
+    with span(f"upstream.{endpoint}") as call:
+        try:
+            for attempt in range(attempts):
+                call.set(attempts=attempt + 1)
+                if not breaker.allow():
+                    raise CircuitOpenError(endpoint, breaker.retry_in())
+
+                delay = latencies.percentile(HEDGE_PERCENTILE) if hedge and idempotent else None
+                pause = backoff_delay(attempt)
+                try:
+                    response = await (_hedged(endpoint, send, delay) if delay else send())
+                except RETRY_ERRORS as e:
+                    breaker.record_failure()
+                    timed_out = isinstance(e, httpx.TimeoutException)
+                    if attempt + 1 == attempts or out_of_time(pause) or (timed_out and not retry_timeouts):
+                        raise
+                    logger.warning(f"{endpoint} attempt {attempt + 1}/{attempts} failed: {type(e).__name__}")
+                except Exception:
+                    breaker.record_failure()
+                    raise
+                except BaseException:
+                    # A stage timeout cancelled the attempt, which says nothing about the
+                    # upstream. Without this a cancelled probe would keep the circuit half open
+                    breaker.release_probe()
+                    raise
+                else:
+                    if response.status_code not in RETRY_STATUS:
+                        breaker.record_success()
+                        # Time on the wire, without the wait for the limits
+                        latencies.add(response.elapsed.total_seconds())
+                        response.raise_for_status()
+                        UPSTREAM_CALLS.inc(endpoint=endpoint, outcome="ok")
+                        return response
+
+                    breaker.record_failure()
+                    if attempt + 1 == attempts or out_of_time(pause):
+                        response.raise_for_status()
+                    logger.warning(f"{endpoint} attempt {attempt + 1}/{attempts} got HTTP {response.status_code}")
+
+                await asyncio.sleep(pause)
+        except BaseException as e:
+            UPSTREAM_CALLS.inc(endpoint=endpoint, outcome=outcome_label(e))
+            raise
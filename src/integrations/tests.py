@@ -0,0 +1,399 @@
+import os
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from unittest import mock
+
+import httpx
+from django.test import SimpleTestCase
+
+from integrations.limits import Slots, TokenBucket, limiter_stats, upstream_slot
+from integrations.resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    _hedged,
+    get_breaker,
+    post_json,
+)
+
+
+class Clock:
+    """Stand-in for time.monotonic that only moves when told to"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TokenBucketTests(SimpleTestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch("integrations.limits.time.monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_sustained_rate(self):
+        bucket = TokenBucket(rate=10, burst=3)
+
+        self.assertEqual([bucket.reserve() for _ in range(3)], [0.0, 0.0, 0.0])
+        # Callers past the burst queue up one refill interval apart
+        self.assertEqual([round(bucket.reserve(), 3) for _ in range(3)], [0.1, 0.2, 0.3])
+
+    def test_refills_up_to_burst(self):
+        bucket = TokenBucket(rate=10, burst=3)
+        for _ in range(3):
+            bucket.reserve()
+
+        self.clock.now += 0.2
+        self.assertEqual([bucket.reserve() for _ in range(2)], [0.0, 0.0])
+        self.assertGreater(bucket.reserve(), 0)
+
+        # An idle minute refills no more than the burst
+        self.clock.now += 60
+        self.assertEqual([bucket.reserve() for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertGreater(bucket.reserve(), 0)
+
+    async def test_cancelled_wait_gives_its_token_back(self):
+        bucket = TokenBucket(rate=10, burst=1)
+        bucket.reserve()
+
+        with mock.patch("integrations.limits.asyncio.sleep", side_effect=asyncio.CancelledError):
+            with self.assertRaises(asyncio.CancelledError):
+                await bucket.acquire()
+
+        self.assertAlmostEqual(bucket.reserve(), 0.1)
+
+
+async def hold(slots: Slots, seconds: float, active: list, peak: list, order: list, name: str):
+    await slots.acquire()
+    try:
+        order.append(name)
+        active.append(name)
+        peak[0] = max(peak[0], len(active))
+        await asyncio.sleep(seconds)
+    finally:
+        active.remove(name)
+        slots.release()
+
+
+class SlotsTests(SimpleTestCase):
+
+    async def test_limits_concurrency_in_arrival_order(self):
+        slots = Slots(2)
+        active, peak, order = [], [0], []
+
+        await asyncio.gather(*(hold(slots, 0.02, active, peak, order, name) for name in "abcdef"))
+
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(order, list("abcdef"))
+        self.assertEqual((slots.in_use, slots.waiting), (0, 0))
+
+    async def test_cancelled_waiter_does_not_leak_a_slot(self):
+        slots = Slots(1)
+        await slots.acquire()
+        waiter = asyncio.ensure_future(slots.acquire())
+        await asyncio.sleep(0)
+        self.assertEqual(slots.waiting, 1)
+
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        slots.release()
+
+        self.assertEqual((slots.in_use, slots.waiting), (0, 0))
+        await asyncio.wait_for(slots.acquire(), timeout=1)
+        slots.release()
+
+    async def test_release_from_another_event_loop(self):
+        # Sync endpoints run each request on its own loop through async_to_sync
+        slots = Slots(1)
+        holding, release = threading.Event(), threading.Event()
+
+        def other_request():
+            async def run():
+                await slots.acquire()
+                holding.set()
+                release.wait()
+                slots.release()
+            asyncio.run(run())
+
+        thread = threading.Thread(target=other_request)
+        thread.start()
+        await asyncio.to_thread(holding.wait)
+        waiter = asyncio.ensure_future(slots.acquire())
+        await asyncio.sleep(0)
+        self.assertFalse(waiter.done())
+
+        release.set()
+        await asyncio.wait_for(waiter, timeout=1)
+        await asyncio.to_thread(thread.join)
+        self.assertEqual(slots.in_use, 1)
+        slots.release()
+
+
+class UpstreamSlotTests(SimpleTestCase):
+
+    @mock.patch.dict(os.environ, {"UPSTREAM_CONCURRENCY_TESTSLOW": "2"})
+    async def test_endpoint_concurrency_and_stats(self):
+        active, peak = [], [0]
+
+        async def call(n: int):
+            async with upstream_slot("testSlow"):
+                active.append(n)
+                peak[0] = max(peak[0], len(active))
+                await asyncio.sleep(0.02)
+                active.remove(n)
+
+        await asyncio.gather(*(call(n) for n in range(6)))
+
+        stats = limiter_stats()["endpoints"]["testSlow"]
+        self.assertEqual(peak[0], 2)
+        self.assertEqual((stats["requests"], stats["in_flight"], stats["queued"]), (6, 0, 0))
+        self.assertGreaterEqual(stats["max_queued"], 4)
+        self.assertGreater(stats["wait_seconds"], 0)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch("integrations.resilience.time.monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker("getSensedDays", failure_threshold=3, reset_seconds=30)
+
+    def open_breaker(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+
+    def test_opens_after_failure_threshold(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.retry_in(), 30)
+
+    def test_one_probe_when_half_open(self):
+        self.open_breaker()
+        self.clock.now += 30
+
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertFalse(self.breaker.allow())
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_opens_again(self):
+        self.open_breaker()
+        self.clock.now += 30
+        self.breaker.allow()
+
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_one_probe_across_threads(self):
+        self.open_breaker()
+        self.clock.now += 30
+        start = threading.Barrier(8)
+        allowed = []
+
+        def call():
+            start.wait()
+            allowed.append(self.breaker.allow())
+
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(allowed), [False] * 7 + [True])
+
+
+class Body(httpx.AsyncByteStream):
+    """Streamed body, read by the client like a network response so .elapsed is set"""
+
+    async def __aiter__(self):
+        yield b"{}"
+
+
+class PostJsonTests(SimpleTestCase):
+    """post_json against a mocked transport, without backoff or upstream limits"""
+
+    def setUp(self):
+        self.requests = []
+        self.responses = []
+        real_client = httpx.AsyncClient
+
+        async def handler(request):
+            self.requests.append(request)
+            response = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+            if isinstance(response, Exception):
+                raise response
+            if isinstance(response, asyncio.Event):
+                await response.wait()
+            return httpx.Response(response if isinstance(response, int) else 200, stream=Body())
+
+        @asynccontextmanager
+        async def no_limits(endpoint):
+            yield
+
+        for patcher in (
+            mock.patch(
+                "integrations.resilience.httpx.AsyncClient",
+                lambda **kwargs: real_client(transport=httpx.MockTransport(handler), **kwargs),
+            ),
+            mock.patch("integrations.resilience.upstream_slot", no_limits),
+            mock.patch("integrations.resilience.backoff_delay", return_value=0),
+            mock.patch.dict("integrations.resilience._breakers", clear=True),
+            mock.patch.dict("integrations.resilience._latencies", clear=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def post(self, **options) -> httpx.Response:
+        return await post_json("getSensedDays", "http://farmonaut.test/getSensedDays", {}, {}, timeout=5, **options)
+
+    async def test_retries_throttling_and_server_errors(self):
+        self.responses = [429, 503, 200]
+
+        response = await self.post()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(get_breaker("getSensedDays").failures, 0)
+
+    async def test_other_client_errors_are_not_retried(self):
+        self.responses = [404]
+
+        with self.assertRaises(httpx.HTTPStatusError):
+            await self.post()
+
+        self.assertEqual(len(self.requests), 1)
+        # The upstream answered, so the breaker counts it as healthy
+        self.assertEqual(get_breaker("getSensedDays").failures, 0)
+
+    async def test_non_idempotent_call_is_sent_once(self):
+        self.responses = [503]
+
+        with self.assertRaises(httpx.HTTPStatusError):
+            await self.post(idempotent=False)
+
+        self.assertEqual(len(self.requests), 1)
+
+    async def test_no_retry_past_the_deadline(self):
+        self.responses = [httpx.ConnectError("refused")]
+
+        with mock.patch("integrations.resilience.backoff_delay", return_value=10):
+            with self.assertRaises(httpx.ConnectError):
+                await self.post(deadline=5)
+
+        self.assertEqual(len(self.requests), 1)
+
+    async def test_timeouts_are_not_retried_when_disabled(self):
+        self.responses = [httpx.ReadTimeout("slow")]
+
+        with self.assertRaises(httpx.ReadTimeout):
+            await self.post(retry_timeouts=False)
+        self.assertEqual(len(self.requests), 1)
+
+        with self.assertRaises(httpx.ReadTimeout):
+            await self.post()
+        self.assertEqual(len(self.requests), 4)
+
+    async def test_open_breaker_sends_nothing(self):
+        self.responses = [503]
+        with self.assertRaises(httpx.HTTPStatusError):
+            await self.post()
+
+        # Opens on the fifth failed attempt, the third attempt is not sent
+        with self.assertRaises(CircuitOpenError):
+            await self.post()
+        self.assertEqual(len(self.requests), 5)
+
+        with self.assertRaises(CircuitOpenError):
+            await self.post()
+        self.assertEqual(len(self.requests), 5)
+
+    async def test_cancelled_probe_is_released(self):
+        breaker = get_breaker("getSensedDays")
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        breaker.opened_at -= breaker.reset_seconds
+        self.responses = [asyncio.Event()]
+
+        call = asyncio.ensure_future(self.post())
+        while not self.requests:
+            await asyncio.sleep(0)
+        self.assertTrue(breaker.probing)
+        call.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await call
+
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertFalse(breaker.probing)
+        self.assertTrue(breaker.allow())
+
+
+class HedgeTests(SimpleTestCase):
+
+    async def test_first_success_wins_and_the_other_is_cancelled(self):
+        cancelled = []
+
+        async def slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append("slow")
+                raise
+
+        async def fast():
+            return httpx.Response(200)
+
+        sends = iter([slow, fast])
+
+        response = await _hedged("askJeevnAPI", lambda: next(sends)(), delay=0.01)
+
+        self.assertEqual(response.status_code, 200)
+        await asyncio.sleep(0)
+        self.assertEqual(cancelled, ["slow"])
+
+    async def test_no_hedge_when_the_first_answers_in_time(self):
+        sends = []
+
+        async def send():
+            sends.append(1)
+            return httpx.Response(200)
+
+        await _hedged("askJeevnAPI", send, delay=1)
+
+        self.assertEqual(len(sends), 1)
+
+    async def test_failure_of_one_waits_for_the_other(self):
+        async def failing():
+            await asyncio.sleep(0.02)
+            raise httpx.ConnectError("refused")
+
+        async def late():
+            await asyncio.sleep(0.05)
+            return httpx.Response(200)
+
+        sends = iter([failing, late])
+
+        response = await _hedged("askJeevnAPI", lambda: next(sends)(), delay=0.01)
+
+        self.assertEqual(response.status_code, 200)
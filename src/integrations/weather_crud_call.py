@@ -8,13 +8,15 @@ import httpx
 import asyncio
 from dotenv import load_dotenv
 
+from integrations.resilience import CircuitOpenError, farmanout_url, post_json
+
 load_dotenv()
 
 async def weather_forecast(
     field_id : str,
 ):
     server_response_time = float(os.getenv('SERVER_RESPONSE_TIME'))
-    endpoint_url = "https://us-central1-farmbase-b2f7e.cloudfunctions.net/getPresentWeather"
+    endpoint_url = farmanout_url("getPresentWeather")
     
     body_obj = {
         "FieldID" : field_id
@@ -26,9 +28,7 @@ async def weather_forecast(
     }
 
     try:
-        async with httpx.AsyncClient(timeout=server_response_time) as client:
-            response = await client.post(endpoint_url, headers=headers_obj, json=body_obj)
-            response.raise_for_status()  # Raise exception for 4xx/5xx
+        response = await post_json("getPresentWeather", endpoint_url, headers_obj, body_obj, timeout=server_response_time)
 
         try:
             res = response.json()
@@ -43,6 +43,12 @@ async def weather_forecast(
                 "response_text": response.text
             }
 
+    except CircuitOpenError as e:
+        return {
+            "api" : "weather_forecast",
+            "error": str(e)
+        }
+
     except httpx.ConnectTimeout:
         return {
             "api" : "weather_forecast",
@@ -0,0 +1,43 @@
+from datetime import date
+from typing import Any, Dict, Optional
+
+from pipelines.models import PipelineCheckpoint
+
+
+async def aload_checkpoints(farm_id: int, sensed_day: date) -> Dict[str, Any]:
+    """
+    Stages already completed for a farm and sensed day.
+
+    Returns:
+        dict: {stage: stored result}
+    """
+    return {
+        stage: result
+        async for stage, result in (
+            PipelineCheckpoint.objects
+            .filter(farm_id=farm_id, sensed_day=sensed_day)
+            .values_list('stage', 'result')
+        )
+    }
+
+
+async def asave_checkpoint(farm_id: int, sensed_day: date, stage: str, result: Optional[Any] = None, duration_ms: float = 0):
+    """Record a completed stage, result only when a later stage needs it on resume"""
+    await PipelineCheckpoint.objects.aupdate_or_create(
+        farm_id=farm_id,
+        sensed_day=sensed_day,
+        stage=stage,
+        defaults={"result": result, "duration_ms": duration_ms},
+    )
+
+
+async def afinish_sensed_day(farm_id: int, sensed_day: date) -> int:
+    """
+    Drop the checkpoints of a farm once a sensed day is fully processed, older
+    sensed days included since they will never be resumed.
+
+    Returns:
+        int: Number of checkpoints deleted.
+    """
+    deleted, _ = await PipelineCheckpoint.objects.filter(farm_id=farm_id, sensed_day__lte=sensed_day).adelete()
+    return deleted
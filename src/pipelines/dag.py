@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from utils.metrics import PIPELINE_STAGE_SECONDS, PIPELINE_STAGES
+from utils.tracing import span
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter(
+    fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+handler.setFormatter(formatter)
+if not logger.hasHandlers():
+    logger.addHandler(handler)
+
+# Stage outcomes
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_TIMEOUT = "timeout"
+STATUS_SKIPPED = "skipped"
+STATUS_RESUMED = "resumed"
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    One step of a pipeline run.
+
+    Attributes:
+        name (str): Unique stage name, also the key of its result.
+        func (Callable): Coroutine function called with the results of its
+            dependencies as positional arguments, in depends_on order.
+        depends_on (Tuple[str]): Stages that must succeed before this one starts.
+        timeout (float): Seconds before the stage is cancelled, None for no limit.
+        resumable (bool): A completed run of the stage can be reused by a retry.
+            False for stages that must run every time, e.g. a forecast fetch.
+    """
+    name: str
+    func: Callable[..., Awaitable[Any]]
+    depends_on: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    resumable: bool = True
+
+
+@dataclass
+class StageRecord:
+    """Timing and outcome of one stage, offsets in milliseconds from the start of the run"""
+    name: str
+    status: str
+    started_ms: float = 0.0
+    duration_ms: float = 0.0
+    error: Optional[str] = None
+    depends_on: List[str] = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "status": self.status,
+            "started_ms": round(self.started_ms, 1),
+            "duration_ms": round(self.duration_ms, 1),
+            "error": self.error,
+            "depends_on": self.depends_on,
+        }
+
+
+def _validate(stages: List[Stage]):
+    """Reject duplicate names, unknown dependencies and cycles"""
+    names = [stage.name for stage in stages]
+    if len(names) != len(set(names)):
+        raise ValueError(f"Duplicate stage names in {names}")
+
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        unknown = set(stage.depends_on) - set(by_name)
+        if unknown:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages {sorted(unknown)}")
+
+    # Kahn's algorithm, anything left over sits on a cycle
+    remaining = {stage.name: set(stage.depends_on) for stage in stages}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Dependency cycle between stages {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+
+async def run_stages(
+    stages: List[Stage],
+    label: str = "",
+    completed: Optional[Dict[str, Any]] = None,
+    on_complete: Optional[Callable[[Stage, Any, StageRecord], Awaitable[None]]] = None,
+) -> Tuple[Dict[str, Any], List[StageRecord]]:
+    """
+    Run stages as soon as their dependencies have succeeded.
+
+    Every stage is its own task waiting on the tasks of its dependencies, so
+    independent branches overlap and a slow stage only holds up the stages
+    that need its result. Errors and timeouts are contained to the stage and
+    its dependents, which are recorded as skipped.
+
+    Note that a timeout cancels the coroutine, a blocking call running in a
+    worker thread through sync_to_async finishes in the background.
+
+    Args:
+        stages (List[Stage]): Stages of the run, in any order.
+        label (str): Prefix for log lines, e.g. the field id.
+        completed (dict): {name: result} of resumable stages finished by an earlier
+            run, recorded as resumed and not run again.
+        on_complete (Callable): Awaited after each stage that succeeds, e.g. to
+            persist a checkpoint. Its failures are logged, the stage stays ok.
+
+    Returns:
+        tuple: {name: result} of succeeded stages and one StageRecord per stage, in
+            the order stages finished.
+    """
+    _validate(stages)
+    completed = completed or {}
+    start = time.perf_counter()
+    tasks: Dict[str, asyncio.Task] = {}
+    results: Dict[str, Any] = {}
+    records: List[StageRecord] = []
+
+    def elapsed_ms() -> float:
+        return (time.perf_counter() - start) * 1000
+
+    async def run(stage: Stage) -> bool:
+        if stage.resumable and stage.name in completed:
+            results[stage.name] = completed[stage.name]
+            records.append(StageRecord(name=stage.name, status=STATUS_RESUMED, started_ms=elapsed_ms(), depends_on=list(stage.depends_on)))
+            PIPELINE_STAGES.inc(stage=stage.name, status=STATUS_RESUMED)
+            return True
+
+        ok = True
+        for dependency in stage.depends_on:
+            # Dependencies never raise, they report success
+            ok = await tasks[dependency] and ok
+
+        record = StageRecord(name=stage.name, status=STATUS_OK, started_ms=elapsed_ms(), depends_on=list(stage.depends_on))
+        if not ok:
+            record.status = STATUS_SKIPPED
+            record.error = "Dependency did not succeed"
+            records.append(record)
+            PIPELINE_STAGES.inc(stage=stage.name, status=STATUS_SKIPPED)
+            logger.info(f"{label} stage {stage.name} skipped")
+            return False
+
+        args = [results[dependency] for dependency in stage.depends_on]
+        try:
+            # wait_for runs the stage as a task of its own, which inherits this span
+            with span(f"stage.{stage.name}"):
+                results[stage.name] = await asyncio.wait_for(stage.func(*args), timeout=stage.timeout)
+        except asyncio.TimeoutError:
+            record.status = STATUS_TIMEOUT
+            record.error = f"Timed out after {stage.timeout}s"
+        except Exception as e:
+            record.status = STATUS_FAILED
+            record.error = str(e) or type(e).__name__
+            logger.exception(f"{label} stage {stage.name} failed: {e}")
+
+        record.duration_ms = elapsed_ms() - record.started_ms
+        records.append(record)
+        PIPELINE_STAGES.inc(stage=stage.name, status=record.status)
+        PIPELINE_STAGE_SECONDS.observe(record.duration_ms / 1000, stage=stage.name, status=record.status)
+        logger.info(f"{label} stage {stage.name} {record.status} in {record.duration_ms:.0f} ms")
+        if record.status != STATUS_OK:
+            return False
+
+        if on_complete is not None:
+            try:
+                await on_complete(stage, results[stage.name], record)
+            except Exception as e:
+                logger.exception(f"{label} stage {stage.name} completion hook failed: {e}")
+        return True
+
+    for stage in stages:
+        tasks[stage.name] = asyncio.ensure_future(run(stage))
+    await asyncio.gather(*tasks.values())
+
+    done = sum(record.status in (STATUS_OK, STATUS_RESUMED) for record in records)
+    logger.info(f"{label} run finished in {elapsed_ms():.0f} ms: {done}/{len(records)} stages ok or resumed")
+    return results, records
+
+
+def is_complete(stages: List[Stage], records: List[StageRecord]) -> bool:
+    """True when every resumable stage either ran successfully or was resumed"""
+    status = {record.name: record.status for record in records}
+    return all(
+        status.get(stage.name) in (STATUS_OK, STATUS_RESUMED)
+        for stage in stages
+        if stage.resumable
+    )
@@ -0,0 +1,334 @@
+import time
+import logging
+from datetime import datetime
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+
+from ninja.errors import HttpError
+
+from dotenv import load_dotenv
+
+import traceback
+from asgiref.sync import sync_to_async
+
+from utils.az_upload import upload_field_images_to_azure
+from integrations.get_sensed_days import get_sensed_days
+from integrations.ai_advisory_crud_call import get_ai_advisory
+from integrations.weather_crud_call import weather_forecast
+from integrations.heatmaps_crud import get_all_images
+from integrations.index_values_crud_call import get_index_values
+from users.models import Farm
+from heatmaps.utils import asave_heatmaps_from_response, asave_index_values_from_response
+from ai_advisory.utils import save_ai_adviosry_from_response
+from weather.utils import asave_weather_from_response
+from crop_loss_analytics.rules import CROP_LOSS_RULES, SOURCE_ADVISORY, SOURCE_INDEX_VALUES, SOURCE_WEATHER, LossRule
+from crop_loss_analytics.utils import apply_crop_loss_rules
+from pipelines.checkpoints import afinish_sensed_day, aload_checkpoints, asave_checkpoint
+from pipelines.dag import STATUS_OK, STATUS_RESUMED, Stage, StageRecord, is_complete, run_stages
+from pipelines.unit_of_work import unit_of_work
+from utils.metrics import PIPELINE_RUN_SECONDS, PIPELINE_RUNS_IN_PROGRESS
+from utils.tracing import span, start_trace
+
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter(
+    fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+handler.setFormatter(formatter)
+if not logger.hasHandlers():
+    logger.addHandler(handler)
+
+# Per-stage limits in seconds. Farmonaut requests time out after SERVER_RESPONSE_TIME
+# on their own, these bound a whole stage including retries, uploads and saves
+STAGE_TIMEOUTS = {
+    "fetch_images": 120,
+    "upload_images": 300,
+    "index_values": 90,
+    "ai_advisory": 240,
+    "weather": 90,
+    "crop_loss": 30,
+}
+
+# Stage whose result is the payload of each crop loss signal source
+SOURCE_STAGES = {
+    SOURCE_WEATHER: "weather",
+    SOURCE_INDEX_VALUES: "index_values",
+    SOURCE_ADVISORY: "ai_advisory",
+}
+
+
+def _raise_on_error(payload: dict, what: str) -> dict:
+    """Integration calls report failures as {"error": ...} instead of raising"""
+    if isinstance(payload, dict) and payload.get("error"):
+        raise RuntimeError(f"{what} failed: {payload['error']}")
+    return payload
+
+
+async def fetch_images(field_id: str, sensed_day: str):
+    """Fetch heatmap image URLs"""
+    return await get_all_images(field_id=field_id, sensed_day=sensed_day)
+
+
+async def upload_images(url_files: dict, farm: Optional[Farm] = None):
+    """Copy fetched images to Azure and save the heatmaps"""
+    field_id = url_files.get("_meta", {}).get("field_id")
+    # Uploads block on the network without touching the database, keep them off the run's thread
+    results = await sync_to_async(upload_field_images_to_azure, thread_sensitive=False)(field_data=url_files)
+    with span("db.save_heatmaps"):
+        await asave_heatmaps_from_response(results, farm=farm)
+    logger.info(f"Heatmaps uploaded and saved for {field_id}")
+    return results
+
+
+async def process_heatmaps(field_id: str, sensed_day: str):
+    """Process and save heatmaps"""
+    return await upload_images(await fetch_images(field_id, sensed_day))
+
+
+async def process_index_values(field_id: str, sensed_day: str, farm: Optional[Farm] = None):
+    """Fetch and save index values"""
+    index_values = _raise_on_error(await get_index_values(field_id=field_id, sensed_day=sensed_day), "Index values")
+    with span("db.save_index_values"):
+        await asave_index_values_from_response(index_values, farm=farm)
+    logger.info(f"Index values saved for {field_id}: {index_values}")
+    return index_values
+
+
+async def process_ai_advisory(field_id: str, crop: str, farm: Optional[Farm] = None):
+    """Fetch and save AI advisory"""
+    ai_response = _raise_on_error(await get_ai_advisory(field_id=field_id, crop=crop), "AI advisory")
+    # The advisory and its raw archive are written in one transaction, which
+    # the async ORM cannot open. Thread-sensitive, so it runs on the run's connection
+    with span("db.save_ai_advisory"):
+        await sync_to_async(save_ai_adviosry_from_response)(api_response=ai_response, field_id=field_id, farm=farm)
+    logger.info(f"AI advisory saved for {field_id}")
+    return ai_response
+
+
+async def process_weather(field_id: str, farm: Optional[Farm] = None):
+    """Fetch and save weather forecast"""
+    weather_response = _raise_on_error(await weather_forecast(field_id=field_id), "Weather forecast")
+    with span("db.save_weather"):
+        await asave_weather_from_response(weather_response, field_id, farm=farm)
+    logger.info(f"Weather data saved for {field_id}")
+    return weather_response
+
+
+async def evaluate_crop_loss_rules(farm: Farm, field_id: str, last_day_sensed: datetime, source: str, rules: List[LossRule], payload: dict):
+    """Evaluate the crop loss rules of one signal source against the payload of its stage"""
+    # Transactional like the advisory save, on the run's connection
+    with span("db.apply_crop_loss_rules", source=source):
+        actions = await sync_to_async(apply_crop_loss_rules)(
+            farm, last_day_sensed, {source: payload}, rules=rules
+        )
+    logger.info(f"Crop loss {source} rules evaluated for {field_id}: {actions}")
+    return actions
+
+
+def crop_loss_stages(farm: Farm, field_id: str, last_day_sensed: datetime, sources) -> List[Stage]:
+    """
+    One stage per signal source with crop loss rules, each waiting only on its own
+    source stage. The stage evaluates all rules of the source in one
+    apply_crop_loss_rules call, sharing its reads and writes.
+    """
+    rules_by_source: Dict[str, List[LossRule]] = {}
+    for rule in CROP_LOSS_RULES:
+        if rule.source in sources:
+            rules_by_source.setdefault(rule.source, []).append(rule)
+
+    return [
+        Stage(
+            name=f"crop_loss_{source}",
+            func=partial(evaluate_crop_loss_rules, farm, field_id, last_day_sensed, source, rules),
+            depends_on=(SOURCE_STAGES[source],),
+            timeout=STAGE_TIMEOUTS["crop_loss"],
+            # Rules evaluated on every reload follow the forecast, not the sensed day
+            resumable=source != SOURCE_WEATHER,
+        )
+        for source, rules in rules_by_source.items()
+    ]
+
+
+def parse_sensed_day(sensed_day: str) -> datetime:
+    """Parse YYYYMMDD or YYYY-MM-DD, falling back to now"""
+    for fmt in ("%Y%m%d", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(sensed_day, fmt)
+        except ValueError:
+            continue
+    logger.warning(f"Could not parse sensed day {sensed_day}, using current datetime")
+    return datetime.now()
+
+
+async def update_all_data(farm: Farm, field_id: str, crop: str, new_sensed_day: str) -> Tuple[Dict[str, Any], List[StageRecord], bool]:
+    """Update all farm data when there's a new sensed day, returns stage results, records and whether every stage is done"""
+    logger.info(f"New sensed day detected for {field_id}: {new_sensed_day}")
+    last_day_sensed_dt = parse_sensed_day(new_sensed_day)
+    
+    # The crop loss rules of each source start as soon as that source has been saved,
+    # e.g. drought right after index values instead of after the slower advisory
+    stages = [
+        Stage("fetch_images", partial(fetch_images, field_id, new_sensed_day), timeout=STAGE_TIMEOUTS["fetch_images"]),
+        Stage("upload_images", partial(upload_images, farm=farm), ("fetch_images",), STAGE_TIMEOUTS["upload_images"]),
+        Stage("index_values", partial(process_index_values, field_id, new_sensed_day, farm=farm), timeout=STAGE_TIMEOUTS["index_values"]),
+        Stage("ai_advisory", partial(process_ai_advisory, field_id, crop, farm=farm), timeout=STAGE_TIMEOUTS["ai_advisory"]),
+        Stage("weather", partial(process_weather, field_id, farm=farm), timeout=STAGE_TIMEOUTS["weather"], resumable=False),
+        *crop_loss_stages(farm, field_id, last_day_sensed_dt, SOURCE_STAGES),
+    ]
+    
+    # All database work of the run shares one thread and connection
+    async with unit_of_work():
+        # A retry of the same sensed day only runs what an earlier run did not finish
+        sensed_date = last_day_sensed_dt.date()
+        with span("db.load_checkpoints"):
+            completed = await aload_checkpoints(farm.id, sensed_date)
+        consumed = {dependency for stage in stages for dependency in stage.depends_on}
+    
+        async def checkpoint(stage: Stage, result, record: StageRecord):
+            if stage.resumable:
+                with span("db.save_checkpoint", stage=stage.name):
+                    await asave_checkpoint(
+                        farm.id, sensed_date, stage.name, result if stage.name in consumed else None, record.duration_ms
+                    )
+    
+        results, records = await run_stages(stages, label=field_id, completed=completed, on_complete=checkpoint)
+    
+        complete = is_complete(stages, records)
+        if complete:
+            farm.last_sensed_day = sensed_date
+            with span("db.finish_sensed_day"):
+                await farm.asave(update_fields=["last_sensed_day", "updated_at"])
+                await afinish_sensed_day(farm.id, sensed_date)
+            logger.info(f"Farm updated with last_sensed_day={sensed_date} for {field_id}")
+    return results, records, complete
+
+async def update_weather_only(farm: Farm, field_id: str, crop: str, last_day_sensed: str) -> Tuple[Dict[str, Any], List[StageRecord]]:
+    """Update only weather data when sensed day hasn't changed"""
+    logger.info(f"No new sensed day for {field_id}, updating weather only")
+    last_day_sensed_dt = parse_sensed_day(last_day_sensed)
+    
+    # Weather analytics is based on everytime rain conditions, only weather rules run
+    stages = [
+        Stage("weather", partial(process_weather, field_id, farm=farm), timeout=STAGE_TIMEOUTS["weather"], resumable=False),
+        *crop_loss_stages(farm, field_id, last_day_sensed_dt, [SOURCE_WEATHER]),
+    ]
+    async with unit_of_work():
+        return await run_stages(stages, label=field_id)
+
+
+def normalize_to_yyyymmdd(date_value) -> str:
+    """Convert date to YYYYMMDD string format."""
+    if date_value is None:
+        return None
+    
+    return str(date_value).replace('-', '').replace('/', '')[:8]
+
+
+def stage_results(results: Dict[str, Any], records: List[StageRecord]) -> Dict[str, Dict[str, Any]]:
+    """Per-stage {"success", "error", "data"} breakdown of a run"""
+    return {
+        record.name: {
+            "success": record.status in (STATUS_OK, STATUS_RESUMED),
+            "error": record.error,
+            "data": results.get(record.name),
+        }
+        for record in records
+    }
+
+
+async def reload_farm(farm: Farm, field_id: str, crop: str, include_results: bool = False) -> Dict[str, Any]:
+    """
+    Reload a farm: the full stage graph when Farmonaut has a new sensed day,
+    otherwise only weather and its rules. Both endpoints run this, the sync one
+    through a single event loop per request.
+
+    Args:
+        farm (Farm): Farm to reload.
+        field_id (str): Farmonaut field id.
+        crop (str): Crop for the AI advisory.
+        include_results (bool): Add the per-stage results and a summary to the response.
+
+    Raises:
+        HttpError: 408 while no sensed day exists yet, 500 if a run fails outside its stages.
+    """
+    # One trace per reload, every stage, Farmonaut call, upload and save below is a span of it
+    with start_trace("reload", field_id=field_id, crop=crop) as trace:
+        PIPELINE_RUNS_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        # Labels of the run duration, set as the run gets further
+        update_type, outcome = "unknown", "failed"
+        try:
+            # Get current and new sensed days
+            current_sensed_day = farm.last_sensed_day
+            try:
+                response_ = await get_sensed_days(field_id=field_id)
+                new_sensed_day = response_["last_sensed_day"]
+                if new_sensed_day is None:
+                    raise ValueError("No sensed day found yet")
+                logger.info(f"Sensed day fetched successfully for {field_id}: {new_sensed_day}")
+            except Exception as e:
+                logger.warning(f"get_sensed_days failed for {field_id}: {e}")
+                traceback.print_exc()
+                outcome = "no_sensed_day"
+                raise HttpError(408, "Currently Loading Screens")
+    
+            # Determine if we need full update or just weather update
+            has_new_sensed_day = (current_sensed_day is None or 
+                              normalize_to_yyyymmdd(current_sensed_day) != normalize_to_yyyymmdd(new_sensed_day))
+            update_type = "full" if has_new_sensed_day else "weather_only"
+    
+            if has_new_sensed_day:
+                # Full update with all data, last_sensed_day only advances once every stage is done
+                try:
+                    results, records, complete = await update_all_data(farm, field_id, crop, new_sensed_day)
+                except Exception as e:
+                    logger.error(f"Full update failed for {field_id}: {e}")
+                    traceback.print_exc()
+                    raise HttpError(500, f"Profile update failed: {str(e)}")
+        
+                logger.info(f"Full profile update {'completed' if complete else 'partially completed'} for {field_id}")
+                response = {
+                    "status": "success",
+                    "field_id": field_id,
+                    "last_sensed_day": str(new_sensed_day),
+                    "update_type": "full",
+                    "complete": complete,
+                }
+            else:
+                # Only update weather
+                try:
+                    results, records = await update_weather_only(farm, field_id, crop, new_sensed_day)
+                except Exception as e:
+                    logger.error(f"Weather update failed for {field_id}: {e}")
+                    traceback.print_exc()
+                    raise HttpError(500, f"Weather update failed: {str(e)}")
+        
+                logger.info(f"Weather-only update completed for {field_id}")
+                response = {
+                    "status": "success",
+                    "field_id": field_id,
+                    "last_sensed_day": str(current_sensed_day),
+                    "update_type": "weather_only",
+                    "complete": True,
+                }
+    
+            response["stages"] = [record.as_dict() for record in records]
+            if include_results:
+                response["results"] = stage_results(results, records)
+                response["summary"] = {
+                    "successful": sum(1 for result in response["results"].values() if result["success"]),
+                    "total": len(records),
+                }
+            outcome = "complete" if response["complete"] else "partial"
+            if trace.trace_id:
+                response["trace_id"] = trace.trace_id
+            return response
+        finally:
+            trace.set(update_type=update_type, outcome=outcome)
+            PIPELINE_RUNS_IN_PROGRESS.dec()
+            PIPELINE_RUN_SECONDS.observe(time.perf_counter() - start, update_type=update_type, outcome=outcome)
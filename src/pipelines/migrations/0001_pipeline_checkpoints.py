@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 22:34
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('users', '0004_farm_resource_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PipelineCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sensed_day', models.DateField()),
+                ('stage', models.CharField(max_length=50)),
+                ('result', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('duration_ms', models.FloatField(default=0)),
+                ('completed_at', models.DateTimeField(auto_now=True)),
+                ('farm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pipeline_checkpoints', to='users.farm')),
+            ],
+            options={
+                'db_table': 'pipeline_checkpoints',
+                'constraints': [models.UniqueConstraint(fields=('farm', 'sensed_day', 'stage'), name='unique_pipeline_checkpoint')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+from users.models import Farm
+
+class PipelineCheckpoint(models.Model):
+    """
+    A pipeline stage that completed for a farm and sensed day. A retried reload
+    of the same sensed day resumes from these instead of redoing the work.
+    """
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='pipeline_checkpoints')
+    sensed_day = models.DateField()
+    stage = models.CharField(max_length=50)
+    
+    # Output of the stage, only kept when a later stage consumes it
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    duration_ms = models.FloatField(default=0)
+    completed_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'pipeline_checkpoints'
+        constraints = [
+            models.UniqueConstraint(fields=["farm", "sensed_day", "stage"], name="unique_pipeline_checkpoint")
+        ]
+    
+    def __str__(self):
+        return f"{self.farm_id} - {self.sensed_day} - {self.stage}"
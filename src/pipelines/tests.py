@@ -0,0 +1,217 @@
+import json
+import asyncio
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase
+
+from testing.fixtures import DAY, advisory_response, make_farm
+from crop_loss_analytics.models import CropLossAnalytics
+from pipelines.engine import crop_loss_stages, update_all_data
+from pipelines.checkpoints import afinish_sensed_day, aload_checkpoints, asave_checkpoint
+from pipelines.dag import (
+    STATUS_FAILED,
+    STATUS_OK,
+    STATUS_RESUMED,
+    STATUS_SKIPPED,
+    STATUS_TIMEOUT,
+    Stage,
+    is_complete,
+    run_stages,
+)
+from utils.query_metrics import assert_max_queries
+
+def returning(value, delay: float = 0, calls: list = None):
+    """Stage function returning value after delay, appending its arguments to calls"""
+    async def func(*args):
+        if calls is not None:
+            calls.append(args)
+        await asyncio.sleep(delay)
+        return value
+    return func
+
+
+async def failing(*args):
+    raise RuntimeError("upstream down")
+
+
+def statuses(records) -> dict:
+    return {record.name: record.status for record in records}
+
+
+class RunStagesTests(SimpleTestCase):
+
+    async def test_dependencies_get_results_and_branches_overlap(self):
+        calls = []
+        stages = [
+            Stage("slow", returning("images", delay=0.2)),
+            Stage("fast", returning({"ndmi": 20})),
+            Stage("drought", returning("created", calls=calls), ("fast",)),
+            Stage("upload", returning("urls", calls=calls), ("slow",)),
+        ]
+
+        results, records = await run_stages(stages)
+
+        self.assertEqual(results, {"slow": "images", "fast": {"ndmi": 20}, "drought": "created", "upload": "urls"})
+        self.assertEqual(calls, [({"ndmi": 20},), ("images",)])
+        # drought did not wait for the unrelated slow stage
+        order = [record.name for record in records]
+        self.assertLess(order.index("drought"), order.index("slow"))
+        self.assertTrue(is_complete(stages, records))
+
+    async def test_timed_out_stage_is_recorded_and_dependents_skipped(self):
+        stages = [
+            Stage("advisory", returning("late", delay=5), timeout=0.05),
+            Stage("pest", returning("created"), ("advisory",)),
+            Stage("weather", returning("forecast")),
+        ]
+
+        results, records = await run_stages(stages)
+
+        self.assertEqual(results, {"weather": "forecast"})
+        self.assertEqual(statuses(records), {"advisory": STATUS_TIMEOUT, "pest": STATUS_SKIPPED, "weather": STATUS_OK})
+        timed_out = next(record for record in records if record.name == "advisory")
+        self.assertEqual(timed_out.error, "Timed out after 0.05s")
+        self.assertLess(timed_out.duration_ms, 1000)
+        self.assertFalse(is_complete(stages, records))
+
+    async def test_failed_stage_is_contained(self):
+        stages = [
+            Stage("index_values", failing),
+            Stage("drought", returning("created"), ("index_values",)),
+            Stage("weather", returning("forecast")),
+        ]
+
+        _, records = await run_stages(stages)
+
+        self.assertEqual(statuses(records), {"index_values": STATUS_FAILED, "drought": STATUS_SKIPPED, "weather": STATUS_OK})
+        self.assertEqual(records[0].error, "upstream down")
+
+    async def test_completed_stages_are_resumed_not_run(self):
+        calls = []
+        stages = [
+            Stage("fetch_images", returning("fresh", calls=calls)),
+            Stage("upload_images", returning("urls", calls=calls), ("fetch_images",)),
+            Stage("weather", returning("forecast", calls=calls), resumable=False),
+        ]
+
+        results, records = await run_stages(stages, completed={"fetch_images": "stored", "weather": "stale"})
+
+        self.assertEqual(
+            statuses(records),
+            {"fetch_images": STATUS_RESUMED, "upload_images": STATUS_OK, "weather": STATUS_OK},
+        )
+        # upload gets the stored result, the non resumable weather stage runs again
+        self.assertEqual(sorted(calls), [(), ("stored",)])
+        self.assertEqual(results["weather"], "forecast")
+        self.assertTrue(is_complete(stages, records))
+
+    async def test_invalid_graphs_are_rejected(self):
+        with self.assertRaisesRegex(ValueError, "cycle"):
+            await run_stages([Stage("a", returning(1), ("b",)), Stage("b", returning(2), ("a",))])
+        with self.assertRaisesRegex(ValueError, "unknown"):
+            await run_stages([Stage("a", returning(1), ("missing",))])
+
+
+class CheckpointTests(TestCase):
+
+    def setUp(self):
+        self.farm = make_farm()
+
+    async def test_retry_only_runs_unfinished_stages(self):
+        attempts = []
+
+        async def flaky_advisory():
+            attempts.append(len(attempts))
+            if len(attempts) == 1:
+                raise RuntimeError("timeout upstream")
+            return {"pest_risk": 1}
+
+        calls = []
+        stages = [
+            Stage("index_values", returning({"ndmi": 20}, calls=calls)),
+            Stage("drought", returning("created", calls=calls), ("index_values",)),
+            Stage("ai_advisory", flaky_advisory),
+            Stage("pest", returning("none"), ("ai_advisory",)),
+        ]
+
+        async def checkpoint(stage, result, record):
+            await asave_checkpoint(self.farm.id, DAY, stage.name, result, record.duration_ms)
+
+        _, records = await run_stages(stages, completed=await aload_checkpoints(self.farm.id, DAY), on_complete=checkpoint)
+        self.assertFalse(is_complete(stages, records))
+        self.assertEqual(len(calls), 2)
+
+        _, records = await run_stages(stages, completed=await aload_checkpoints(self.farm.id, DAY), on_complete=checkpoint)
+
+        self.assertEqual(
+            statuses(records),
+            {"index_values": STATUS_RESUMED, "drought": STATUS_RESUMED, "ai_advisory": STATUS_OK, "pest": STATUS_OK},
+        )
+        self.assertEqual(len(calls), 2)
+        self.assertTrue(is_complete(stages, records))
+
+    async def test_finishing_a_sensed_day_drops_older_checkpoints(self):
+        await asave_checkpoint(self.farm.id, DAY - timedelta(days=5), "index_values", {"ndmi": 40})
+        await asave_checkpoint(self.farm.id, DAY, "index_values", {"ndmi": 20})
+        await asave_checkpoint(self.farm.id, DAY + timedelta(days=5), "index_values", {"ndmi": 10})
+
+        self.assertEqual(await afinish_sensed_day(self.farm.id, DAY), 2)
+        self.assertEqual(await aload_checkpoints(self.farm.id, DAY), {})
+        self.assertEqual(await aload_checkpoints(self.farm.id, DAY + timedelta(days=5)), {"index_values": {"ndmi": 10}})
+
+
+def fixture(name: str, farm, sensed_day: str) -> dict:
+    """Saved Farmonaut response from src/, with its _meta pointing at farm and sensed_day"""
+    with open(settings.BASE_DIR / name) as f:
+        payload = json.load(f)
+    if "_meta" in payload:
+        payload["_meta"] = {**payload["_meta"], "field_id": farm.field_id, "sensed_day": sensed_day}
+    return payload
+
+
+class ReloadTests(TestCase):
+
+    def setUp(self):
+        self.farm = make_farm()
+        self.sensed_day = DAY.strftime("%Y%m%d")
+        weather = json.loads((settings.BASE_DIR / "presentWeather.json").read_text())
+        # Rain heavy enough to open a flood scenario today
+        weather["daily"][0]["rain"] = 100
+        upstream = {
+            "get_all_images": fixture("field_1761808284616_20251029.json", self.farm, self.sensed_day),
+            "get_index_values": fixture("index_values.json", self.farm, self.sensed_day),
+            "get_ai_advisory": advisory_response(DAY, pest_levels=["high"]),
+            "weather_forecast": {"api": "weather_forecast", "weather": weather},
+        }
+        for name, payload in upstream.items():
+            patcher = mock.patch(f"pipelines.engine.{name}", mock.AsyncMock(return_value=payload))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch(
+            "pipelines.engine.upload_field_images_to_azure",
+            return_value=fixture("azure_urls.json", self.farm, self.sensed_day),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_one_crop_loss_stage_per_source(self):
+        stages = crop_loss_stages(self.farm, self.farm.field_id, DAY, ["weather", "index_values", "advisory"])
+
+        self.assertEqual(
+            {stage.name: stage.depends_on for stage in stages},
+            {"crop_loss_weather": ("weather",), "crop_loss_index_values": ("index_values",), "crop_loss_advisory": ("ai_advisory",)},
+        )
+
+    async def test_full_reload_query_budget(self):
+        # Per stage its saves, version bump and checkpoint, plus one evaluation per
+        # crop loss source. Counts the savepoints of the test transaction too
+        with assert_max_queries(84):
+            results, records, complete = await update_all_data(self.farm, self.farm.field_id, "rice", self.sensed_day)
+
+        self.assertTrue(complete, [record.as_dict() for record in records])
+        self.assertEqual(results["crop_loss_weather"], {"flood": "created"})
+        self.assertEqual(results["crop_loss_index_values"], {"drought": "none"})
+        self.assertEqual(results["crop_loss_advisory"], {"pest": "pending"})
+        self.assertTrue(await CropLossAnalytics.objects.filter(farm=self.farm, kind="flood", is_active=True).aexists())
@@ -0,0 +1,35 @@
+import threading
+from contextlib import asynccontextmanager
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.db import connections
+
+
+def _release_connections(outer_thread: int):
+    """Close the connections of a thread the run owned, a calling request thread keeps its own"""
+    if threading.get_ident() != outer_thread:
+        connections.close_all()
+
+
+@asynccontextmanager
+async def unit_of_work():
+    """
+    Scope the database work of one pipeline run to a single thread and connection.
+
+    Django's async ORM and sync_to_async with the default thread_sensitive=True
+    run on the thread-sensitive executor of the current context. Inside this
+    block that is one thread per run, so every aget, aupdate_or_create and
+    transactional sync save of the run share one connection and queue behind
+    each other instead of opening a connection per worker thread. Under
+    async_to_sync, e.g. the sync endpoint, asgiref keeps routing these calls to
+    the calling request thread, which then is the run's thread.
+
+    Blocking work without database access, such as blob uploads, should keep
+    using sync_to_async(thread_sensitive=False) so it does not hold up saves.
+    """
+    outer_thread = await sync_to_async(threading.get_ident)()
+    async with ThreadSensitiveContext():
+        try:
+            yield
+        finally:
+            await sync_to_async(_release_connections)(outer_thread)
@@ -0,0 +1,70 @@
+from django.conf import settings
+from ninja import Router
+from ninja.errors import HttpError
+from ninja_jwt.authentication import JWTAuth
+
+from regions.models import RegionCell
+from regions.utils import cell_bounds, cell_index
+from regions.region_schemas import RegionCellCollectionSchema
+
+regions_router = Router(tags = ["Regions"])
+
+# Upper bound on cells per response, larger boxes have to zoom in
+MAX_REGION_CELLS = 2500
+
+@regions_router.get(
+    "/region_cells",
+    response = RegionCellCollectionSchema,
+    auth = JWTAuth()
+)
+def get_region_cells(request, min_lat : float, max_lat : float, min_lon : float, max_lon : float):
+    """
+    Populated grid cells overlapping the bounding box as GeoJSON, with the number
+    of farms, farms under each active crop loss kind and mean latest index values.
+    Aggregates are maintained on write, so this is one indexed range query.
+    """
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HttpError(400, "Bounding box minimum must not exceed its maximum")
+    
+    size = settings.REGION_GRID_SIZE_DEGREES
+    min_lat_index, min_lon_index = cell_index(min_lat, min_lon, size)
+    max_lat_index, max_lon_index = cell_index(max_lat, max_lon, size)
+    
+    cells = list(
+        RegionCell.objects
+        .filter(
+            lat_index__gte = min_lat_index,
+            lat_index__lte = max_lat_index,
+            lon_index__gte = min_lon_index,
+            lon_index__lte = max_lon_index,
+            farm_count__gt = 0,
+        )
+        .order_by('lat_index', 'lon_index')
+        .values_list('lat_index', 'lon_index', 'farm_count', 'active_losses', 'index_totals')[:MAX_REGION_CELLS + 1]
+    )
+    if len(cells) > MAX_REGION_CELLS:
+        raise HttpError(400, f"More than {MAX_REGION_CELLS} cells in the bounding box, zoom in")
+    
+    features = []
+    for lat_index, lon_index, farm_count, active_losses, index_totals in cells:
+        south, west, north, east = cell_bounds(lat_index, lon_index, size)
+        features.append({
+            "type" : "Feature",
+            "geometry" : {
+                "type" : "Polygon",
+                "coordinates" : [[[west, south], [east, south], [east, north], [west, north], [west, south]]],
+            },
+            "properties" : {
+                "lat_index" : lat_index,
+                "lon_index" : lon_index,
+                "farms" : farm_count,
+                "active_losses" : active_losses,
+                "index_means" : RegionCell(index_totals=index_totals).index_means(),
+            },
+        })
+    
+    return {
+        "type" : "FeatureCollection",
+        "grid_size" : size,
+        "features" : features,
+    }
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from regions.utils import rebuild_region_cells
+
+class Command(BaseCommand):
+    help = "Recomputes the region grid cells from every farm, e.g. after changing REGION_GRID_SIZE_DEGREES"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch_size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        stats = rebuild_region_cells(batch_size=options['batch_size'])
+
+        self.stdout.write(f"Placed {stats['farms']} farms in {stats['cells']} region cells")
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-18 22:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('users', '0004_farm_resource_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegionCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lat_index', models.IntegerField()),
+                ('lon_index', models.IntegerField()),
+                ('farm_count', models.PositiveIntegerField(default=0)),
+                ('active_losses', models.JSONField(blank=True, default=dict)),
+                ('index_totals', models.JSONField(blank=True, default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'region_cells',
+                'constraints': [models.UniqueConstraint(fields=('lat_index', 'lon_index'), name='unique_region_cell')],
+            },
+        ),
+        migrations.CreateModel(
+            name='FarmRegion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index_date', models.DateField(blank=True, null=True)),
+                ('index_values', models.JSONField(blank=True, default=dict)),
+                ('active_kinds', models.JSONField(blank=True, default=list)),
+                ('farm', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='region', to='users.farm')),
+                ('cell', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='farm_regions', to='regions.regioncell')),
+            ],
+            options={
+                'db_table': 'farm_regions',
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+from django.db import models
+
+from users.models import Farm
+
+class RegionCell(models.Model):
+    """
+    One square of the region grid with running aggregates of the farms inside it.
+    Cell (lat_index, lon_index) spans [lat_index, lat_index + 1) * REGION_GRID_SIZE_DEGREES
+    in latitude and the same in longitude.
+    """
+    lat_index = models.IntegerField()
+    lon_index = models.IntegerField()
+    farm_count = models.PositiveIntegerField(default=0)
+
+    # {kind: farms with an active crop loss scenario of that kind}
+    active_losses = models.JSONField(default=dict, blank=True)
+    # {index_type: {"sum": total of the latest value per farm, "farms": farms with a value}}
+    index_totals = models.JSONField(default=dict, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'region_cells'
+        constraints = [
+            models.UniqueConstraint(fields=["lat_index", "lon_index"], name="unique_region_cell")
+        ]
+
+    def __str__(self):
+        return f"Cell ({self.lat_index}, {self.lon_index}) - {self.farm_count} farms"
+
+    def index_means(self) -> dict:
+        """Mean latest index value of the farms in the cell, per index type"""
+        return {
+            index_type: round(totals["sum"] / totals["farms"], 2)
+            for index_type, totals in (self.index_totals or {}).items()
+            if totals.get("farms")
+        }
+
+
+class FarmRegion(models.Model):
+    """
+    What a farm currently contributes to its cell, so every update only applies
+    the difference and replaying an update changes nothing.
+    """
+    farm = models.OneToOneField(Farm, on_delete=models.CASCADE, related_name='region')
+    cell = models.ForeignKey(RegionCell, on_delete=models.PROTECT, related_name='farm_regions')
+
+    # Sensed day of index_values, older saves never replace newer ones
+    index_date = models.DateField(null=True, blank=True)
+    index_values = models.JSONField(default=dict, blank=True)
+    active_kinds = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        db_table = 'farm_regions'
+
+    def __str__(self):
+        return f"{self.farm_id} - cell {self.cell_id}"
@@ -0,0 +1,29 @@
+from typing import Dict, List
+from ninja import Schema
+
+class RegionCellPropertiesSchema(Schema):
+    """Aggregates of the farms in one grid cell"""
+    lat_index : int
+    lon_index : int
+    farms : int
+    active_losses : Dict[str, int]
+    index_means : Dict[str, float]
+
+
+class RegionCellGeometrySchema(Schema):
+    """GeoJSON polygon of the cell, [longitude, latitude] pairs"""
+    type : str = "Polygon"
+    coordinates : List[List[List[float]]]
+
+
+class RegionCellFeatureSchema(Schema):
+    type : str = "Feature"
+    geometry : RegionCellGeometrySchema
+    properties : RegionCellPropertiesSchema
+
+
+class RegionCellCollectionSchema(Schema):
+    """GeoJSON FeatureCollection of the populated cells inside a bounding box"""
+    type : str = "FeatureCollection"
+    grid_size : float
+    features : List[RegionCellFeatureSchema]
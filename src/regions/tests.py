@@ -0,0 +1,81 @@
+from datetime import date, timedelta
+
+from django.test import TestCase
+
+from testing.fixtures import DAY, make_farm
+from users.models import Farm
+from crop_loss_analytics.models import CropLossAnalytics
+from crop_loss_analytics.utils import apply_crop_loss_rules
+from regions.models import FarmRegion, RegionCell
+from regions.utils import assign_farm_region, rebuild_region_cells, sync_region_losses, update_region_index_values
+
+
+def cell_snapshot() -> dict:
+    return {
+        (cell.lat_index, cell.lon_index): (cell.farm_count, cell.active_losses, cell.index_means())
+        for cell in RegionCell.objects.filter(farm_count__gt=0)
+    }
+
+
+class RegionAggregateTests(TestCase):
+    """Incremental cell aggregates always match a rebuild from the farms"""
+
+    def setUp(self):
+        # Two farms share a cell, the third is in the next cell east
+        self.farms = [make_farm("a", 15.51, 73.71), make_farm("b", 15.55, 73.75), make_farm("c", 15.55, 73.85)]
+        for farm in self.farms:
+            assign_farm_region(farm)
+
+    def rain(self, farm: Farm, day: date, rain: float):
+        apply_crop_loss_rules(farm, day, {"weather": {"daily": [{"rain": rain}]}}, today=day)
+
+    def assert_matches_rebuild(self):
+        incremental = cell_snapshot()
+        rebuild_region_cells()
+        self.assertEqual(incremental, cell_snapshot())
+
+    def test_farms_are_bucketed_by_centroid(self):
+        self.assertEqual(
+            {key: farm_count for key, (farm_count, _, _) in cell_snapshot().items()},
+            {(155, 737): 2, (155, 738): 1},
+        )
+
+    def test_active_losses_after_scenario_closes(self):
+        for farm in self.farms[:2]:
+            self.rain(farm, DAY, 100)
+        cell = RegionCell.objects.get(lat_index=155, lon_index=737)
+        self.assertEqual(cell.active_losses, {"flood": 2})
+
+        # Farm a stays dry past its grace period, farm b keeps flooding
+        self.rain(self.farms[0], DAY + timedelta(days=8), 0)
+        self.rain(self.farms[1], DAY + timedelta(days=8), 100)
+
+        self.assertFalse(CropLossAnalytics.objects.get(farm=self.farms[0]).is_active)
+        cell.refresh_from_db()
+        self.assertEqual(cell.active_losses, {"flood": 1})
+        self.assertEqual(FarmRegion.objects.get(farm=self.farms[0]).active_kinds, [])
+        self.assertEqual(sync_region_losses([farm.id for farm in self.farms]), 0)
+        self.assert_matches_rebuild()
+
+    def test_index_means_keep_newest_sensed_day(self):
+        update_region_index_values(self.farms[0].id, DAY, {"ndvi": 0.4, "ndmi": 30})
+        update_region_index_values(self.farms[1].id, DAY, {"ndvi": 0.6, "ndmi": -1})
+        self.assertTrue(update_region_index_values(self.farms[0].id, DAY + timedelta(days=5), {"ndvi": 0.8}))
+        # Older or repeated saves change nothing
+        self.assertFalse(update_region_index_values(self.farms[0].id, DAY, {"ndvi": 0.1}))
+        self.assertFalse(update_region_index_values(self.farms[0].id, DAY + timedelta(days=5), {"ndvi": 0.8}))
+
+        cell = RegionCell.objects.get(lat_index=155, lon_index=737)
+        self.assertEqual(cell.index_means(), {"ndvi": 0.7})
+
+    def test_moved_farm_leaves_its_old_cell(self):
+        farm = self.farms[0]
+        self.rain(farm, DAY, 100)
+        farm.farm_coordinates = [[15.55, 73.85]]
+        farm.save()
+        assign_farm_region(farm)
+
+        snapshot = cell_snapshot()
+        self.assertEqual(snapshot[(155, 737)], (1, {}, {}))
+        self.assertEqual(snapshot[(155, 738)], (2, {"flood": 1}, {}))
+        self.assert_matches_rebuild()
@@ -0,0 +1,271 @@
+import math
+import logging
+from datetime import date
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from users.models import Farm
+from heatmaps.models import IndexTimeSeries
+from crop_loss_analytics.models import CropLossAnalytics
+from regions.models import FarmRegion, RegionCell
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter(
+    fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+handler.setFormatter(formatter)
+if not logger.hasHandlers():
+    logger.addHandler(handler)
+
+
+def cell_index(latitude: float, longitude: float, size: Optional[float] = None) -> Tuple[int, int]:
+    """Grid cell (lat_index, lon_index) containing a point"""
+    size = size or settings.REGION_GRID_SIZE_DEGREES
+    return math.floor(latitude / size), math.floor(longitude / size)
+
+
+def cell_bounds(lat_index: int, lon_index: int, size: Optional[float] = None) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) of a grid cell"""
+    size = size or settings.REGION_GRID_SIZE_DEGREES
+    # Rounded to drop float noise such as 15.600000000000001
+    return tuple(round(edge * size, 6) for edge in (lat_index, lon_index, lat_index + 1, lon_index + 1))
+
+
+def _index_values(values: dict) -> Dict[str, float]:
+    """Keep known index types with a value, as floats"""
+    known = dict(IndexTimeSeries.INDEX_CHOICES)
+    return {
+        index_type: float(value)
+        for index_type, value in (values or {}).items()
+        if index_type in known and value is not None and value != -1
+    }
+
+
+def _apply(cell: RegionCell, sign: int, active_kinds: Iterable[str] = (), index_values: Optional[dict] = None):
+    """Add (sign=1) or remove (sign=-1) a farm's contribution to the aggregates of a cell"""
+    active_losses = dict(cell.active_losses or {})
+    for kind in active_kinds:
+        active_losses[kind] = max(0, active_losses.get(kind, 0) + sign)
+    cell.active_losses = {kind: count for kind, count in active_losses.items() if count}
+
+    index_totals = {index_type: dict(totals) for index_type, totals in (cell.index_totals or {}).items()}
+    for index_type, value in (index_values or {}).items():
+        totals = index_totals.setdefault(index_type, {"sum": 0.0, "farms": 0})
+        totals["farms"] = max(0, totals["farms"] + sign)
+        # Values carry two decimals, rounding keeps repeated add/remove from drifting
+        totals["sum"] = round(totals["sum"] + sign * value, 4) if totals["farms"] else 0.0
+    cell.index_totals = {index_type: totals for index_type, totals in index_totals.items() if totals["farms"]}
+
+
+def _locked_cell(lat_index: int, lon_index: int) -> RegionCell:
+    cell, _ = RegionCell.objects.select_for_update().get_or_create(lat_index=lat_index, lon_index=lon_index)
+    return cell
+
+
+def assign_farm_region(farm: Farm) -> Optional[FarmRegion]:
+    """
+    Place a farm in the grid cell of its centroid, moving its contribution when
+    the boundary changed. A farm seen for the first time contributes its active
+    crop loss kinds and latest index values.
+
+    Returns:
+        FarmRegion: Membership of the farm, None when the farm has no coordinates.
+    """
+    latitude, longitude = farm.centroid
+    if latitude is None:
+        return None
+    lat_index, lon_index = cell_index(latitude, longitude)
+
+    with transaction.atomic():
+        region = FarmRegion.objects.select_for_update().select_related('cell').filter(farm_id=farm.id).first()
+        if region and (region.cell.lat_index, region.cell.lon_index) == (lat_index, lon_index):
+            return region
+
+        if region:
+            old_cell = RegionCell.objects.select_for_update().get(pk=region.cell_id)
+            old_cell.farm_count = max(0, old_cell.farm_count - 1)
+            _apply(old_cell, -1, region.active_kinds, region.index_values)
+            old_cell.save()
+        else:
+            latest = IndexTimeSeries.objects.filter(farm_id=farm.id).order_by('-date').values_list('date', flat=True).first()
+            region = FarmRegion(
+                farm_id=farm.id,
+                index_date=latest,
+                index_values=_index_values(dict(
+                    IndexTimeSeries.objects.filter(farm_id=farm.id, date=latest).values_list('index_type', 'value')
+                )) if latest else {},
+                active_kinds=sorted(
+                    CropLossAnalytics.objects.filter(farm_id=farm.id, is_active=True).values_list('kind', flat=True)
+                ),
+            )
+
+        cell = _locked_cell(lat_index, lon_index)
+        cell.farm_count += 1
+        _apply(cell, 1, region.active_kinds, region.index_values)
+        cell.save()
+
+        region.cell = cell
+        region.save()
+    return region
+
+
+def _farm_region(farm_id: int) -> Optional[FarmRegion]:
+    """Locked membership of a farm, assigning farms created before region aggregates existed"""
+    region = FarmRegion.objects.select_for_update().filter(farm_id=farm_id).first()
+    if region is None:
+        farm = Farm.objects.only('id', 'farm_coordinates').filter(pk=farm_id).first()
+        if farm is None or assign_farm_region(farm) is None:
+            return None
+        region = FarmRegion.objects.select_for_update().get(farm_id=farm_id)
+    return region
+
+
+def update_region_index_values(farm_id: int, sensed_date: date, values: dict) -> bool:
+    """
+    Replace the index values a farm contributes to its cell with those of a newer sensed day.
+
+    Args:
+        farm_id (int): Primary key of the farm.
+        sensed_date (date): Sensed day of the values.
+        values (dict): {index_type: value} as saved to IndexTimeSeries.
+
+    Returns:
+        bool: True if the cell changed, False for older sensed days or farms without a cell.
+    """
+    values = _index_values(values)
+    with transaction.atomic():
+        region = _farm_region(farm_id)
+        if region is None or (region.index_date and sensed_date < region.index_date):
+            return False
+        if region.index_date == sensed_date and region.index_values == values:
+            return False
+
+        cell = RegionCell.objects.select_for_update().get(pk=region.cell_id)
+        _apply(cell, -1, index_values=region.index_values)
+        _apply(cell, 1, index_values=values)
+        cell.save(update_fields=["index_totals", "updated_at"])
+
+        region.index_date = sensed_date
+        region.index_values = values
+        region.save(update_fields=["index_date", "index_values"])
+    return True
+
+
+def sync_region_losses(farm_ids: Iterable[int]) -> int:
+    """
+    Bring the active crop loss counts of the cells of some farms in line with
+    their active CropLossAnalytics. Only farms whose set of active kinds changed
+    touch their cell, so it is safe to call after every write.
+
+    Returns:
+        int: Number of farms whose contribution changed.
+    """
+    farm_ids = set(farm_ids)
+    if not farm_ids:
+        return 0
+
+    with transaction.atomic():
+        active = {farm_id: [] for farm_id in farm_ids}
+        for farm_id, kind in (
+            CropLossAnalytics.objects
+            .filter(farm_id__in=farm_ids, is_active=True)
+            .order_by('kind')
+            .values_list('farm_id', 'kind')
+        ):
+            active[farm_id].append(kind)
+
+        regions = {
+            region.farm_id: region
+            for region in FarmRegion.objects.select_for_update().filter(farm_id__in=farm_ids)
+        }
+        # Farms without a cell yet pick up their active kinds when assigned
+        for farm in Farm.objects.only('id', 'farm_coordinates').filter(pk__in=farm_ids - set(regions)):
+            assign_farm_region(farm)
+
+        changed = [region for farm_id, region in regions.items() if region.active_kinds != active[farm_id]]
+        if not changed:
+            return 0
+
+        cells = {
+            cell.id: cell
+            for cell in RegionCell.objects.select_for_update().filter(pk__in={region.cell_id for region in changed}).order_by('pk')
+        }
+        now = timezone.now()
+        for region in changed:
+            cell = cells[region.cell_id]
+            cell.updated_at = now
+            _apply(cell, -1, region.active_kinds)
+            region.active_kinds = active[region.farm_id]
+            _apply(cell, 1, region.active_kinds)
+
+        RegionCell.objects.bulk_update(list(cells.values()), ["active_losses", "updated_at"])
+        FarmRegion.objects.bulk_update(changed, ["active_kinds"])
+    return len(changed)
+
+
+def rebuild_region_cells(batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Recompute every cell from the farms, active scenarios and latest index values.
+    Needed after changing REGION_GRID_SIZE_DEGREES or deleting farms.
+
+    Returns:
+        dict: Number of farms placed and cells created.
+    """
+    size = settings.REGION_GRID_SIZE_DEGREES
+
+    active = {}
+    for farm_id, kind in CropLossAnalytics.objects.filter(is_active=True).order_by('kind').values_list('farm_id', 'kind'):
+        active.setdefault(farm_id, []).append(kind)
+
+    # Values of the newest sensed day of every farm, in one query
+    newest = IndexTimeSeries.objects.filter(farm_id=OuterRef('farm_id')).order_by('-date').values('date')[:1]
+    latest, latest_date = {}, {}
+    for farm_id, day, index_type, value in (
+        IndexTimeSeries.objects
+        .filter(date=Subquery(newest))
+        .values_list('farm_id', 'date', 'index_type', 'value')
+    ):
+        latest.setdefault(farm_id, {})[index_type] = value
+        latest_date[farm_id] = day
+
+    cells, regions = {}, []
+    for farm in Farm.objects.only('id', 'farm_coordinates').iterator():
+        latitude, longitude = farm.centroid
+        if latitude is None:
+            continue
+        key = cell_index(latitude, longitude, size)
+        cell = cells.setdefault(key, RegionCell(lat_index=key[0], lon_index=key[1]))
+        region = FarmRegion(
+            farm_id=farm.id,
+            index_date=latest_date.get(farm.id),
+            index_values=_index_values(latest.get(farm.id)),
+            active_kinds=active.get(farm.id, []),
+        )
+        cell.farm_count += 1
+        _apply(cell, 1, region.active_kinds, region.index_values)
+        regions.append((key, region))
+
+    with transaction.atomic():
+        FarmRegion.objects.all().delete()
+        RegionCell.objects.all().delete()
+        RegionCell.objects.bulk_create(list(cells.values()), batch_size=batch_size)
+        # bulk_create does not return primary keys on every backend, read them back
+        ids = {
+            (lat_index, lon_index): pk
+            for pk, lat_index, lon_index in RegionCell.objects.values_list('id', 'lat_index', 'lon_index')
+        }
+        for key, region in regions:
+            region.cell_id = ids[key]
+        FarmRegion.objects.bulk_create([region for _, region in regions], batch_size=batch_size)
+
+    stats = {"farms": len(regions), "cells": len(cells)}
+    logger.info(f"Region cells rebuilt: {stats}")
+    return stats
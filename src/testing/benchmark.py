@@ -0,0 +1,346 @@
+"""
+End-to-end benchmarks of the reload and read paths.
+
+Seeds benchmark farms in the configured database, then drives a running server
+over HTTP at a fixed concurrency and reports p50/p95/p99 latency and throughput
+per endpoint. Meant to run against testing/farmonaut_stub.py and LOCAL_BLOB_DIR,
+see `python manage.py benchmark --help`.
+"""
+import time
+import asyncio
+import logging
+import subprocess
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from django.contrib.auth import get_user_model
+from ninja_jwt.tokens import RefreshToken
+
+from ai_advisory.models import Advisory
+from integrations.resilience import farmanout_url
+from pipelines.models import PipelineCheckpoint
+from users.models import Farm
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter(
+    fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+handler.setFormatter(formatter)
+if not logger.hasHandlers():
+    logger.addHandler(handler)
+# One INFO line per request would drown the results
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+USERNAME_PREFIX = "benchmark-"
+FIELD_ID_PREFIX = "bench"
+INDEX_TYPE = "ndvi"
+
+RELOAD = "create_entire_profile"
+READ_SCENARIOS = ["get_heatmaps", "get_past_satellite_values", "get_weather", "get_ai_advisory"]
+SCENARIOS = [RELOAD] + READ_SCENARIOS
+
+# The field corner of the repo's fixtures, farms are spread over region cells from here
+ORIGIN = (15.678, 77.756)
+FARM_POLYGON = [(0.0, 0.0), (0.001, 0.0), (0.001, 0.001), (0.0, 0.001)]
+
+
+@dataclass
+class BenchmarkFarm:
+    """A seeded farm with an access token of its owner"""
+    field_id: str
+    token: str
+    payload: dict
+    sensed_day: Optional[str] = None
+
+
+def stub_stats(timeout: float = 5) -> Optional[dict]:
+    """
+    /_stats of the Farmonaut host under FARMANOUT_BASE_URL, None unless it is
+    testing/farmonaut_stub.py. Reloads would otherwise call the real API.
+    """
+    try:
+        response = httpx.get(farmanout_url("_stats"), timeout=timeout)
+        stats = response.json() if response.status_code == 200 else None
+    except (httpx.HTTPError, ValueError):
+        return None
+    return stats if isinstance(stats, dict) and "requests" in stats else None
+
+
+def seed_farms(count: int) -> List[BenchmarkFarm]:
+    """
+    Create `count` users with one farm each, reusing the ones of earlier runs.
+    Farms are placed 0.1 degrees apart so they fall in different region cells.
+    """
+    User = get_user_model()
+    farms = []
+    for i in range(count):
+        user, created = User.objects.get_or_create(username=f"{USERNAME_PREFIX}{i:05d}")
+        if created:
+            user.set_unusable_password()
+            user.save(update_fields=["password"])
+
+        lat, lon = ORIGIN[0] + (i // 50) * 0.1, ORIGIN[1] + (i % 50) * 0.1
+        farm, _ = Farm.objects.get_or_create(
+            user=user,
+            defaults={
+                "farm_email": f"{user.username}@example.com",
+                "farm_coordinates": [[lat + dlat, lon + dlon] for dlat, dlon in FARM_POLYGON],
+                "field_id": f"{FIELD_ID_PREFIX}{i:05d}",
+                "field_name": f"Benchmark farm {i}",
+                "field_area": 6,
+                "crop": "rice",
+                "sowing_date": date(2025, 10, 1),
+            },
+        )
+        farms.append(BenchmarkFarm(
+            field_id=farm.field_id,
+            token=str(RefreshToken.for_user(user).access_token),
+            payload={
+                "field_id": farm.field_id,
+                "farm_email": farm.farm_email,
+                "field_name": farm.field_name,
+                "field_area": float(farm.field_area),
+                "crop": farm.crop,
+                "sowing_date": farm.sowing_date.isoformat(),
+                "last_sensed_day": None,
+                "farm_coordinates": farm.farm_coordinates,
+            },
+            sensed_day=farm.last_sensed_day.strftime("%Y%m%d") if farm.last_sensed_day else None,
+        ))
+    return farms
+
+
+def reset_sensed_days(farms: List[BenchmarkFarm]) -> int:
+    """
+    Clear last_sensed_day so the next reload of each farm runs every stage, as
+    for a new sensed day. Checkpoints of earlier partial runs would resume
+    stages, so they go, and so do the advisories, which are inserted once per
+    sensed day; the other results are upserted.
+    """
+    field_ids = [farm.field_id for farm in farms]
+    PipelineCheckpoint.objects.filter(farm__field_id__in=field_ids).delete()
+    Advisory.objects.filter(farm__field_id__in=field_ids).delete()
+    return Farm.objects.filter(field_id__in=field_ids).update(last_sensed_day=None)
+
+
+def refresh_sensed_days(farms: List[BenchmarkFarm]):
+    days = dict(
+        Farm.objects
+        .filter(field_id__in=[farm.field_id for farm in farms])
+        .values_list("field_id", "last_sensed_day")
+    )
+    for farm in farms:
+        day = days.get(farm.field_id)
+        farm.sensed_day = day.strftime("%Y%m%d") if day else None
+
+
+def percentile(ordered: List[float], percent: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+@dataclass
+class ScenarioResult:
+    """Latencies in milliseconds and status codes of one scenario"""
+    name: str
+    concurrency: int
+    latencies_ms: List[float] = field(default_factory=list)
+    statuses: Dict[str, int] = field(default_factory=dict)
+    transport_errors: int = 0
+    # Reloads answered 200 with "complete": false, some stages failed
+    incomplete: int = 0
+    wall_seconds: float = 0.0
+
+    def as_dict(self) -> dict:
+        ordered = sorted(self.latencies_ms)
+        ok = sum(count for status, count in self.statuses.items() if status.startswith("2"))
+        requests = len(ordered) + self.transport_errors
+        return {
+            "concurrency": self.concurrency,
+            "requests": requests,
+            "ok": ok,
+            "errors": requests - ok,
+            "incomplete": self.incomplete,
+            "statuses": dict(sorted(self.statuses.items())),
+            "wall_seconds": round(self.wall_seconds, 3),
+            "throughput_rps": round(ok / self.wall_seconds, 2) if self.wall_seconds else 0.0,
+            "p50_ms": round(percentile(ordered, 50), 1),
+            "p95_ms": round(percentile(ordered, 95), 1),
+            "p99_ms": round(percentile(ordered, 99), 1),
+            "mean_ms": round(sum(ordered) / len(ordered), 1) if ordered else 0.0,
+            "max_ms": round(ordered[-1], 1) if ordered else 0.0,
+        }
+
+
+async def run_scenario(
+    name: str,
+    send: Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]],
+    total: int,
+    concurrency: int,
+    client: httpx.AsyncClient,
+) -> ScenarioResult:
+    """
+    Send `total` requests from `concurrency` workers. Request i is built by
+    send(client, i); a worker starts the next one as soon as its last returns.
+    """
+    result = ScenarioResult(name=name, concurrency=concurrency)
+    next_request = iter(range(total))
+
+    async def worker():
+        for i in next_request:
+            start = time.perf_counter()
+            try:
+                response = await send(client, i)
+            except httpx.TransportError as e:
+                result.transport_errors += 1
+                logger.warning(f"{name} request {i} failed: {type(e).__name__}")
+                continue
+            result.latencies_ms.append((time.perf_counter() - start) * 1000)
+            status = str(response.status_code)
+            result.statuses[status] = result.statuses.get(status, 0) + 1
+            if name == RELOAD and response.is_success and response.json().get("complete") is False:
+                result.incomplete += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.wall_seconds = time.perf_counter() - start
+    return result
+
+
+def scenario_requests(farms: List[BenchmarkFarm], reload_date: str) -> Dict[str, Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]]:
+    """{scenario: send(client, i)}, request i goes to farm i modulo the farm count"""
+
+    def pick(i: int) -> BenchmarkFarm:
+        return farms[i % len(farms)]
+
+    def auth(farm: BenchmarkFarm) -> dict:
+        return {"Authorization": f"Bearer {farm.token}"}
+
+    def reload(client, i):
+        farm = pick(i)
+        return client.post("/api/pipelines/create_entire_profile", json=farm.payload, headers=auth(farm))
+
+    def heatmaps(client, i):
+        farm = pick(i)
+        params = {"farm_id": farm.field_id, "index_type": INDEX_TYPE, "sensed_date": farm.sensed_day}
+        return client.get("/api/heatmaps/get_heatmaps", params=params, headers=auth(farm))
+
+    def past_values(client, i):
+        farm = pick(i)
+        params = {"farm_id": farm.field_id, "index_type": INDEX_TYPE}
+        return client.get("/api/heatmaps/get_past_satellite_values", params=params, headers=auth(farm))
+
+    def weather(client, i):
+        farm = pick(i)
+        params = {"field_id": farm.field_id, "current_date": reload_date}
+        return client.get("/api/weather/get_weather", params=params, headers=auth(farm))
+
+    def advisory(client, i):
+        farm = pick(i)
+        params = {"field_id": farm.field_id, "sensed_date": farm.sensed_day}
+        return client.get("/api/ai_advisory/get_ai_advisory", params=params, headers=auth(farm))
+
+    return {
+        RELOAD: reload,
+        "get_heatmaps": heatmaps,
+        "get_past_satellite_values": past_values,
+        "get_weather": weather,
+        "get_ai_advisory": advisory,
+    }
+
+
+async def run_benchmarks(
+    base_url: str,
+    farms: List[BenchmarkFarm],
+    scenarios: List[str],
+    concurrency: int,
+    requests: int,
+    timeout: float,
+    before_reads: Optional[Callable[[], Awaitable[None]]] = None,
+) -> Dict[str, ScenarioResult]:
+    """
+    Run the scenarios in order. Reload requests go once to every farm, read
+    scenarios send `requests` requests each, spread over the farms that have
+    a sensed day. `before_reads` runs after the reloads, e.g. to pick up the
+    sensed days they stored.
+    """
+    results = {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        reload_date = date.today().strftime("%Y%m%d")
+        sends = scenario_requests(farms, reload_date)
+        for name in scenarios:
+            if name != RELOAD and before_reads is not None:
+                await before_reads()
+                before_reads = None
+                # Rebuilt with the sensed days the reloads stored
+                loaded = [farm for farm in farms if farm.sensed_day]
+                if not loaded:
+                    raise ValueError("No farm has a sensed day, run the reload scenario first")
+                sends = scenario_requests(loaded, reload_date)
+
+            total = len(farms) if name == RELOAD else requests
+            logger.info(f"Running {name}: {total} requests at concurrency {concurrency}")
+            results[name] = await run_scenario(name, sends[name], total, concurrency, client)
+            summary = results[name].as_dict()
+            logger.info(
+                f"{name}: p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms, "
+                f"p99 {summary['p99_ms']} ms, {summary['throughput_rps']} req/s, {summary['errors']} errors"
+            )
+    return results
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, timeout=5,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def build_report(results: Dict[str, ScenarioResult], meta: Dict[str, Any]) -> dict:
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            **meta,
+        },
+        "scenarios": {name: result.as_dict() for name, result in results.items()},
+    }
+
+
+def compare_reports(baseline: dict, current: dict, threshold: float) -> List[dict]:
+    """
+    Per scenario p50/p95/p99 and throughput change against a baseline report.
+    A latency more than `threshold` (0.1 = 10%) above the baseline, or a
+    throughput that much below it, is flagged as a regression.
+    """
+    rows = []
+    for name, now in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+            old, new = before.get(metric, 0), now.get(metric, 0)
+            change = (new - old) / old if old else 0.0
+            worse = -change if metric == "throughput_rps" else change
+            rows.append({
+                "scenario": name,
+                "metric": metric,
+                "baseline": old,
+                "current": new,
+                "change": round(change, 3),
+                "regression": worse > threshold,
+            })
+    return rows
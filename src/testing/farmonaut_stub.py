@@ -0,0 +1,271 @@
+"""
+Local stand-in for the Farmonaut API, for load tests that must not reach production.
+
+Replays the fixtures in src/ (ai_advisory.json, presentWeather.json,
+index_values.json, field_*.json) on the endpoints the integrations call, with
+injectable latency and failures. Image URLs point back at the stub, so the
+upload stage downloads from it too.
+
+    cd src
+    python -m testing.farmonaut_stub --port 8787 --latency 0.3 --error-rate 0.02 \\
+        --endpoint askJeevnAPI:latency=4,sigma=0.6
+
+    FARMANOUT_BASE_URL=http://127.0.0.1:8787 LOCAL_BLOB_DIR=/tmp/blobs python manage.py runserver
+
+GET /_stats returns request counts per endpoint and outcome.
+"""
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import logging
+from collections import Counter
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter(
+    fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+handler.setFormatter(formatter)
+if not logger.hasHandlers():
+    logger.addHandler(handler)
+
+FIXTURE_DIR = Path(__file__).resolve().parent.parent
+
+# 1x1 transparent PNG
+PNG_PIXEL = bytes.fromhex(
+    "89504e470d0a1a0a0000000d49484452000000010000000108060000001f15c489"
+    "0000000b49444154789c6360000200000500017a5eab3f0000000049454e44ae426082"
+)
+
+
+@dataclass(frozen=True)
+class Faults:
+    """
+    Latency and failure distribution of one endpoint.
+
+    Attributes:
+        latency (float): Median response time in seconds.
+        sigma (float): Spread of the log-normal latency, 0 for a fixed latency.
+        error_rate (float): Share of requests answered with 503.
+        throttle_rate (float): Share of requests answered with 429.
+        hang_rate (float): Share of requests held for hang_seconds before answering,
+            long enough for the client to time out.
+        hang_seconds (float): How long a hung request is held.
+    """
+    latency: float = 0.2
+    sigma: float = 0.0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    hang_rate: float = 0.0
+    hang_seconds: float = 120.0
+
+    def delay(self, rng: random.Random) -> float:
+        if self.sigma <= 0:
+            return self.latency
+        return rng.lognormvariate(math.log(max(self.latency, 1e-6)), self.sigma)
+
+    def outcome(self, rng: random.Random) -> str:
+        roll = rng.random()
+        for name, rate in (("error", self.error_rate), ("throttled", self.throttle_rate), ("hung", self.hang_rate)):
+            if roll < rate:
+                return name
+            roll -= rate
+        return "ok"
+
+
+class Fixtures:
+    """Farmonaut responses rebuilt from the fixtures saved by the integrations"""
+
+    def __init__(self, directory: Path = FIXTURE_DIR):
+        self.advisory = self._load(directory / "ai_advisory.json")
+        self.weather = self._load(directory / "presentWeather.json")
+
+        index_values = self._load(directory / "index_values.json")
+        self.index_values = {
+            key: value for key, value in index_values.items()
+            if key not in ("api", "_meta")
+        }
+
+        # {sensed_day: image types}, from field_<id>_<day>.json
+        self.images: Dict[str, List[str]] = {}
+        for path in sorted(directory.glob("field_*.json")):
+            field_data = self._load(path)
+            sensed_day = field_data.get("_meta", {}).get("sensed_day") or path.stem.rsplit("_", 1)[-1]
+            self.images[sensed_day] = [key for key, url in field_data.items() if key != "_meta" and url]
+
+        self.sensed_days = sorted(set(self.images) | {index_values.get("_meta", {}).get("sensed_day", "")} - {""})
+
+    @staticmethod
+    def _load(path: Path) -> dict:
+        with open(path) as f:
+            return json.load(f)
+
+
+class FarmonautStub:
+    """
+    ASGI app answering the Farmonaut endpoints from Fixtures.
+
+    Every POST draws an outcome and a delay from the Faults of its endpoint. A
+    seeded run draws the same sequence, concurrency aside.
+    """
+
+    def __init__(self, fixtures: Fixtures, faults: Faults, endpoint_faults: Optional[Dict[str, Faults]] = None, seed: Optional[int] = None, image_bytes: int = 0):
+        self.fixtures = fixtures
+        self.faults = faults
+        self.endpoint_faults = endpoint_faults or {}
+        self.rng = random.Random(seed)
+        self.image = PNG_PIXEL + bytes(max(0, image_bytes - len(PNG_PIXEL)))
+        self.stats: Counter = Counter()
+        self.in_flight = 0
+        self.next_field_id = int(time.time() * 1000)
+        self.handlers = {
+            "getSensedDays": self.sensed_days,
+            "modifyFieldPoints": self.sensed_days,
+            "getFieldImage": self.field_image,
+            "getAllIndexValues": self.all_index_values,
+            "getPresentWeather": self.present_weather,
+            "askJeevnAPI": self.advisory,
+            "submitField": self.submit_field,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                await send({"type": f"{message['type']}.complete"})
+                if message["type"] == "lifespan.shutdown":
+                    return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        path = scope["path"].rstrip("/")
+        if scope["method"] == "GET" and path == "/_stats":
+            stats = {"in_flight": self.in_flight, "requests": {f"{endpoint} {outcome}": count for (endpoint, outcome), count in sorted(self.stats.items())}}
+            return await self._respond(send, 200, json.dumps(stats).encode())
+        if scope["method"] == "GET" and path.startswith("/images/"):
+            return await self._respond(send, 200, self.image, "image/png")
+
+        endpoint = path.lstrip("/")
+        if scope["method"] != "POST" or endpoint not in self.handlers:
+            return await self._respond(send, 404, b'{"error": "Not found"}')
+
+        try:
+            payload = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            return await self._respond(send, 400, b'{"error": "Invalid JSON"}')
+
+        faults = self.endpoint_faults.get(endpoint, self.faults)
+        outcome = faults.outcome(self.rng)
+        delay = faults.hang_seconds if outcome == "hung" else faults.delay(self.rng)
+        self.stats[(endpoint, outcome)] += 1
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(delay)
+            if outcome == "error":
+                return await self._respond(send, 503, b'{"error": "Service unavailable"}')
+            if outcome == "throttled":
+                return await self._respond(send, 429, b'{"error": "Too many requests"}')
+            status, response = self.handlers[endpoint](payload, scope)
+            return await self._respond(send, status, json.dumps(response).encode())
+        finally:
+            self.in_flight -= 1
+
+    @staticmethod
+    async def _respond(send, status: int, body: bytes, content_type: str = "application/json"):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    def sensed_days(self, payload: dict, scope: dict) -> Tuple[int, dict]:
+        return 200, {day: {} for day in self.fixtures.sensed_days}
+
+    def field_image(self, payload: dict, scope: dict) -> Tuple[int, dict]:
+        field_id = payload.get("FieldID")
+        sensed_day = payload.get("SensedDay")
+        image_type = payload.get("ImageType")
+        if image_type not in self.fixtures.images.get(sensed_day, []):
+            return 404, {"error": f"No {image_type} image for {sensed_day}"}
+        host, port = scope["server"]
+        return 200, {"url": f"http://{host}:{port}/images/{field_id}/{sensed_day}/{image_type}"}
+
+    def all_index_values(self, payload: dict, scope: dict) -> Tuple[int, dict]:
+        return 200, {
+            index_type: {day: value for day in self.fixtures.sensed_days}
+            for index_type, value in self.fixtures.index_values.items()
+        }
+
+    def present_weather(self, payload: dict, scope: dict) -> Tuple[int, dict]:
+        return 200, self.fixtures.weather
+
+    def advisory(self, payload: dict, scope: dict) -> Tuple[int, dict]:
+        return 200, {**self.fixtures.advisory, "fieldID": str(payload.get("FieldID")), "Crop": payload.get("Crop")}
+
+    def submit_field(self, payload: dict, scope: dict) -> Tuple[int, dict]:
+        self.next_field_id += 1
+        return 200, {"FieldID": str(self.next_field_id), "hUnits": 6}
+
+
+def parse_endpoint_faults(values: List[str], default: Faults) -> Dict[str, Faults]:
+    """--endpoint askJeevnAPI:latency=4,sigma=0.6 -> {"askJeevnAPI": Faults(latency=4, sigma=0.6, ...)}"""
+    endpoint_faults = {}
+    for value in values:
+        endpoint, _, options = value.partition(":")
+        overrides = {}
+        for option in filter(None, options.split(",")):
+            key, _, number = option.partition("=")
+            if key not in Faults.__dataclass_fields__:
+                raise argparse.ArgumentTypeError(f"Unknown fault option {key} in {value}")
+            overrides[key] = float(number)
+        endpoint_faults[endpoint] = replace(default, **overrides)
+    return endpoint_faults
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Farmonaut stand-in replaying the repo's fixtures")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.2, help="Median response time in seconds")
+    parser.add_argument("--sigma", type=float, default=0.0, help="Log-normal spread of the latency, 0 for fixed")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of 503 responses")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of 429 responses")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Share of requests held for --hang-seconds")
+    parser.add_argument("--hang-seconds", type=float, default=120.0)
+    parser.add_argument("--endpoint", action="append", default=[], metavar="NAME:KEY=VALUE,...", help="Per-endpoint faults, e.g. askJeevnAPI:latency=4,sigma=0.6")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--image-kb", type=int, default=0, help="Pad served images to this size")
+    parser.add_argument("--fixtures", type=Path, default=FIXTURE_DIR)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    faults = Faults(args.latency, args.sigma, args.error_rate, args.throttle_rate, args.hang_rate, args.hang_seconds)
+    app = FarmonautStub(
+        Fixtures(args.fixtures),
+        faults,
+        parse_endpoint_faults(args.endpoint, faults),
+        seed=args.seed,
+        image_bytes=args.image_kb * 1024,
+    )
+    logger.info(f"Serving Farmonaut fixtures for sensed days {app.fixtures.sensed_days} on http://{args.host}:{args.port}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
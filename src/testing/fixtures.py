@@ -0,0 +1,67 @@
+import json
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from users.models import Farm, User
+from heatmaps.models import IndexTimeSeries
+from weather.models import WeatherPrediction
+
+# Sensed day the app tests build their histories around
+DAY = date(2025, 7, 1)
+
+
+def make_farm(name: str = "field", latitude: float = 15.55, longitude: float = 73.75) -> Farm:
+    """Farm with its own user, a small triangle boundary at (latitude, longitude) and rice sown 60 days before DAY"""
+    return Farm.objects.create(
+        user=User.objects.create(username=name),
+        farm_email=f"{name}@example.com",
+        farm_coordinates=[[latitude, longitude], [latitude + 0.01, longitude], [latitude + 0.01, longitude + 0.01]],
+        field_id=f"{name}_id",
+        field_name=name,
+        field_area=1,
+        crop="rice",
+        sowing_date=DAY - timedelta(days=60),
+    )
+
+
+def weather_visit(farm: Farm, day: date, rain: float, reloaded: Optional[date] = None, temp_day: float = 28) -> WeatherPrediction:
+    """Row for `day` of a forecast batch reloaded on `reloaded`, the current day row when that is `day` itself"""
+    reloaded = reloaded or day
+    return WeatherPrediction.objects.create(
+        farm=farm,
+        date_of_reload=timezone.make_aware(datetime.combine(reloaded, time(6))),
+        date=day,
+        is_current=reloaded == day,
+        summary="", description="", main="Rain", icon="10d",
+        temp_day=temp_day, temp_min=24, temp_max=30, temp_morn=25, temp_eve=27, temp_night=25,
+        feels_like_day=30, feels_like_morn=26, feels_like_eve=28, feels_like_night=26,
+        humidity=90, pressure=1000, dew_point=24, uvi=3, wind_speed=5, wind_deg=200,
+        clouds=90, pop=1, rain=rain,
+        sunrise=0, sunset=0, moonrise=0, moonset=0, moon_phase=0.5,
+    )
+
+
+def index_visit(farm: Farm, day: date, ndmi: float, reloaded: Optional[date] = None) -> IndexTimeSeries:
+    """NDMI value of a satellite pass sensed on `day` and stored by the reload on `reloaded`, by default `day`"""
+    visit = IndexTimeSeries.objects.create(farm=farm, index_type="ndmi", date=day, value=ndmi)
+    visit.created_at = timezone.make_aware(datetime.combine(reloaded or day, time(6)))
+    IndexTimeSeries.objects.filter(pk=visit.pk).update(created_at=visit.created_at)
+    return visit
+
+
+def advisory_response(sensed_day: date = DAY, pest_levels: Optional[List[str]] = None, **fields) -> dict:
+    """
+    askJeevnAPI response from the ai_advisory.json fixture, for `sensed_day`.
+
+    pest_levels replaces the fixture's potential pests with one pest per given
+    probability, named "Pest 0", "Pest 1", ...
+    """
+    with open(settings.BASE_DIR / "ai_advisory.json") as f:
+        response = json.load(f)
+    if pest_levels is not None:
+        pests = [{"pest_name": f"Pest {n}", "probability": level} for n, level in enumerate(pest_levels)]
+        response["advisory"] = {**response["advisory"], "Pest and Disease": {"potential_pests": pests}}
+    return {**response, "SensedDay": sensed_day.strftime("%Y%m%d"), **fields}
@@ -0,0 +1,106 @@
+import json
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from testing.benchmark import (
+    RELOAD,
+    SCENARIOS,
+    build_report,
+    compare_reports,
+    refresh_sensed_days,
+    reset_sensed_days,
+    run_benchmarks,
+    seed_farms,
+    stub_stats,
+)
+from integrations.resilience import farmanout_url
+
+class Command(BaseCommand):
+    help = "Benchmarks the reload and read endpoints of a running server and reports p50/p95/p99 latency and throughput"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base_url', type=str, default="http://127.0.0.1:8000")
+        parser.add_argument('--farms', type=int, default=20, help="Seeded farms, each reloaded once by the reload scenario")
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--requests', type=int, default=200, help="Requests per read scenario")
+        parser.add_argument('--scenarios', type=str, default=",".join(SCENARIOS), help="Comma separated subset of " + ", ".join(SCENARIOS))
+        parser.add_argument('--full_reloads', action='store_true', help="Clear last_sensed_day first so every reload runs all stages")
+        parser.add_argument('--timeout', type=float, default=300)
+        parser.add_argument('--output', type=str, default=None, help="Write the report as JSON")
+        parser.add_argument('--compare', type=str, default=None, help="Baseline report to compare against")
+        parser.add_argument('--threshold', type=float, default=0.1, help="Relative change counted as a regression")
+        parser.add_argument('--allow_remote', '--allow-remote', action='store_true', help="Run even if FARMANOUT_BASE_URL is not the local stand-in")
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options['scenarios'].split(",") if name.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios {sorted(unknown)}, expected a subset of {SCENARIOS}")
+
+        # Seeds users and farms and drives every reload through the upstream
+        if not settings.DEBUG:
+            raise CommandError("Refusing to run with DEBUG off, the benchmark writes users and farms to the configured database")
+        if not options['allow_remote'] and stub_stats() is None:
+            raise CommandError(
+                f"{farmanout_url('_stats')} did not answer like testing/farmonaut_stub.py, reloads would call the real "
+                "Farmonaut API. Point FARMANOUT_BASE_URL at the stand-in or pass --allow_remote"
+            )
+
+        farms = seed_farms(options['farms'])
+        if options['full_reloads']:
+            reset_sensed_days(farms)
+
+        async def before_reads():
+            await sync_to_async(refresh_sensed_days)(farms)
+            missing = sum(farm.sensed_day is None for farm in farms)
+            if missing:
+                self.stderr.write(f"{missing} farms have no sensed day yet, the read scenarios skip them")
+
+        try:
+            results = asyncio.run(run_benchmarks(
+                base_url=options['base_url'],
+                farms=farms,
+                scenarios=scenarios,
+                concurrency=options['concurrency'],
+                requests=options['requests'],
+                timeout=options['timeout'],
+                before_reads=before_reads,
+            ))
+        except ValueError as e:
+            raise CommandError(str(e))
+        report = build_report(results, {
+            "base_url": options['base_url'],
+            "farms": len(farms),
+            "concurrency": options['concurrency'],
+            "requests": options['requests'],
+            "full_reloads": options['full_reloads'] and RELOAD in scenarios,
+        })
+
+        self.stdout.write(f"{'scenario':<28}{'req':>6}{'err':>6}{'part':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}")
+        for name, row in report["scenarios"].items():
+            self.stdout.write(
+                f"{name:<28}{row['requests']:>6}{row['errors']:>6}{row['incomplete']:>6}{row['p50_ms']:>10}"
+                f"{row['p95_ms']:>10}{row['p99_ms']:>10}{row['throughput_rps']:>9}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=4)
+            self.stdout.write(f"Report written to {options['output']}")
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            rows = compare_reports(baseline, report, options['threshold'])
+            for row in rows:
+                flag = "REGRESSION" if row['regression'] else ""
+                self.stdout.write(
+                    f"{row['scenario']:<28}{row['metric']:<16}{row['baseline']:>10} -> {row['current']:>10}"
+                    f"{row['change']:>+9.1%} {flag}"
+                )
+            regressions = [row for row in rows if row['regression']]
+            if regressions:
+                raise CommandError(f"{len(regressions)} metrics regressed more than {options['threshold']:.0%} against {options['compare']}")
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from testing.trace_report import critical_path_totals, load_traces, slowest_traces, with_exclusive_time
+from utils.tracing import critical_path
+
+
+def _attributes(item: dict) -> str:
+    return " ".join(f"{key}={value}" for key, value in item.get("attributes", {}).items())
+
+
+class Command(BaseCommand):
+    help = "Prints the slowest traced reloads with their critical path, from a TRACE_FILE or trace_collector output"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', type=str, default="traces.jsonl")
+        parser.add_argument('--slowest', type=int, default=5, help="Traces to print the critical path of")
+        parser.add_argument('--root', type=str, default="reload", help="Only traces whose root span has this name, empty for all")
+
+    def handle(self, *args, **options):
+        try:
+            traces = load_traces(options['file'])
+        except FileNotFoundError:
+            raise CommandError(f"No trace file at {options['file']}, set TRACE_EXPORT=file and TRACE_FILE")
+
+        slowest = slowest_traces(traces, options['slowest'], options['root'] or None)
+        if not slowest:
+            raise CommandError(f"No traces in {options['file']}")
+
+        for root, spans in slowest:
+            self.stdout.write(f"\ntrace {root['trace_id']}  {root['duration_ms']:.0f} ms  {len(spans)} spans  {_attributes(root)}")
+            self.stdout.write(f"  {'start ms':>9}{'ms':>9}{'self ms':>9}  span")
+            for item in with_exclusive_time(critical_path(spans)):
+                offset = (item['start_ns'] - root['start_ns']) / 1e6
+                flag = " ERROR" if item['status'] == "error" else ""
+                self.stdout.write(
+                    f"  {offset:>9.0f}{item['duration_ms']:>9.0f}{item['exclusive_ms']:>9.0f}  "
+                    f"{'  ' * item['depth']}{item['name']} {_attributes(item)}".rstrip() + flag
+                )
+
+        matching = [spans for root, spans in slowest_traces(traces, len(traces), options['root'] or None)]
+        self.stdout.write(f"\nCritical path time by span over {len(matching)} traces")
+        for name, ms, share in critical_path_totals(matching)[:15]:
+            self.stdout.write(f"  {name:<40}{ms:>12.0f} ms{share:>8.1%}")
@@ -4,7 +4,7 @@ import logging
 from ninja import Router
 from ninja.errors import HttpError
 from ninja.security import django_auth
-from ninja_jwt.authentication import JWTAuth
+from ninja_jwt.authentication import AsyncJWTAuth
 
 from dotenv import load_dotenv
 
@@ -18,7 +18,7 @@ from heatmaps.models import Heatmap, IndexTimeSeries
 from ai_advisory.models import Advisory
 from ai_advisory.utils import save_ai_adviosry_from_response
 from weather.models import WeatherPrediction
-from pipelines.new_profile_script import (
+from pipelines.engine import (
     process_ai_advisory, 
     process_heatmaps, 
     process_index_values, 
@@ -41,7 +41,7 @@ if not logger.hasHandlers():
     logger.addHandler(handler)
 
 #endpoint to check each function individually
-@testing_router.post("/debug_individual_calls", auth=JWTAuth())
+@testing_router.post("/debug_individual_calls", auth=AsyncJWTAuth())
 async def debug_individual_calls(request, payload: FarmResponseSchema):
     """Test each API call individually to see which one fails"""
     field_id = str(payload.field_id)
@@ -146,7 +146,7 @@ async def debug_individual_calls(request, payload: FarmResponseSchema):
 
 
 # Also add this simpler test for the AI advisory specifically
-@testing_router.post("/debug_ai_advisory_only", auth=JWTAuth())
+@testing_router.post("/debug_ai_advisory_only", auth=AsyncJWTAuth())
 async def debug_ai_advisory_only(request, payload: FarmResponseSchema):
     """Test ONLY the AI advisory call"""
     field_id = str(payload.field_id)
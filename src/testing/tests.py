@@ -0,0 +1,382 @@
+import json
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import httpx
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, override_settings
+
+from testing.benchmark import ScenarioResult, build_report, compare_reports, percentile, stub_stats
+from testing.farmonaut_stub import FarmonautStub, Faults, Fixtures, parse_endpoint_faults
+from testing.trace_report import critical_path_totals, slowest_traces, with_exclusive_time
+from utils.az_upload import save_local_blob
+from utils.metrics import HTTP_REQUEST_SECONDS, Counter, Histogram, Registry
+from utils.tracing import STATUS_ERROR, critical_path, from_otlp, span, start_trace, to_otlp, traceparent
+
+
+def make_span(name: str, parent: str, start_ms: float, end_ms: float, trace_id: str = "t1") -> dict:
+    return {
+        "trace_id": trace_id,
+        "span_id": name,
+        "parent_id": parent,
+        "name": name,
+        "start_ns": int(start_ms * 1e6),
+        "end_ns": int(end_ms * 1e6),
+        "duration_ms": end_ms - start_ms,
+        "status": "ok",
+        "attributes": {},
+    }
+
+
+def reload_spans(trace_id: str = "t1", upload_ms: float = 670) -> list:
+    """A reload where the image upload, started after the fetch, ends last"""
+    return [
+        make_span("reload", None, 0, 1000, trace_id),
+        make_span("index_values", "reload", 0, 200, trace_id),
+        make_span("fetch_images", "reload", 0, 300, trace_id),
+        make_span("ai_advisory", "reload", 0, 700, trace_id),
+        make_span("upload_images", "reload", 310, 310 + upload_ms, trace_id),
+        make_span("blob.upload", "upload_images", 320, 300 + upload_ms, trace_id),
+    ]
+
+
+class CriticalPathTests(SimpleTestCase):
+
+    def test_follows_the_spans_the_root_waited_on(self):
+        path = critical_path(reload_spans())
+
+        self.assertEqual(
+            [(item["name"], item["depth"]) for item in path],
+            [("reload", 0), ("fetch_images", 1), ("upload_images", 1), ("blob.upload", 2)],
+        )
+
+    def test_overlapping_siblings_are_off_the_path(self):
+        # Shortening the advisory, which overlaps the upload, would not speed the reload up
+        names = [item["name"] for item in critical_path(reload_spans())]
+        self.assertNotIn("ai_advisory", names)
+        self.assertNotIn("index_values", names)
+
+    def test_exclusive_time(self):
+        exclusive = {item["name"]: item["exclusive_ms"] for item in with_exclusive_time(critical_path(reload_spans()))}
+
+        self.assertEqual(exclusive, {"reload": 30, "fetch_images": 300, "upload_images": 20, "blob.upload": 650})
+
+    def test_totals_and_slowest_over_several_traces(self):
+        traces = {"t1": reload_spans("t1"), "t2": reload_spans("t2", upload_ms=300)}
+
+        self.assertEqual([root["trace_id"] for root, _ in slowest_traces(traces, 1)], ["t1"])
+        totals = {name: ms for name, ms, _ in critical_path_totals(list(traces.values()))}
+        # With the shorter upload of t2 the advisory ends last and becomes its critical path
+        self.assertEqual(totals["blob.upload"], 650)
+        self.assertEqual(totals["ai_advisory"], 700)
+        self.assertAlmostEqual(sum(share for _, _, share in critical_path_totals(list(traces.values()))), 1.0)
+
+
+class SpanTests(SimpleTestCase):
+
+    def setUp(self):
+        self.exported = []
+        for patcher in (
+            mock.patch("utils.tracing.TRACE_EXPORT", "file"),
+            mock.patch("utils.tracing.TRACE_SAMPLE_RATE", 1.0),
+            mock.patch("utils.tracing._export", self.exported.append),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_spans_nest_across_tasks(self):
+        async def stage(name: str):
+            with span(f"stage.{name}"):
+                with span("upstream.call") as call:
+                    call.set(header=traceparent())
+                    await asyncio.sleep(0)
+
+        async def run():
+            with start_trace("reload", field_id="f1") as root:
+                await asyncio.gather(stage("weather"), stage("index_values"))
+            return root
+
+        root = asyncio.run(run())
+
+        spans = {item.span_id: item for item in self.exported[0].spans}
+        self.assertEqual({item.trace_id for item in spans.values()}, {root.trace_id})
+        calls = [item for item in spans.values() if item.name == "upstream.call"]
+        self.assertEqual(len(calls), 2)
+        for call in calls:
+            self.assertEqual(spans[call.parent_id].parent_id, root.span_id)
+            self.assertEqual(call.attributes["header"], f"00-{root.trace_id}-{call.span_id}-01")
+
+    def test_error_status_and_otlp_round_trip(self):
+        with self.assertRaises(ValueError):
+            with start_trace("reload"):
+                with span("db.save", rows=3):
+                    raise ValueError("constraint failed")
+
+        spans = self.exported[0].spans
+        saved = from_otlp(to_otlp(spans))
+        self.assertEqual([item.as_dict() for item in spans], saved)
+        save = next(item for item in saved if item["name"] == "db.save")
+        self.assertEqual(save["status"], STATUS_ERROR)
+        self.assertEqual(save["attributes"], {"rows": 3, "error": "ValueError: constraint failed"})
+
+    def test_spans_outside_a_trace_are_noops(self):
+        with span("orphan") as orphan:
+            orphan.set(ignored=True)
+        self.assertIsNone(traceparent())
+        self.assertEqual(self.exported, [])
+
+
+async def call_stub(app: FarmonautStub, path: str, payload: dict = None, method: str = "POST"):
+    """Send one request through the ASGI app, returns (status, body)"""
+    body = json.dumps(payload or {}).encode()
+    received = iter([{"type": "http.request", "body": body, "more_body": False}])
+    sent = []
+
+    async def receive():
+        return next(received)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "server": ("127.0.0.1", 8787)}
+    await app(scope, receive, send)
+    return sent[0]["status"], sent[1]["body"]
+
+
+class FarmonautStubTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.fixtures = Fixtures()
+
+    def stub(self, seed: int, **endpoint_faults) -> FarmonautStub:
+        faults = Faults(latency=0, error_rate=0.3, throttle_rate=0.2)
+        overrides = [f"{endpoint}:{options}" for endpoint, options in endpoint_faults.items()]
+        return FarmonautStub(self.fixtures, faults, parse_endpoint_faults(overrides, faults), seed=seed)
+
+    async def statuses(self, app: FarmonautStub, endpoint: str, count: int = 30) -> list:
+        return [(await call_stub(app, f"/{endpoint}", {"FieldID": "1"}))[0] for _ in range(count)]
+
+    async def test_seeded_runs_repeat_the_same_faults(self):
+        first = await self.statuses(self.stub(seed=7), "getPresentWeather")
+        second = await self.statuses(self.stub(seed=7), "getPresentWeather")
+
+        self.assertEqual(first, second)
+        self.assertEqual(set(first), {200, 429, 503})
+        self.assertNotEqual(first, await self.statuses(self.stub(seed=8), "getPresentWeather"))
+
+    async def test_endpoint_faults_override_the_default(self):
+        app = self.stub(seed=7, askJeevnAPI="error_rate=1,throttle_rate=0")
+
+        self.assertEqual(set(await self.statuses(app, "askJeevnAPI", 5)), {503})
+
+        status, body = await call_stub(app, "/_stats", method="GET")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["requests"], {"askJeevnAPI error": 5})
+
+    def test_unknown_fault_option_is_rejected(self):
+        with self.assertRaisesRegex(argparse.ArgumentTypeError, "latncy"):
+            parse_endpoint_faults(["askJeevnAPI:latncy=4"], Faults())
+
+    async def test_success_replays_the_fixtures(self):
+        app = FarmonautStub(self.fixtures, Faults(latency=0))
+
+        status, body = await call_stub(app, "/getPresentWeather")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body), self.fixtures.weather)
+
+
+class LocalBlobTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+
+    def test_bytes_are_written_in_blob_layout(self):
+        result = save_local_blob(str(self.root), "farm-images", "f1/20251029/ndvi.png", b"png")
+
+        target = self.root / "farm-images" / "f1" / "20251029" / "ndvi.png"
+        self.assertEqual(result, {"success": True, "url": target.resolve().as_uri(), "error": None})
+        self.assertEqual(target.read_bytes(), b"png")
+
+    def test_file_is_copied(self):
+        source = self.root / "source.png"
+        source.write_bytes(b"image")
+
+        result = save_local_blob(str(self.root), "farm-images", "f1/20251029/savi.png", str(source))
+
+        self.assertTrue(result["success"])
+        self.assertEqual((self.root / "farm-images" / "f1" / "20251029" / "savi.png").read_bytes(), b"image")
+
+    def test_missing_file_is_reported(self):
+        result = save_local_blob(str(self.root), "farm-images", "f1/20251029/ndvi.png", str(self.root / "missing.png"))
+
+        self.assertFalse(result["success"])
+        self.assertIn("File not found", result["error"])
+
+
+class BenchmarkReportTests(SimpleTestCase):
+
+    def test_nearest_rank_percentile(self):
+        ordered = [float(n) for n in range(1, 101)]
+
+        self.assertEqual([percentile(ordered, p) for p in (50, 95, 99, 100)], [50, 95, 99, 100])
+        self.assertEqual(percentile([7.0], 99), 7)
+        self.assertEqual(percentile([], 50), 0)
+
+    def test_report_per_scenario(self):
+        result = ScenarioResult(
+            name="get_weather", concurrency=2, latencies_ms=[30.0, 10.0, 20.0, 40.0],
+            statuses={"200": 3, "500": 1}, transport_errors=1, wall_seconds=2.0,
+        )
+
+        with mock.patch("testing.benchmark.git_revision", return_value="abc1234"):
+            report = build_report({"get_weather": result}, {"farms": 2})
+
+        self.assertEqual((report["meta"]["revision"], report["meta"]["farms"]), ("abc1234", 2))
+        row = report["scenarios"]["get_weather"]
+        self.assertEqual((row["requests"], row["ok"], row["errors"]), (5, 3, 2))
+        self.assertEqual((row["p50_ms"], row["p99_ms"], row["mean_ms"], row["max_ms"]), (20, 40, 25, 40))
+        self.assertEqual(row["throughput_rps"], 1.5)
+
+    def test_regressions_against_a_baseline(self):
+        baseline = {"scenarios": {
+            "get_weather": {"p50_ms": 10, "p95_ms": 20, "p99_ms": 40, "throughput_rps": 100},
+            "get_heatmaps": {"p50_ms": 10, "p95_ms": 20, "p99_ms": 40, "throughput_rps": 100},
+        }}
+        current = {"scenarios": {
+            "get_weather": {"p50_ms": 10.5, "p95_ms": 30, "p99_ms": 40, "throughput_rps": 85},
+            "get_ai_advisory": {"p50_ms": 50, "p95_ms": 60, "p99_ms": 70, "throughput_rps": 10},
+        }}
+
+        rows = compare_reports(baseline, current, threshold=0.1)
+
+        # Scenarios missing from either report are skipped
+        self.assertEqual({row["scenario"] for row in rows}, {"get_weather"})
+        self.assertEqual(
+            {row["metric"]: (row["change"], row["regression"]) for row in rows},
+            {"p50_ms": (0.05, False), "p95_ms": (0.5, True), "p99_ms": (0.0, False), "throughput_rps": (-0.15, True)},
+        )
+
+
+class BenchmarkCommandTests(SimpleTestCase):
+    """The command refuses to seed farms or reload against anything but a local setup"""
+
+    @override_settings(DEBUG=False)
+    def test_refuses_with_debug_off(self):
+        with self.assertRaisesRegex(CommandError, "DEBUG off"):
+            call_command("benchmark")
+
+    @override_settings(DEBUG=True)
+    def test_refuses_without_the_stand_in(self):
+        with mock.patch("testing.management.commands.benchmark.stub_stats", return_value=None):
+            with self.assertRaisesRegex(CommandError, "--allow_remote"):
+                call_command("benchmark")
+
+    def test_stand_in_check_reads_its_stats(self):
+        with mock.patch("testing.benchmark.httpx.get", return_value=httpx.Response(200, json={"requests": {}})) as get:
+            self.assertEqual(stub_stats(), {"requests": {}})
+        self.assertTrue(get.call_args.args[0].endswith("/_stats"))
+
+        with mock.patch("testing.benchmark.httpx.get", return_value=httpx.Response(404, text="Not found")):
+            self.assertIsNone(stub_stats())
+        with mock.patch("testing.benchmark.httpx.get", side_effect=httpx.ConnectError("refused")):
+            self.assertIsNone(stub_stats())
+
+
+def histogram_count(method: str, route: str, status: int) -> int:
+    counts, _ = HTTP_REQUEST_SECONDS.series.get((method, route, str(status)), ([0], [0.0]))
+    return sum(counts)
+
+
+class RegistryTests(SimpleTestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_histogram_buckets_are_cumulative(self):
+        latency = self.registry.register(Histogram("t_seconds", "Latency", ("route",), buckets=(0.1, 1)))
+        for value in (0.05, 0.1, 0.5, 5):
+            latency.observe(value, route="/a")
+
+        self.assertEqual(self.registry.render().splitlines(), [
+            "# HELP t_seconds Latency",
+            "# TYPE t_seconds histogram",
+            't_seconds_bucket{route="/a",le="0.1"} 2',
+            't_seconds_bucket{route="/a",le="1"} 3',
+            't_seconds_bucket{route="/a",le="+Inf"} 4',
+            't_seconds_sum{route="/a"} 5.65',
+            't_seconds_count{route="/a"} 4',
+        ])
+
+    def test_label_values_and_help_are_escaped(self):
+        requests = self.registry.register(Counter("t_total", 'Requests "by" path\\n', ("path",)))
+        requests.inc(path='a"b\\c\nd')
+
+        lines = self.registry.render().splitlines()
+
+        # Quotes are only escaped in label values
+        self.assertEqual(lines[0], '# HELP t_total Requests "by" path\\\\n')
+        self.assertEqual(lines[2], 't_total{path="a\\"b\\\\c\\nd"} 1')
+
+    def test_failing_collector_does_not_break_the_scrape(self):
+        self.registry.register(Counter("t_total", "Requests")).inc()
+
+        def broken():
+            raise RuntimeError("state unavailable")
+            yield
+
+        self.registry.register_collector("broken", broken)
+        self.registry.register_collector("breakers", lambda: [("t_state", "gauge", "State", ("endpoint",), [(("x",), 1)])])
+
+        with self.assertLogs("utils.metrics", "ERROR"):
+            lines = self.registry.render().splitlines()
+
+        self.assertIn("t_total 1", lines)
+        self.assertIn('t_state{endpoint="x"} 1', lines)
+
+    def test_duplicate_names_are_rejected(self):
+        self.registry.register(Counter("t_total", "Requests"))
+        with self.assertRaises(ValueError):
+            self.registry.register(Counter("t_total", "Again"))
+
+
+class MetricsEndpointTests(SimpleTestCase):
+
+    def get(self, **headers):
+        return self.client.get("/metrics", HTTP_HOST="localhost", **headers)
+
+    @override_settings(METRICS_TOKEN="secret", DEBUG=False)
+    def test_token_is_required_when_set(self):
+        self.assertEqual(self.get().status_code, 401)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION="Bearer wrong").status_code, 401)
+
+        response = self.get(HTTP_AUTHORIZATION="Bearer secret")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn(b"# TYPE ak_http_request_duration_seconds histogram", response.content)
+
+    @override_settings(METRICS_TOKEN=None, DEBUG=False)
+    def test_closed_without_token_outside_debug(self):
+        self.assertEqual(self.get().status_code, 403)
+
+    @override_settings(METRICS_TOKEN=None, DEBUG=True)
+    def test_open_without_token_under_debug(self):
+        self.assertEqual(self.get().status_code, 200)
+
+    @override_settings(METRICS_TOKEN=None, DEBUG=True)
+    def test_middleware_records_requests_by_route(self):
+        before = histogram_count("GET", "/metrics", 200), histogram_count("GET", "unmatched", 404)
+
+        self.get()
+        self.client.get("/no/such/page", HTTP_HOST="localhost")
+
+        self.assertEqual((histogram_count("GET", "/metrics", 200), histogram_count("GET", "unmatched", 404)), (before[0] + 1, before[1] + 1))
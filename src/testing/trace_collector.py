@@ -0,0 +1,106 @@
+"""
+Local stand-in for an OTLP/HTTP trace collector.
+
+Accepts the JSON encoding of OTLP on POST /v1/traces, the format utils.tracing
+sends with TRACE_EXPORT=otlp, and appends the spans to a JSON lines file that
+`python manage.py trace_report` reads, the same format as TRACE_EXPORT=file.
+
+    cd src
+    python -m testing.trace_collector --port 4318 --output /tmp/traces.jsonl
+
+    TRACE_EXPORT=otlp TRACE_OTLP_ENDPOINT=http://127.0.0.1:4318/v1/traces python manage.py runserver
+
+GET /_stats returns the number of traces and spans received.
+"""
+import json
+import argparse
+import logging
+from pathlib import Path
+
+from utils.tracing import from_otlp
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter(
+    fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+handler.setFormatter(formatter)
+if not logger.hasHandlers():
+    logger.addHandler(handler)
+
+
+class TraceCollector:
+    """ASGI app writing received spans to a JSON lines file"""
+
+    def __init__(self, output: Path):
+        self.output = output
+        self.traces = set()
+        self.spans = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                await send({"type": f"{message['type']}.complete"})
+                if message["type"] == "lifespan.shutdown":
+                    return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        path = scope["path"].rstrip("/")
+        if scope["method"] == "GET" and path == "/_stats":
+            stats = {"traces": len(self.traces), "spans": self.spans, "output": str(self.output)}
+            return await self._respond(send, 200, json.dumps(stats).encode())
+        if scope["method"] != "POST" or path != "/v1/traces":
+            return await self._respond(send, 404, b'{"error": "Not found"}')
+
+        content_type = dict(scope["headers"]).get(b"content-type", b"")
+        if b"json" not in content_type:
+            # The protobuf encoding would need the OTLP protos, utils.tracing only sends JSON
+            return await self._respond(send, 415, b'{"error": "Only application/json is supported"}')
+
+        try:
+            spans = from_otlp(json.loads(body or b"{}"))
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+            return await self._respond(send, 400, json.dumps({"error": f"Invalid OTLP body: {e}"}).encode())
+
+        with open(self.output, "a") as f:
+            for item in spans:
+                f.write(json.dumps(item) + "\n")
+        self.traces.update(item["trace_id"] for item in spans)
+        self.spans += len(spans)
+        return await self._respond(send, 200, b"{}")
+
+    @staticmethod
+    async def _respond(send, status: int, body: bytes):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OTLP/HTTP JSON trace collector writing spans to a file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4318)
+    parser.add_argument("--output", type=Path, default=Path("traces.jsonl"))
+    args = parser.parse_args()
+
+    import uvicorn
+
+    logger.info(f"Collecting traces on http://{args.host}:{args.port}/v1/traces into {args.output}")
+    uvicorn.run(TraceCollector(args.output), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Reads the spans written by utils.tracing or testing/trace_collector.py and
+reports the slowest reloads with their critical path, see
+`python manage.py trace_report --help`.
+"""
+import json
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from utils.tracing import critical_path
+
+
+def load_traces(path: str) -> Dict[str, List[dict]]:
+    """{trace_id: spans} of a JSON lines file, blank and malformed lines skipped"""
+    traces: Dict[str, List[dict]] = defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            traces[item["trace_id"]].append(item)
+    return dict(traces)
+
+
+def root_of(spans: List[dict]) -> dict:
+    roots = [item for item in spans if item["parent_id"] is None]
+    return roots[0] if roots else min(spans, key=lambda item: item["start_ns"])
+
+
+def slowest_traces(traces: Dict[str, List[dict]], limit: int, name: Optional[str] = None) -> List[Tuple[dict, List[dict]]]:
+    """(root, spans) of the `limit` longest traces, optionally only those whose root is `name`"""
+    rooted = [(root_of(spans), spans) for spans in traces.values()]
+    if name:
+        rooted = [(root, spans) for root, spans in rooted if root["name"] == name]
+    return sorted(rooted, key=lambda pair: -pair[0]["duration_ms"])[:limit]
+
+
+def with_exclusive_time(path: List[dict]) -> List[dict]:
+    """
+    Add "exclusive_ms" to each span of a critical path: its duration minus that
+    of the path spans directly under it, i.e. the time the path spent in it.
+    """
+    nested = defaultdict(float)
+    for item in path:
+        nested[item["parent_id"]] += item["duration_ms"]
+    return [{**item, "exclusive_ms": max(0.0, item["duration_ms"] - nested[item["span_id"]])} for item in path]
+
+
+def critical_path_totals(traces: List[List[dict]]) -> List[Tuple[str, float, float]]:
+    """
+    (span name, total exclusive ms on the critical path, share of all critical
+    path time) over several traces, largest first. Names which dominate are
+    where a faster implementation would shorten reloads.
+    """
+    totals: Dict[str, float] = defaultdict(float)
+    for spans in traces:
+        for item in with_exclusive_time(critical_path(spans)):
+            totals[item["name"]] += item["exclusive_ms"]
+    overall = sum(totals.values()) or 1.0
+    return sorted(((name, ms, ms / overall) for name, ms in totals.items()), key=lambda row: -row[1])
@@ -14,6 +14,7 @@ from integrations.get_sensed_days import get_sensed_days
 from users.models import User, Farm
 from users.user_schemas import CreateUser, UserSchema
 from users.farm_schemas import FarmCreateSchema, FarmResponseSchema
+from regions.utils import assign_farm_region
 import logging
 
 logger = logging.getLogger(__name__)
@@ -144,6 +145,12 @@ def create_new_farm(request, payload: FarmCreateSchema):
             logger.error(f"Database error: {str(e)}", exc_info=True)
             raise HttpError(400, f"Unable to add farm to the database: {str(e)}")
         
+        # Region aggregates are derived data, the rebuild command repairs a failed assignment
+        try:
+            assign_farm_region(farm)
+        except Exception as e:
+            logger.error(f"Region assignment failed for farm {farm.id}: {str(e)}", exc_info=True)
+        
         # Step 5: Return response
         logger.info("Preparing response...")
         return FarmResponseSchema(
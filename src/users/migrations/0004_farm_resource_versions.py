@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 22:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_alter_farm_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farm',
+            name='advisory_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='farm',
+            name='crop_loss_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='farm',
+            name='heatmaps_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='farm',
+            name='index_values_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='farm',
+            name='weather_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
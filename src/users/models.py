@@ -25,6 +25,21 @@ class Farm(models.Model):
     
     last_sensed_day = models.DateField(null=True)
     
+    # Last write per resource, used as the version for ETag / Last-Modified on reads
+    heatmaps_updated_at = models.DateTimeField(null=True, blank=True)
+    index_values_updated_at = models.DateTimeField(null=True, blank=True)
+    advisory_updated_at = models.DateTimeField(null=True, blank=True)
+    weather_updated_at = models.DateTimeField(null=True, blank=True)
+    crop_loss_updated_at = models.DateTimeField(null=True, blank=True)
+    
+    RESOURCE_VERSION_FIELDS = {
+        "heatmaps": "heatmaps_updated_at",
+        "index_values": "index_values_updated_at",
+        "advisory": "advisory_updated_at",
+        "weather": "weather_updated_at",
+        "crop_loss": "crop_loss_updated_at",
+    }
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -33,4 +48,19 @@ class Farm(models.Model):
         ordering = ['-created_at']
     
     def __str__(self):
-        return f"{self.field_name} - {self.user.username}"
\ No newline at end of file
+        return f"{self.field_name} - {self.user.username}"
+    
+    def get_resource_version(self, resource: str):
+        """Last write time of a resource, falling back to the farm's own update time"""
+        return getattr(self, self.RESOURCE_VERSION_FIELDS[resource]) or self.updated_at
+    
+    @property
+    def centroid(self):
+        """Mean (latitude, longitude) of the farm boundary, (None, None) when unknown"""
+        points = [point for point in self.farm_coordinates or [] if isinstance(point, (list, tuple)) and len(point) >= 2]
+        if not points:
+            return None, None
+        return (
+            sum(float(point[0]) for point in points) / len(points),
+            sum(float(point[1]) for point in points) / len(points),
+        )
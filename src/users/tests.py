@@ -1,3 +1,93 @@
-from django.test import TestCase
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.utils.http import http_date
+from ninja_jwt.tokens import AccessToken
 
-# Create your tests here.
+from testing.fixtures import DAY, make_farm, weather_visit
+from users.models import Farm
+from users.utils import touch_farm_resources, touch_farms_resources
+from utils.conditional_get import not_modified_response
+
+RESOURCES = tuple(Farm.RESOURCE_VERSION_FIELDS)
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        self.farm = make_farm()
+        self.factory = RequestFactory()
+
+    def validators(self, resource: str, path: str = "/api/resource") -> dict:
+        response = HttpResponse()
+        self.assertIsNone(not_modified_response(self.factory.get(path), response, self.farm, resource))
+        return {header: response.headers[header] for header in ("ETag", "Last-Modified")}
+
+    def conditional(self, resource: str, **headers):
+        return not_modified_response(self.factory.get("/api/resource", **headers), HttpResponse(), self.farm, resource)
+
+    def reload_farm(self):
+        self.farm = Farm.objects.get(pk=self.farm.pk)
+
+    def test_matching_validators_return_304(self):
+        validators = self.validators("weather")
+
+        not_modified = self.conditional("weather", HTTP_IF_NONE_MATCH=validators["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.headers["ETag"], validators["ETag"])
+        self.assertEqual(self.conditional("weather", HTTP_IF_MODIFIED_SINCE=validators["Last-Modified"]).status_code, 304)
+
+        self.assertIsNone(self.conditional("weather", HTTP_IF_NONE_MATCH='"stale"'))
+        self.assertIsNone(self.conditional("weather", HTTP_IF_MODIFIED_SINCE=http_date(0)))
+
+    def test_etag_depends_on_resource_and_url(self):
+        etags = {self.validators(resource)["ETag"] for resource in RESOURCES}
+        self.assertEqual(len(etags), len(RESOURCES))
+        self.assertNotEqual(self.validators("weather")["ETag"], self.validators("weather", "/api/other")["ETag"])
+
+    def test_max_age_rotates_etag_without_last_modified(self):
+        response = HttpResponse()
+        not_modified_response(self.factory.get("/api/resource"), response, self.farm, "heatmaps", max_age_seconds=3600)
+        self.assertIn("ETag", response.headers)
+        self.assertNotIn("Last-Modified", response.headers)
+
+    def test_reload_bumps_every_resource(self):
+        other = make_farm("other")
+        before = {resource: self.validators(resource)["ETag"] for resource in RESOURCES}
+        other_before = Farm.objects.values_list(*Farm.RESOURCE_VERSION_FIELDS.values()).get(pk=other.pk)
+
+        touch_farms_resources([self.farm.pk], *RESOURCES)
+        self.reload_farm()
+
+        for resource in RESOURCES:
+            self.assertNotEqual(self.validators(resource)["ETag"], before[resource], resource)
+            self.assertIsNone(self.conditional(resource, HTTP_IF_NONE_MATCH=before[resource]), resource)
+        self.assertEqual(Farm.objects.values_list(*Farm.RESOURCE_VERSION_FIELDS.values()).get(pk=other.pk), other_before)
+
+    def test_touch_only_bumps_given_resource(self):
+        before = {resource: self.validators(resource)["ETag"] for resource in RESOURCES}
+
+        touch_farm_resources(self.farm.pk, "crop_loss")
+        self.reload_farm()
+
+        changed = {resource for resource in RESOURCES if self.validators(resource)["ETag"] != before[resource]}
+        self.assertEqual(changed, {"crop_loss"})
+
+    def test_endpoint_revalidation(self):
+        weather_visit(self.farm, DAY, rain=5)
+        token = AccessToken.for_user(self.farm.user)
+
+        def get(**headers):
+            return self.client.get(
+                "/api/weather/get_weather",
+                {"field_id": self.farm.field_id, "current_date": DAY.strftime("%Y%m%d")},
+                HTTP_HOST="localhost",
+                HTTP_AUTHORIZATION=f"Bearer {token}",
+                **headers,
+            )
+
+        first = get()
+        self.assertEqual(first.status_code, 200, first.content)
+        self.assertEqual(get(HTTP_IF_NONE_MATCH=first.headers["ETag"]).status_code, 304)
+
+        touch_farm_resources(self.farm.pk, "weather")
+        self.assertEqual(get(HTTP_IF_NONE_MATCH=first.headers["ETag"]).status_code, 200)
@@ -2,5 +2,39 @@ import os
 import json
 from datetime import datetime
 from django.db import transaction
+from django.utils import timezone
 from heatmaps.models import Heatmap
-from users.models import Farm
\ No newline at end of file
+from users.models import Farm
+
+
+def touch_farm_resources(farm_id: int, *resources: str):
+    """
+    Mark resources of a farm as changed, invalidating cached read responses.
+
+    Args:
+        farm_id (int): Primary key of the farm.
+        resources (str): Keys of Farm.RESOURCE_VERSION_FIELDS.
+    """
+    touch_farms_resources([farm_id], *resources)
+
+
+async def atouch_farm_resources(farm_id: int, *resources: str):
+    """Async variant of touch_farm_resources for the reload pipeline"""
+    now = timezone.now()
+    await Farm.objects.filter(pk=farm_id).aupdate(
+        **{Farm.RESOURCE_VERSION_FIELDS[resource]: now for resource in resources}
+    )
+
+
+def touch_farms_resources(farm_ids, *resources: str):
+    """
+    Mark resources of many farms as changed in a single update.
+
+    Args:
+        farm_ids (Iterable[int]): Primary keys of the farms.
+        resources (str): Keys of Farm.RESOURCE_VERSION_FIELDS.
+    """
+    now = timezone.now()
+    Farm.objects.filter(pk__in=list(farm_ids)).update(
+        **{Farm.RESOURCE_VERSION_FIELDS[resource]: now for resource in resources}
+    )
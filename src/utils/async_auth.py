@@ -0,0 +1,29 @@
+from typing import Any, Optional
+
+from django.http import HttpRequest
+from ninja.security import SessionAuth
+
+
+class AsyncSessionAuth(SessionAuth):
+    """
+    SessionAuth for `async def` operations.
+
+    Ninja calls sync auth callbacks directly on the event loop, where loading
+    the session user raises SynchronousOnlyOperation. This variant loads it
+    with request.auser() instead.
+    """
+
+    async def __call__(self, request: HttpRequest) -> Optional[Any]:
+        # Checks CSRF and reads the cookie, no database access
+        key = self._get_key(request)
+        return await self.authenticate(request, key)
+
+    async def authenticate(self, request: HttpRequest, key: Optional[str]) -> Optional[Any]:
+        user = await request.auser()
+        if user.is_authenticated:
+            return user
+
+        return None
+
+
+async_django_auth = AsyncSessionAuth()
@@ -1,10 +1,16 @@
 import os
+import time
+import shutil
 import requests
+from pathlib import Path
 import logging
 from typing import Dict, List, Optional, Union
 from azure.storage.blob import BlobServiceClient, ContentSettings
 from dotenv import load_dotenv
 
+from utils.metrics import BLOB_UPLOAD_BYTES, BLOB_UPLOAD_SECONDS, BLOB_UPLOAD_SIZE
+from utils.tracing import span
+
 load_dotenv()
 
 # Logging Configuration
@@ -20,6 +26,33 @@ if not logger.hasHandlers():
     logger.addHandler(handler)
 
 
+def save_local_blob(
+    root: str,
+    container_name: str,
+    blob_path: str,
+    image_file: Union[str, bytes]
+) -> dict:
+    """
+    Filesystem stand-in for a blob upload, used when LOCAL_BLOB_DIR is set.
+
+    Writes to <root>/<container>/<blob_path> and returns a file:// URL in the
+    same layout as a blob URL, so offline runs need no storage account.
+    """
+    target = Path(root).resolve() / container_name / blob_path
+    target.parent.mkdir(parents=True, exist_ok=True)
+
+    if isinstance(image_file, str):
+        if not os.path.exists(image_file):
+            logger.error(f"File not found: {image_file}")
+            return {'success': False, 'url': None, 'error': f'File not found: {image_file}'}
+        shutil.copyfile(image_file, target)
+    else:
+        target.write_bytes(image_file)
+
+    logger.info(f"Saved {blob_path} locally → {target.as_uri()}")
+    return {'success': True, 'url': target.as_uri(), 'error': None}
+
+
 def upload_image_to_blob(
     container_name: str,
     farm_id: str,
@@ -30,22 +63,13 @@ def upload_image_to_blob(
 ) -> dict:
     """
     Upload an image to Azure Blob Storage and return its URL.
+    With LOCAL_BLOB_DIR set the image is written to that directory instead.
     """
     logger.info(f"Uploading image for farm_id={farm_id}, date={date}, type={image_name_type}")
     
     try:
-        connection_string = os.getenv("AZURE_CONNECTION_STRING")
-
-        if not connection_string:
-            logger.error("Missing AZURE_CONNECTION_STRING environment variable")
-            raise Exception("Cannot Upload images currently")
-
-        blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-        container_client = blob_service_client.get_container_client(container_name)
-
         if file_extension is None:
             if isinstance(image_file, str):
-                from pathlib import Path
                 file_extension = Path(image_file).suffix.lstrip('.')
                 if not file_extension:
                     logger.error("File extension could not be determined from path")
@@ -56,6 +80,19 @@ def upload_image_to_blob(
 
         file_extension = file_extension.lstrip('.')
         blob_path = f"{farm_id}/{date}/{image_name_type}.{file_extension}"
+
+        local_blob_dir = os.getenv("LOCAL_BLOB_DIR")
+        if local_blob_dir:
+            return save_local_blob(local_blob_dir, container_name, blob_path, image_file)
+
+        connection_string = os.getenv("AZURE_CONNECTION_STRING")
+
+        if not connection_string:
+            logger.error("Missing AZURE_CONNECTION_STRING environment variable")
+            raise Exception("Cannot Upload images currently")
+
+        blob_service_client = BlobServiceClient.from_connection_string(connection_string)
+        container_client = blob_service_client.get_container_client(container_name)
         blob_client = container_client.get_blob_client(blob_path)
 
         # Determine content type
@@ -131,8 +168,10 @@ def upload_field_images_to_azure(
 
         try:
             logger.info(f"Downloading {image_type} from {url}")
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
+            with span("image.download", image_type=image_type) as download:
+                response = requests.get(url, timeout=30)
+                response.raise_for_status()
+                download.set(bytes=len(response.content))
 
             image_bytes = response.content
             content_type = response.headers.get('content-type', '')
@@ -144,18 +183,29 @@ def upload_field_images_to_azure(
             else:
                 file_extension = 'png'
 
-            result = upload_image_to_blob(
-                container_name=container_name,
-                farm_id=field_id,
-                date=sensed_day,
-                image_name_type=image_type,
-                image_file=image_bytes,
-                file_extension=file_extension
+            backend = "local" if os.getenv("LOCAL_BLOB_DIR") else "azure"
+            upload_start = time.perf_counter()
+            with span("blob.upload", image_type=image_type, backend=backend, bytes=len(image_bytes)) as upload:
+                result = upload_image_to_blob(
+                    container_name=container_name,
+                    farm_id=field_id,
+                    date=sensed_day,
+                    image_name_type=image_type,
+                    image_file=image_bytes,
+                    file_extension=file_extension
+                )
+                upload.set(success=result['success'])
+            BLOB_UPLOAD_SECONDS.observe(
+                time.perf_counter() - upload_start,
+                backend=backend,
+                outcome="ok" if result['success'] else "failed",
             )
 
             if result['success']:
                 azure_urls[image_type] = result['url']
                 successful_uploads += 1
+                BLOB_UPLOAD_BYTES.inc(len(image_bytes), backend=backend)
+                BLOB_UPLOAD_SIZE.observe(len(image_bytes), backend=backend)
                 logger.info(f"✓ {image_type} uploaded successfully to {result['url']}")
             else:
                 failed_uploads += 1
@@ -0,0 +1,57 @@
+import hashlib
+import time
+from typing import Optional
+
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from users.models import Farm
+
+
+def not_modified_response(
+    request: HttpRequest,
+    response: HttpResponse,
+    farm: Farm,
+    resource: str,
+    max_age_seconds: Optional[int] = None,
+    extra: str = "",
+) -> Optional[HttpResponse]:
+    """
+    Set ETag / Last-Modified for a farm resource and short-circuit to 304.
+
+    The ETag is derived from the farm's last write time for `resource`
+    and the request URL, so it only needs the already fetched Farm row.
+    Call it before running the endpoint's own queries and return the
+    result when it is not None.
+
+    Args:
+        request: Incoming request (If-None-Match / If-Modified-Since are read from it).
+        response: Ninja's temporal response; validators are set on it.
+        farm: Farm owning the resource.
+        resource: Key of Farm.RESOURCE_VERSION_FIELDS.
+        max_age_seconds: Rotate the ETag every N seconds, for payloads that
+            embed expiring data such as SAS URLs. Disables Last-Modified.
+        extra: Additional input the payload depends on (e.g. today's date).
+    Returns:
+        HttpResponseNotModified if the client copy is current, otherwise None.
+    """
+    version = farm.get_resource_version(resource)
+    key = f"{farm.pk}|{resource}|{version.timestamp()}|{request.get_full_path()}|{extra}"
+    if max_age_seconds:
+        key += f"|{int(time.time() // max_age_seconds)}"
+
+    etag = quote_etag(hashlib.sha1(key.encode()).hexdigest()[:20])
+    last_modified = None if max_age_seconds else int(version.timestamp())
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    for target in (response, not_modified):
+        if target is None:
+            continue
+        target.headers["ETag"] = etag
+        if last_modified is not None:
+            target.headers["Last-Modified"] = http_date(last_modified)
+        # Clients may keep the payload but must revalidate before reusing it
+        patch_cache_control(target, private=True, no_cache=True)
+
+    return not_modified
@@ -0,0 +1,321 @@
+import hmac
+import math
+import time
+import logging
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter(
+    fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+handler.setFormatter(formatter)
+if not logger.hasHandlers():
+    logger.addHandler(handler)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Bucket upper bounds in seconds. API requests and upstream calls, then whole
+# stages and runs, whose timeouts go up to STAGE_TIMEOUTS["upload_images"]
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PIPELINE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 240, 300, 600)
+BYTES_BUCKETS = (1024, 10 * 1024, 100 * 1024, 512 * 1024, 1024 ** 2, 5 * 1024 ** 2, 20 * 1024 ** 2)
+
+# (labels, value) samples of one metric, labels in declaration order
+Sample = Tuple[Tuple[str, ...], float]
+
+
+def _escape_help(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape(value) -> str:
+    """Label value escaping, HELP text plus double quotes"""
+    return _escape_help(value).replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Metric:
+    """
+    Base of the metric types: a name, help text and one series per label combination.
+    Updates from request threads, sync_to_async workers and the event loop
+    share the metric's lock.
+    """
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def lines(self) -> List[str]:
+        raise NotImplementedError
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {_escape_help(self.documentation)}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(Metric):
+    """Value that only goes up, e.g. requests or bytes sent"""
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        if amount < 0:
+            raise ValueError(f"{self.name} can only increase")
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def lines(self) -> List[str]:
+        with self.lock:
+            values = sorted(self.values.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in values]
+
+
+class Gauge(Counter):
+    """Value that goes up and down, e.g. runs in progress"""
+    type = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets, with their sum and count"""
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # {labels: [count per bucket, +Inf last], sum}
+        self.series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total = self.series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def lines(self) -> List[str]:
+        with self.lock:
+            series = sorted((key, list(counts), total[0]) for key, (counts, total) in self.series.items())
+        lines = []
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, ('le', _number(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+# Called at scrape time, yields (name, type, help, labelnames, samples) for state
+# that already lives elsewhere, e.g. the breaker states of integrations.resilience
+Collector = Callable[[], Iterable[Tuple[str, str, str, Sequence[str], Iterable[Sample]]]]
+
+
+class Registry:
+    """Metrics and collectors of this process, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.collectors: Dict[str, Collector] = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, name: str, collector: Collector):
+        """Add a collector, replacing any earlier one of the same name"""
+        with self.lock:
+            self.collectors[name] = collector
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+            collectors = list(self.collectors.items())
+
+        lines = []
+        for metric in metrics:
+            lines += metric.header() + metric.lines()
+        for collector_name, collector in collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                # One broken collector must not cost the whole scrape
+                logger.exception(f"Metrics collector {collector_name} failed: {e}")
+                continue
+            for name, metric_type, documentation, labelnames, samples in families:
+                lines.append(f"# HELP {name} {_escape_help(documentation)}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(labelnames, labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# Metrics of the instrumented modules, kept here so /metrics lists them from
+# the first scrape and their names are in one place
+HTTP_REQUEST_SECONDS = histogram(
+    "ak_http_request_duration_seconds", "API request latency by route", ("method", "route", "status"),
+)
+HTTP_REQUESTS_IN_PROGRESS = gauge("ak_http_requests_in_progress", "Requests being served by this process")
+
+UPSTREAM_REQUEST_SECONDS = histogram(
+    "ak_upstream_request_duration_seconds",
+    "Farmonaut request latency per attempt, without the wait for the upstream limits",
+    ("endpoint", "outcome"),
+)
+UPSTREAM_REQUESTS = counter(
+    "ak_upstream_requests_total", "Farmonaut request attempts, retries and hedges included", ("endpoint", "outcome"),
+)
+UPSTREAM_CALLS = counter(
+    "ak_upstream_calls_total", "Farmonaut calls after retries, by final outcome", ("endpoint", "outcome"),
+)
+
+BLOB_UPLOAD_SECONDS = histogram("ak_blob_upload_duration_seconds", "Image upload time", ("backend", "outcome"))
+BLOB_UPLOAD_BYTES = counter("ak_blob_upload_bytes_total", "Bytes of successfully uploaded images", ("backend",))
+BLOB_UPLOAD_SIZE = histogram("ak_blob_upload_size_bytes", "Size of uploaded images", ("backend",), BYTES_BUCKETS)
+
+PIPELINE_STAGE_SECONDS = histogram(
+    "ak_pipeline_stage_duration_seconds", "Duration of pipeline stages that ran", ("stage", "status"), PIPELINE_BUCKETS,
+)
+PIPELINE_STAGES = counter(
+    "ak_pipeline_stages_total", "Pipeline stages by outcome, resumed and skipped included", ("stage", "status"),
+)
+PIPELINE_RUN_SECONDS = histogram(
+    "ak_pipeline_run_duration_seconds", "Farm reload duration", ("update_type", "outcome"), PIPELINE_BUCKETS,
+)
+PIPELINE_RUNS_IN_PROGRESS = gauge("ak_pipeline_runs_in_progress", "Farm reloads running in this process")
+
+
+def route_label(request) -> str:
+    """URL pattern of the request, so per-field URLs share one series"""
+    match = getattr(request, "resolver_match", None)
+    return f"/{match.route}" if match is not None else "unmatched"
+
+
+class RequestMetricsMiddleware:
+    """Record the latency of every request by method, route and status"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        HTTP_REQUESTS_IN_PROGRESS.inc()
+        try:
+            response = self.get_response(request)
+        finally:
+            HTTP_REQUESTS_IN_PROGRESS.dec()
+        self.finish(request, response, start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        HTTP_REQUESTS_IN_PROGRESS.inc()
+        try:
+            response = await self.get_response(request)
+        finally:
+            HTTP_REQUESTS_IN_PROGRESS.dec()
+        self.finish(request, response, start)
+        return response
+
+    @staticmethod
+    def finish(request, response, start: float):
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=route_label(request),
+            status=response.status_code,
+        )
+
+
+def metrics_view(request):
+    """
+    The registry in the Prometheus text format. Needs `Authorization: Bearer
+    <METRICS_TOKEN>` when METRICS_TOKEN is set, and is only served without a
+    token under DEBUG.
+    """
+    token = getattr(settings, "METRICS_TOKEN", None)
+    if token:
+        given = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(given.encode(), f"Bearer {token}".encode()):
+            return HttpResponse("Unauthorized\n", status=401, content_type="text/plain")
+    elif not settings.DEBUG:
+        return HttpResponse("Set METRICS_TOKEN to serve metrics\n", status=403, content_type="text/plain")
+    return HttpResponse(REGISTRY.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,279 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from utils.metrics import REGISTRY, route_label
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter(
+    fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+handler.setFormatter(formatter)
+if not logger.hasHandlers():
+    logger.addHandler(handler)
+
+# Slowest statements kept per request and per endpoint
+SLOWEST_KEPT = 5
+# Requests issuing more queries than this are logged with their repeated statements
+QUERY_COUNT_WARNING = int(os.getenv("QUERY_COUNT_WARNING", "50"))
+
+
+@dataclass
+class QueryStats:
+    """
+    Queries of one request or tracked block.
+
+    Attributes:
+        count (int): Statements executed.
+        total_ms (float): Time spent in the database driver.
+        slowest (List[Tuple[float, str]]): (ms, sql) of the slowest statements.
+        repeated (int): Statements whose SQL, parameters aside, already ran in
+            this block. A loop issuing one query per row shows up here.
+        statements (List[str]): Every statement, only kept with capture=True.
+        parent (QueryStats): Enclosing block, which counts these queries too.
+    """
+    capture: bool = False
+    count: int = 0
+    total_ms: float = 0.0
+    slowest: List[Tuple[float, str]] = field(default_factory=list)
+    repeated: int = 0
+    statements: List[str] = field(default_factory=list)
+    seen: Dict[str, int] = field(default_factory=dict)
+    parent: Optional["QueryStats"] = field(default=None, repr=False)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, sql: str, ms: float):
+        # sync_to_async calls of one request may run on several threads
+        with self.lock:
+            self.count += 1
+            self.total_ms += ms
+            times = self.seen.get(sql, 0)
+            self.seen[sql] = times + 1
+            if times:
+                self.repeated += 1
+            if self.capture:
+                self.statements.append(sql)
+            if len(self.slowest) < SLOWEST_KEPT or ms > self.slowest[-1][0]:
+                self.slowest.append((ms, sql))
+                self.slowest.sort(key=lambda item: -item[0])
+                del self.slowest[SLOWEST_KEPT:]
+        if self.parent is not None:
+            self.parent.add(sql, ms)
+
+    def most_repeated(self, limit: int = 3) -> List[Tuple[str, int]]:
+        with self.lock:
+            return sorted(((sql, n) for sql, n in self.seen.items() if n > 1), key=lambda item: -item[1])[:limit]
+
+
+# Stats of the request or block running in this context. sync_to_async copies
+# the context into its worker thread, so ORM calls of async views count too.
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def _record(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add(sql, (time.perf_counter() - start) * 1000)
+
+
+def _add_wrapper(connection, **kwargs):
+    if _record not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record)
+
+
+# Every connection opened once this module is loaded gets the recorder, in
+# whichever thread it opens. An async block's queries run on the thread-sensitive
+# thread, whose connections install() below cannot reach from the event loop.
+connection_created.connect(_add_wrapper, dispatch_uid="utils.query_metrics")
+
+
+def install():
+    """
+    Add the recorder to the connections the calling thread opened before this
+    module was loaded. Called by the middleware at startup.
+    """
+    for connection in connections.all(initialized_only=True):
+        _add_wrapper(connection)
+
+
+@contextmanager
+def track_queries(capture: bool = False) -> Iterator[QueryStats]:
+    """
+    Count the queries of a block, including those of sync_to_async calls it
+    awaits. Blocks nest: a request tracked by the middleware inside an
+    assert_max_queries block counts towards both.
+    """
+    install()
+    stats = QueryStats(capture=capture, parent=_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit: int, repeated: Optional[int] = None) -> Iterator[QueryStats]:
+    """
+    Fail when a block issues more than `limit` queries, or more than
+    `repeated` repeats of the same statement. Works in sync and async code:
+
+        with assert_max_queries(3, repeated=0):
+            await get_weather(request, field_id, current_date)
+
+    Raises:
+        AssertionError: Listing the statements that ran.
+    """
+    with track_queries(capture=True) as stats:
+        yield stats
+
+    problems = []
+    if stats.count > limit:
+        problems.append(f"{stats.count} queries, expected at most {limit}")
+    if repeated is not None and stats.repeated > repeated:
+        problems.append(f"{stats.repeated} repeated statements, expected at most {repeated}")
+    if problems:
+        listing = "\n".join(f"{i}. {sql}" for i, sql in enumerate(stats.statements, 1))
+        raise AssertionError(f"{', '.join(problems)}:\n{listing}")
+
+
+@dataclass
+class EndpointQueryMetrics:
+    """Query totals of one endpoint since the process started"""
+    requests: int = 0
+    queries: int = 0
+    max_queries: int = 0
+    repeated: int = 0
+    db_ms: float = 0.0
+    max_db_ms: float = 0.0
+    slowest: List[Tuple[float, str]] = field(default_factory=list)
+
+    def add(self, stats: QueryStats):
+        self.requests += 1
+        self.queries += stats.count
+        self.max_queries = max(self.max_queries, stats.count)
+        self.repeated += stats.repeated
+        self.db_ms += stats.total_ms
+        self.max_db_ms = max(self.max_db_ms, stats.total_ms)
+        self.slowest = sorted(self.slowest + stats.slowest, key=lambda item: -item[0])[:SLOWEST_KEPT]
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "queries": self.queries,
+            "avg_queries": round(self.queries / self.requests, 2) if self.requests else 0.0,
+            "max_queries": self.max_queries,
+            "repeated": self.repeated,
+            "db_ms": round(self.db_ms, 1),
+            "max_db_ms": round(self.max_db_ms, 1),
+            "slowest": [{"ms": round(ms, 1), "sql": sql} for ms, sql in self.slowest],
+        }
+
+
+_endpoints: Dict[str, EndpointQueryMetrics] = {}
+_endpoints_lock = threading.Lock()
+
+
+def query_metrics() -> Dict[str, dict]:
+    """{endpoint: totals} of every endpoint requested so far"""
+    with _endpoints_lock:
+        return {endpoint: metrics.as_dict() for endpoint, metrics in _endpoints.items()}
+
+
+def reset_query_metrics():
+    with _endpoints_lock:
+        _endpoints.clear()
+
+
+def _database_metrics():
+    with _endpoints_lock:
+        totals = [(tuple(endpoint.split(" ", 1)), metrics.queries, metrics.db_ms, metrics.repeated) for endpoint, metrics in _endpoints.items()]
+    labels = ("method", "route")
+    yield (
+        "ak_db_queries_total", "counter", "Queries issued by requests, by route", labels,
+        [(key, queries) for key, queries, _, _ in totals],
+    )
+    yield (
+        "ak_db_query_seconds_total", "counter", "Time requests spent in the database driver, by route", labels,
+        [(key, db_ms / 1000) for key, _, db_ms, _ in totals],
+    )
+    yield (
+        "ak_db_repeated_queries_total", "counter", "Statements that already ran in the same request, by route", labels,
+        [(key, repeated) for key, _, _, repeated in totals],
+    )
+
+
+REGISTRY.register_collector("database", _database_metrics)
+
+
+def _endpoint(request) -> str:
+    """URL pattern of the request, so /get_weather?field_id=1 and =2 aggregate together"""
+    return f"{request.method} {route_label(request)}"
+
+
+class QueryMetricsMiddleware:
+    """
+    Record the query count, database time and slowest statements of each request.
+
+    With QUERY_METRICS_HEADERS (DEBUG by default) they are sent back as
+    X-DB-Queries, X-DB-Time-Ms, X-DB-Repeated and a Server-Timing entry that
+    browser dev tools display. They are always added to the per-endpoint totals
+    of query_metrics().
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.headers = getattr(settings, "QUERY_METRICS_HEADERS", settings.DEBUG)
+        install()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with track_queries() as stats:
+            response = self.get_response(request)
+        self.finish(request, response, stats)
+        return response
+
+    async def __acall__(self, request):
+        with track_queries() as stats:
+            response = await self.get_response(request)
+        self.finish(request, response, stats)
+        return response
+
+    def finish(self, request, response, stats: QueryStats):
+        endpoint = _endpoint(request)
+        with _endpoints_lock:
+            _endpoints.setdefault(endpoint, EndpointQueryMetrics()).add(stats)
+
+        if stats.count > QUERY_COUNT_WARNING:
+            logger.warning(f"{endpoint} issued {stats.count} queries, most repeated: {stats.most_repeated()}")
+
+        if self.headers:
+            response["X-DB-Queries"] = str(stats.count)
+            response["X-DB-Time-Ms"] = f"{stats.total_ms:.1f}"
+            response["X-DB-Repeated"] = str(stats.repeated)
+            response["Server-Timing"] = f'db;dur={stats.total_ms:.1f};desc="{stats.count} queries"'
@@ -0,0 +1,336 @@
+"""
+Lightweight tracing for reloads.
+
+A reload opens a trace with start_trace() and everything it awaits opens
+spans with span(): stages, Farmonaut calls, image uploads and database saves.
+The current span lives in a context variable, so spans nest across asyncio
+tasks and sync_to_async threads without being passed around.
+
+    TRACE_EXPORT=file TRACE_FILE=/tmp/traces.jsonl python manage.py runserver
+    python manage.py trace_report --file /tmp/traces.jsonl
+
+TRACE_EXPORT=otlp posts OTLP/HTTP JSON to TRACE_OTLP_ENDPOINT instead, e.g. a
+collector or testing/trace_collector.py. Finished traces are exported by a
+background thread, a request never waits for the exporter.
+"""
+import os
+import json
+import time
+import queue
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter(
+    fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+handler.setFormatter(formatter)
+if not logger.hasHandlers():
+    logger.addHandler(handler)
+
+# "file", "otlp" or empty to record nothing
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "").lower()
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://127.0.0.1:4318/v1/traces")
+# Share of reloads traced
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1"))
+# Only export traces whose root took at least this long, 0 exports all
+TRACE_SLOW_SECONDS = float(os.getenv("TRACE_SLOW_SECONDS", "0"))
+SERVICE_NAME = "ak_backend_poc"
+# Finished traces waiting for the exporter, newer ones are dropped beyond this
+EXPORT_QUEUE_SIZE = 1000
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+
+
+@dataclass
+class Span:
+    """
+    One timed operation of a trace.
+
+    Attributes:
+        trace_id (str): 32 hex digits, shared by every span of the reload.
+        span_id (str): 16 hex digits.
+        parent_id (str): span_id of the enclosing span, None for the root.
+        start_ns (int): Wall clock start in nanoseconds since the epoch.
+        end_ns (int): Wall clock end, 0 while the span is open.
+        status (str): "ok", or "error" when the block raised.
+    """
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: int = 0
+    status: str = STATUS_OK
+    attributes: Dict[str, object] = field(default_factory=dict)
+    trace: Optional["Trace"] = field(default=None, repr=False)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def as_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Yielded outside a sampled trace, so callers can set attributes unconditionally"""
+    trace_id = None
+    span_id = None
+
+    def set(self, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+@dataclass
+class Trace:
+    """Finished spans of one trace, exported together when the root ends"""
+    spans: List[Span] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def add(self, span: Span):
+        with self.lock:
+            self.spans.append(span)
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def traceparent() -> Optional[str]:
+    """W3C traceparent header of the current span, None outside a trace"""
+    current = _current.get()
+    if current is None:
+        return None
+    return f"00-{current.trace_id}-{current.span_id}-01"
+
+
+def _now_ns() -> int:
+    return time.time_ns()
+
+
+@contextmanager
+def _enter(span: Span) -> Iterator[Span]:
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.status = STATUS_ERROR
+        span.set(error=f"{type(e).__name__}: {e}"[:500])
+        raise
+    finally:
+        span.end_ns = _now_ns()
+        _current.reset(token)
+        span.trace.add(span)
+
+
+@contextmanager
+def start_trace(name: str, **attributes) -> Iterator[object]:
+    """
+    Open the root span of a trace, exported when the block ends. Yields
+    NOOP_SPAN when tracing is off or the trace is not sampled.
+    """
+    if not TRACE_EXPORT or random.random() >= TRACE_SAMPLE_RATE:
+        yield NOOP_SPAN
+        return
+
+    trace = Trace()
+    root = Span(name, os.urandom(16).hex(), os.urandom(8).hex(), None, _now_ns(), attributes=attributes, trace=trace)
+    try:
+        with _enter(root):
+            yield root
+    finally:
+        if root.duration_ms >= TRACE_SLOW_SECONDS * 1000:
+            _export(trace)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[object]:
+    """Time a block as a child of the current span, a no-op outside a trace"""
+    parent = _current.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+
+    child = Span(name, parent.trace_id, os.urandom(8).hex(), parent.span_id, _now_ns(), attributes=attributes, trace=parent.trace)
+    with _enter(child):
+        yield child
+
+
+_queue: "queue.Queue[Trace]" = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+_worker: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+
+
+def _export(trace: Trace):
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_export_loop, name="trace-exporter", daemon=True)
+            _worker.start()
+    try:
+        _queue.put_nowait(trace)
+    except queue.Full:
+        logger.warning("Trace export queue full, dropping a trace")
+
+
+def _export_loop():
+    while True:
+        trace = _queue.get()
+        with trace.lock:
+            # Spans of work that outlived the root, e.g. a timed out upload thread, are left out
+            spans = list(trace.spans)
+        try:
+            if TRACE_EXPORT == "otlp":
+                export_otlp(spans, TRACE_OTLP_ENDPOINT)
+            else:
+                export_file(spans, TRACE_FILE)
+        except Exception as e:
+            logger.warning(f"Trace export failed: {type(e).__name__}: {e}")
+
+
+def export_file(spans: List[Span], path: str):
+    """Append one JSON line per span"""
+    with open(path, "a") as f:
+        for item in spans:
+            f.write(json.dumps(item.as_dict(), default=str) + "\n")
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(spans: List[Span]) -> dict:
+    """OTLP/HTTP JSON body (ExportTraceServiceRequest) of finished spans"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{
+                "scope": {"name": __name__},
+                "spans": [
+                    {
+                        "traceId": item.trace_id,
+                        "spanId": item.span_id,
+                        **({"parentSpanId": item.parent_id} if item.parent_id else {}),
+                        "name": item.name,
+                        # SPAN_KIND_INTERNAL
+                        "kind": 1,
+                        "startTimeUnixNano": str(item.start_ns),
+                        "endTimeUnixNano": str(item.end_ns),
+                        "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in item.attributes.items()],
+                        # STATUS_CODE_OK / STATUS_CODE_ERROR
+                        "status": {"code": 2 if item.status == STATUS_ERROR else 1},
+                    }
+                    for item in spans
+                ],
+            }],
+        }],
+    }
+
+
+def _from_otlp_value(value: dict):
+    # OTLP JSON carries 64 bit integers as strings
+    if "intValue" in value:
+        return int(value["intValue"])
+    return next(iter(value.values()), None)
+
+
+def from_otlp(body: dict) -> List[dict]:
+    """Spans of an OTLP/HTTP JSON body in the format of Span.as_dict"""
+    spans = []
+    for resource_spans in body.get("resourceSpans", []):
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            for item in scope_spans.get("spans", []):
+                start_ns, end_ns = int(item["startTimeUnixNano"]), int(item["endTimeUnixNano"])
+                spans.append({
+                    "trace_id": item["traceId"],
+                    "span_id": item["spanId"],
+                    "parent_id": item.get("parentSpanId") or None,
+                    "name": item["name"],
+                    "start_ns": start_ns,
+                    "end_ns": end_ns,
+                    "duration_ms": round((end_ns - start_ns) / 1e6, 3),
+                    "status": STATUS_ERROR if item.get("status", {}).get("code") == 2 else STATUS_OK,
+                    "attributes": {
+                        attribute["key"]: _from_otlp_value(attribute["value"])
+                        for attribute in item.get("attributes", [])
+                    },
+                })
+    return spans
+
+
+def export_otlp(spans: List[Span], endpoint: str):
+    response = httpx.post(endpoint, json=to_otlp(spans), timeout=10)
+    response.raise_for_status()
+
+
+def critical_path(spans: List[dict]) -> List[dict]:
+    """
+    Spans the root waited on, outermost first: from the root, repeatedly the
+    child that ended last, then the children that ended before it started.
+    Shortening a span off this path does not make the trace faster.
+
+    Args:
+        spans (List[dict]): Spans of one trace, as written by export_file.
+    """
+    children: Dict[Optional[str], List[dict]] = {}
+    for item in spans:
+        children.setdefault(item["parent_id"], []).append(item)
+    roots = children.get(None) or [min(spans, key=lambda item: item["start_ns"])]
+
+    path = []
+
+    def walk(item: dict, depth: int):
+        path.append({**item, "depth": depth})
+        waited_on = []
+        deadline = item["end_ns"]
+        for child in sorted(children.get(item["span_id"], []), key=lambda child: -child["end_ns"]):
+            if child["end_ns"] <= deadline:
+                waited_on.append(child)
+                deadline = child["start_ns"]
+        for child in reversed(waited_on):
+            walk(child, depth + 1)
+
+    walk(roots[0], 0)
+    return path
@@ -1,75 +1,115 @@
+from typing import Optional
+
+import orjson
+from django.db import models
+from django.http import HttpResponse
 from ninja import Router
 from ninja.errors import HttpError
-from ninja.security import django_auth
-from ninja_jwt.authentication import JWTAuth
+from ninja_jwt.authentication import AsyncJWTAuth
 from datetime import datetime
+from math import sqrt
 
 from users.models import Farm
-from weather.models import WeatherPrediction
-from weather.weather_schemas import WeatherPredictionSchema
+from utils.async_auth import async_django_auth
+from utils.conditional_get import not_modified_response
+from weather.models import WeatherPrediction, ForecastAccuracy
+from weather.weather_schemas import WeatherPredictionSchema, ForecastAccuracySchema
 
 weather_router = Router(tags=["weather"])
 
+# Response fields in schema order; all of them map 1:1 onto model columns
+WEATHER_FIELDS = tuple(WeatherPredictionSchema.model_fields)
+
+# Integer columns the schema declares as float, cast so the JSON keeps the schema's form
+FLOAT_FIELDS = frozenset(
+    name for name, field in WeatherPredictionSchema.model_fields.items()
+    if field.annotation is float and not isinstance(WeatherPrediction._meta.get_field(name), models.FloatField)
+)
+
 @weather_router.get(
     path="/get_weather",
-    auth=[JWTAuth(), django_auth],
-    response=list[WeatherPredictionSchema],
+    auth=[AsyncJWTAuth(), async_django_auth],
 )
-def get_weather(request, field_id: str, current_date: str):
+async def get_weather(request, field_id: str, current_date: str, fields: Optional[str] = None):
     """
     Get all weather predictions for a given farm and date_of_reload.
+
+    `fields` is an optional comma separated subset of the WeatherPredictionSchema
+    keys. Rows are read with values_list() and serialised straight to JSON,
+    skipping model and schema instantiation, so no response schema is declared.
     """
-    try:
-        farm = Farm.objects.get(field_id=field_id)
-    except Farm.DoesNotExist:
+    if fields:
+        requested = tuple(f.strip() for f in fields.split(",") if f.strip())
+        unknown = [f for f in requested if f not in WEATHER_FIELDS]
+        if unknown:
+            raise HttpError(400, f"Unknown weather fields: {', '.join(unknown)}")
+    else:
+        requested = WEATHER_FIELDS
+
+    farm = await Farm.objects.filter(field_id=field_id).only(
+        "id", "updated_at", Farm.RESOURCE_VERSION_FIELDS["weather"]
+    ).afirst()
+    if farm is None:
         raise HttpError(400, "Farm not found")
 
     try:
-        datetime.strptime(current_date, "%Y%m%d").date()
+        date_obj = datetime.strptime(current_date, "%Y%m%d").date()
     except ValueError:
         raise HttpError(400, "Invalid date format. Expected YYYYMMDD.")
 
-    weather_qs = WeatherPrediction.objects.filter(
-        farm=farm,
-        date_of_reload__date=current_date 
-    ).order_by("date")
+    response = HttpResponse(content_type="application/json")
+    not_modified = not_modified_response(request, response, farm, "weather")
+    if not_modified:
+        return not_modified
 
-    if not weather_qs.exists():
+    rows = [
+        row async for row in WeatherPrediction.objects.filter(
+            farm_id=farm.id,
+            date_of_reload__date=date_obj
+        ).order_by("date").values_list(*requested)
+    ]
+
+    if not rows:
         raise HttpError(404, "No weather data found for this date")
 
+    casts = [i for i, name in enumerate(requested) if name in FLOAT_FIELDS]
+    if casts:
+        rows = [list(row) for row in rows]
+        for row in rows:
+            for i in casts:
+                if row[i] is not None:
+                    row[i] = float(row[i])
+
+    response.content = orjson.dumps([dict(zip(requested, row)) for row in rows])
+    return response
+
+@weather_router.get(
+    path="/get_forecast_accuracy",
+    auth=[AsyncJWTAuth(), async_django_auth],
+    response=list[ForecastAccuracySchema],
+)
+async def get_forecast_accuracy(request, field_id: str):
+    """
+    Get forecast error by metric and lead time for a given farm.
+    """
+    try:
+        farm = await Farm.objects.aget(field_id=field_id)
+    except Farm.DoesNotExist:
+        raise HttpError(400, "Farm not found")
+
+    accuracy_qs = ForecastAccuracy.objects.filter(
+        farm=farm,
+        sample_count__gt=0
+    ).order_by("metric", "lead_days")
+
     return [
-        WeatherPredictionSchema(
-            date=w.date.strftime("%Y-%m-%d"),
-            is_current=w.is_current,
-            summary=w.summary,
-            description=w.description,
-            main=w.main,
-            icon=w.icon,
-            temp_day=w.temp_day,
-            temp_min=w.temp_min,
-            temp_max=w.temp_max,
-            temp_morn=w.temp_morn,
-            temp_eve=w.temp_eve,
-            temp_night=w.temp_night,
-            feels_like_day=w.feels_like_day,
-            feels_like_morn=w.feels_like_morn,
-            feels_like_eve=w.feels_like_eve,
-            feels_like_night=w.feels_like_night,
-            humidity=w.humidity,
-            pressure=w.pressure,
-            dew_point=w.dew_point,
-            uvi=w.uvi,
-            wind_speed=w.wind_speed,
-            wind_deg=w.wind_deg,
-            wind_gust=w.wind_gust,
-            clouds=w.clouds,
-            pop=w.pop,
-            rain=w.rain,
-            sunrise=w.sunrise,
-            sunset=w.sunset,
-            moonrise=w.moonrise,
-            moonset=w.moonset,
-            moon_phase=w.moon_phase,
+        ForecastAccuracySchema(
+            metric=a.metric,
+            lead_days=a.lead_days,
+            samples=a.sample_count,
+            mae=a.sum_abs_error / a.sample_count,
+            bias=a.sum_error / a.sample_count,
+            rmse=sqrt(a.sum_sq_error / a.sample_count),
         )
-        for w in weather_qs
+        async for a in accuracy_qs
     ]
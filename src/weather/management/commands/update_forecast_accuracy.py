@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from users.models import Farm
+from weather.utils import update_forecast_accuracy
+
+class Command(BaseCommand):
+    help = "Folds newly observed weather days into per-farm forecast accuracy totals"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--field_id', type=str, default=None)
+
+    def handle(self, *args, **options):
+        farms = Farm.objects.all()
+        if options['field_id']:
+            farms = farms.filter(field_id=options['field_id'])
+
+        processed_days = 0
+        for farm in farms.iterator():
+            processed_days += update_forecast_accuracy(farm)
+
+        self.stdout.write(f"Processed {processed_days} newly observed days")
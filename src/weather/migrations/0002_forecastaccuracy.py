@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 22:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_alter_farm_user'),
+        ('weather', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ForecastAccuracyCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_observed_date', models.DateField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('farm', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='forecast_accuracy_cursor', to='users.farm')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ForecastAccuracy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('rain', 'Rain (mm)'), ('temp_day', 'Daytime Temperature')], max_length=20)),
+                ('lead_days', models.PositiveSmallIntegerField()),
+                ('sample_count', models.PositiveIntegerField(default=0)),
+                ('sum_error', models.FloatField(default=0)),
+                ('sum_abs_error', models.FloatField(default=0)),
+                ('sum_sq_error', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('farm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='forecast_accuracy', to='users.farm')),
+            ],
+            options={
+                'ordering': ['metric', 'lead_days'],
+                'unique_together': {('farm', 'metric', 'lead_days')},
+            },
+        ),
+    ]
@@ -66,3 +66,45 @@ class WeatherPrediction(models.Model):
 
     def __str__(self):
         return f"{self.date} ({'Current' if self.is_current else 'Forecast'})"
+
+
+class ForecastAccuracy(models.Model):
+    """
+    Running forecast error totals for one farm, metric and lead time.
+    Only the sums are stored so new observations can be folded in
+    without re-reading older forecast batches.
+    """
+    METRIC_CHOICES = [
+        ('rain', 'Rain (mm)'),
+        ('temp_day', 'Daytime Temperature'),
+    ]
+
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='forecast_accuracy')
+    metric = models.CharField(max_length=20, choices=METRIC_CHOICES)
+    # Days between the forecast batch and the forecasted date
+    lead_days = models.PositiveSmallIntegerField()
+
+    sample_count = models.PositiveIntegerField(default=0)
+    sum_error = models.FloatField(default=0)  # forecast - observed
+    sum_abs_error = models.FloatField(default=0)
+    sum_sq_error = models.FloatField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["metric", "lead_days"]
+        unique_together = ["farm", "metric", "lead_days"]
+
+    def __str__(self):
+        return f"{self.metric} +{self.lead_days}d ({self.sample_count} samples)"
+
+
+class ForecastAccuracyCursor(models.Model):
+    """Last observed date already folded into ForecastAccuracy for a farm"""
+    farm = models.OneToOneField(Farm, on_delete=models.CASCADE, related_name='forecast_accuracy_cursor')
+    last_observed_date = models.DateField(null=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.farm_id} - {self.last_observed_date}"
@@ -1,3 +1,115 @@
+from datetime import timedelta
+from math import sqrt
+
 from django.test import TestCase
+from ninja_jwt.tokens import AccessToken
+
+from testing.fixtures import DAY, make_farm, weather_visit
+from weather.api import WEATHER_FIELDS
+from weather.models import ForecastAccuracy, ForecastAccuracyCursor
+from weather.utils import update_forecast_accuracy
+
+
+def day(offset: int):
+    return DAY + timedelta(days=offset)
+
+
+class GetWeatherTests(TestCase):
+
+    def setUp(self):
+        self.farm = make_farm()
+        weather_visit(self.farm, DAY, rain=5)
+        weather_visit(self.farm, day(1), rain=12, reloaded=DAY)
+        token = AccessToken.for_user(self.farm.user)
+        self.headers = {"HTTP_HOST": "localhost", "HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+    def get(self, **params):
+        params = {"field_id": self.farm.field_id, "current_date": DAY.strftime("%Y%m%d"), **params}
+        return self.client.get("/api/weather/get_weather", params, **self.headers)
+
+    def test_full_response_follows_the_schema(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200, response.content)
+        rows = response.json()
+        self.assertEqual([list(row) for row in rows], [list(WEATHER_FIELDS)] * 2)
+        self.assertEqual([(row["date"], row["is_current"], row["rain"]) for row in rows], [
+            ("2025-07-01", True, 5.0),
+            ("2025-07-02", False, 12.0),
+        ])
+        # Integer columns keep the float form the schema declares
+        self.assertEqual(response.content.count(b'"wind_deg":200.0'), 2)
+        self.assertEqual(response.content.count(b'"sunrise":0.0'), 2)
+
+    def test_fields_subset(self):
+        response = self.get(fields="date, rain,clouds")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json(), [
+            {"date": "2025-07-01", "rain": 5.0, "clouds": 90.0},
+            {"date": "2025-07-02", "rain": 12.0, "clouds": 90.0},
+        ])
+
+    def test_unknown_field_is_rejected(self):
+        response = self.get(fields="date,farm_id")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("farm_id", response.json()["detail"])
+
+
+class ForecastAccuracyTests(TestCase):
+
+    def setUp(self):
+        self.farm = make_farm()
+        # Observations: 5mm on day 3, a dry day 4 saved as -1
+        weather_visit(self.farm, day(3), rain=5)
+        weather_visit(self.farm, day(4), rain=-1)
+        # One day ahead forecasts, errors -2 and +4
+        weather_visit(self.farm, day(3), rain=3, reloaded=day(2))
+        weather_visit(self.farm, day(4), rain=4, reloaded=day(3))
+        # Three days ahead forecasts, errors +6 and 0
+        weather_visit(self.farm, day(3), rain=11, reloaded=day(0))
+        weather_visit(self.farm, day(4), rain=0, reloaded=day(1))
+
+    def totals(self, metric: str = "rain") -> dict:
+        return {
+            row.lead_days: (row.sample_count, row.sum_error, row.sum_abs_error, row.sum_sq_error)
+            for row in ForecastAccuracy.objects.filter(farm=self.farm, metric=metric)
+        }
+
+    def test_errors_are_bucketed_by_lead_time(self):
+        self.assertEqual(update_forecast_accuracy(self.farm), 2)
+
+        self.assertEqual(self.totals(), {1: (2, 2, 6, 20), 3: (2, 6, 6, 36)})
+        self.assertEqual(self.totals("temp_day"), {1: (2, 0, 0, 0), 3: (2, 0, 0, 0)})
+        self.assertEqual(ForecastAccuracyCursor.objects.get(farm=self.farm).last_observed_date, day(4))
+
+    def test_cursor_resumes_without_counting_a_forecast_twice(self):
+        update_forecast_accuracy(self.farm)
+        self.assertEqual(update_forecast_accuracy(self.farm), 0)
+
+        # Only day 5 and its forecast are read on the next pass
+        weather_visit(self.farm, day(5), rain=10)
+        weather_visit(self.farm, day(5), rain=7, reloaded=day(4))
+
+        self.assertEqual(update_forecast_accuracy(self.farm), 1)
+        self.assertEqual(self.totals(), {1: (3, -1, 9, 29), 3: (2, 6, 6, 36)})
+
+    def test_endpoint_reports_mae_bias_and_rmse(self):
+        update_forecast_accuracy(self.farm)
+        token = AccessToken.for_user(self.farm.user)
+
+        response = self.client.get(
+            "/api/weather/get_forecast_accuracy",
+            {"field_id": self.farm.field_id},
+            HTTP_HOST="localhost",
+            HTTP_AUTHORIZATION=f"Bearer {token}",
+        )
 
-# Create your tests here.
+        self.assertEqual(response.status_code, 200, response.content)
+        rain = [row for row in response.json() if row["metric"] == "rain"]
+        self.assertEqual([(row["lead_days"], row["samples"]) for row in rain], [(1, 2), (3, 2)])
+        self.assertEqual((rain[0]["mae"], rain[0]["bias"]), (3, 1))
+        self.assertAlmostEqual(rain[0]["rmse"], sqrt(10))
+        self.assertEqual((rain[1]["mae"], rain[1]["bias"]), (3, 3))
+        self.assertAlmostEqual(rain[1]["rmse"], sqrt(18))
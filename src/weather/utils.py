@@ -2,27 +2,21 @@ import os
 import django
 import json
 from datetime import datetime, timezone
+from typing import List, Optional
 from django.db import transaction
-from weather.models import WeatherPrediction
+from weather.models import WeatherPrediction, ForecastAccuracy, ForecastAccuracyCursor
 from users.models import Farm
+from users.utils import atouch_farm_resources, touch_farm_resources
 
-def save_weather_from_response(weather_data: dict, field_id : str):
-    """
-    Save satellite index image URLs into the Heatmap model.
-
-    Args:
-        field_data (dict): JSON response containing satellite URLs and metadata.
-    Raises:
-        ValueError: If required metadata is missing or invalid.
-        Farm.DoesNotExist: If the specified farm is not found.
-    """
-    farm = Farm.objects.get(field_id = field_id)
+def _weather_predictions(farm: Farm, weather_data: dict) -> List[WeatherPrediction]:
+    """Unsaved rows of one forecast batch, the first day is the current one"""
     date_of_reload = datetime.now()
 
+    predictions = []
     for i, day in enumerate(weather_data.get("weather", {}).get("daily", None)):
         if day is None:
             continue
-        WeatherPrediction.objects.create(
+        predictions.append(WeatherPrediction(
             farm = farm,
             date_of_reload=date_of_reload,
             date=datetime.fromtimestamp(day["dt"]),
@@ -56,4 +50,142 @@ def save_weather_from_response(weather_data: dict, field_id : str):
             moonrise=day.get("moonrise", -1),
             moonset=day.get("moonset", -1),
             moon_phase=day.get("moon_phase", -1),
-        )
\ No newline at end of file
+        ))
+    return predictions
+
+
+def save_weather_from_response(weather_data: dict, field_id : str):
+    """
+    Save satellite index image URLs into the Heatmap model.
+
+    Args:
+        field_data (dict): JSON response containing satellite URLs and metadata.
+    Raises:
+        ValueError: If required metadata is missing or invalid.
+        Farm.DoesNotExist: If the specified farm is not found.
+    """
+    farm = Farm.objects.get(field_id = field_id)
+    WeatherPrediction.objects.bulk_create(_weather_predictions(farm, weather_data))
+    touch_farm_resources(farm.id, "weather")
+
+
+async def asave_weather_from_response(weather_data: dict, field_id: str, farm: Optional[Farm] = None):
+    """
+    Async variant of save_weather_from_response on Django's async ORM, the
+    whole batch is written with one insert.
+
+    Args:
+        weather_data (dict): Forecast response.
+        field_id (str): Farmonaut field id of the farm.
+        farm (Farm): Farm of the response when the caller already has it.
+    """
+    farm = farm or await Farm.objects.aget(field_id=field_id)
+    await WeatherPrediction.objects.abulk_create(_weather_predictions(farm, weather_data))
+    await atouch_farm_resources(farm.id, "weather")
+
+
+def _observed_metric_value(metric: str, value):
+    """Normalise stored sentinels before comparing forecasts to observations"""
+    if value is None:
+        return None
+    # The API omits `rain` on dry days, which is saved as -1
+    if metric == "rain" and value < 0:
+        return 0.0
+    return value
+
+
+def update_forecast_accuracy(farm: Farm) -> int:
+    """
+    Fold newly observed days into the farm's ForecastAccuracy totals.
+
+    The first "current" record saved for a date is treated as the
+    observation. For every lead time, the latest forecast batch fetched
+    before that observation is compared against it. Only dates after the
+    farm's cursor are read, so the cost follows the ingest rate rather
+    than the size of the weather history.
+
+    Args:
+        farm (Farm): Farm whose weather batches should be processed.
+    Returns:
+        int: Number of newly observed dates that were processed.
+    """
+    metrics = [choice for choice, _ in ForecastAccuracy.METRIC_CHOICES]
+    cursor, _ = ForecastAccuracyCursor.objects.get_or_create(farm=farm)
+
+    observations = WeatherPrediction.objects.filter(farm=farm, is_current=True)
+    if cursor.last_observed_date is not None:
+        observations = observations.filter(date__gt=cursor.last_observed_date)
+
+    observed = {}
+    for row in observations.order_by("date", "date_of_reload").values("date", "date_of_reload", *metrics):
+        observed.setdefault(row["date"], row)
+
+    if not observed:
+        return 0
+
+    forecasts = (
+        WeatherPrediction.objects
+        .filter(farm=farm, is_current=False, date__in=list(observed))
+        .order_by("date_of_reload")
+        .values("date", "date_of_reload", *metrics)
+    )
+
+    # Later batches overwrite earlier ones for the same (date, lead)
+    latest_forecasts = {}
+    for row in forecasts:
+        observation = observed[row["date"]]
+        if row["date_of_reload"] >= observation["date_of_reload"]:
+            continue
+        lead_days = (row["date"] - row["date_of_reload"].date()).days
+        if lead_days < 1:
+            continue
+        latest_forecasts[(row["date"], lead_days)] = row
+
+    deltas = {}
+    for (day, lead_days), row in latest_forecasts.items():
+        for metric in metrics:
+            forecast_value = _observed_metric_value(metric, row[metric])
+            observed_value = _observed_metric_value(metric, observed[day][metric])
+            if forecast_value is None or observed_value is None:
+                continue
+            error = forecast_value - observed_value
+            totals = deltas.setdefault((metric, lead_days), [0, 0.0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += error
+            totals[2] += abs(error)
+            totals[3] += error * error
+
+    with transaction.atomic():
+        existing = {
+            (row.metric, row.lead_days): row
+            for row in ForecastAccuracy.objects.select_for_update().filter(farm=farm)
+        }
+        to_create, to_update = [], []
+        for (metric, lead_days), (count, sum_error, sum_abs, sum_sq) in deltas.items():
+            row = existing.get((metric, lead_days))
+            if row is None:
+                to_create.append(ForecastAccuracy(
+                    farm=farm,
+                    metric=metric,
+                    lead_days=lead_days,
+                    sample_count=count,
+                    sum_error=sum_error,
+                    sum_abs_error=sum_abs,
+                    sum_sq_error=sum_sq,
+                ))
+                continue
+            row.sample_count += count
+            row.sum_error += sum_error
+            row.sum_abs_error += sum_abs
+            row.sum_sq_error += sum_sq
+            row.updated_at = datetime.now(timezone.utc)
+            to_update.append(row)
+
+        ForecastAccuracy.objects.bulk_create(to_create)
+        ForecastAccuracy.objects.bulk_update(
+            to_update, ["sample_count", "sum_error", "sum_abs_error", "sum_sq_error", "updated_at"]
+        )
+        cursor.last_observed_date = max(observed)
+        cursor.save(update_fields=["last_observed_date", "updated_at"])
+
+    return len(observed)
@@ -31,4 +31,12 @@ class WeatherPredictionSchema(Schema):
     sunset: float
     moonrise: float
     moonset: float
-    moon_phase: float
\ No newline at end of file
+    moon_phase: float
+
+class ForecastAccuracySchema(Schema):
+    metric: str
+    lead_days: int
+    samples: int
+    mae: float
+    bias: float
+    rmse: float